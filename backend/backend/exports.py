@@ -0,0 +1,157 @@
+"""Streaming CSV and JSON Lines exports shared by the cafe and students apps.
+
+An ``Export`` is a flat projection of one model: ``values_list`` over a few
+columns (joins included), walked in ``(date_field, pk)`` order with
+``iterator(chunk_size=EXPORT_CHUNK_SIZE)``. On PostgreSQL that is a
+server-side cursor, so neither the database driver nor Django holds more
+than one chunk of rows, and no model instances are built. Encoded rows are
+flushed every ``EXPORT_FLUSH_ROWS`` lines, so a year of history streams in
+constant memory and the first bytes leave before the query has finished.
+
+Under ASGI the rows are pulled through ``sync_to_async`` one chunk at a time;
+handing Django a plain generator there would make it read the whole export
+into a list before sending anything.
+"""
+import csv
+import io
+import uuid
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from django.utils.cache import patch_cache_control
+from rest_framework import serializers
+
+EXPORT_FORMATS = {
+    'csv': 'text/csv',
+    'jsonl': 'application/x-ndjson',
+}
+# Values the csv module would otherwise write with str()
+ENCODED_TYPES = (date, time, Decimal, uuid.UUID)
+# Leading characters a spreadsheet would run as a formula
+FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+
+class Export:
+    """A named, streamable projection of ``model``.
+
+    ``columns`` is a sequence of ``(heading, lookup)`` pairs; lookups may
+    follow foreign keys (``customer__username``).
+    """
+
+    def __init__(self, name, model, columns, date_field):
+        self.name = name
+        self.model = model
+        self.columns = columns
+        self.date_field = date_field
+
+    @property
+    def headings(self):
+        return [heading for heading, _ in self.columns]
+
+    def rows(self, queryset=None, start=None, end=None):
+        """Row tuples with ``date_field`` on or between the local dates ``start`` and ``end``"""
+        if queryset is None:
+            queryset = self.model._default_manager.all()
+        # Prefetches would need model instances and defeat the chunked cursor
+        queryset = queryset.prefetch_related(None)
+        # Bounds on the column itself, not __date, so its index can be used
+        if start:
+            queryset = queryset.filter(**{f'{self.date_field}__gte': start_of_day(start)})
+        if end:
+            queryset = queryset.filter(**{f'{self.date_field}__lt': start_of_day(end + timedelta(days=1))})
+        return queryset.order_by(self.date_field, 'pk').values_list(
+            *(lookup for _, lookup in self.columns)
+        ).iterator(chunk_size=settings.EXPORT_CHUNK_SIZE)
+
+    def filename(self, output, start=None, end=None):
+        parts = [self.name] + [day.isoformat() for day in (start, end) if day]
+        return f'{"_".join(parts)}.{output}'
+
+
+class ExportQuerySerializer(serializers.Serializer):
+    """``?output=csv|jsonl&start=&end=`` for export endpoints (``format`` is taken by DRF)"""
+    output = serializers.ChoiceField(choices=list(EXPORT_FORMATS), default='csv')
+    start = serializers.DateField(required=False)
+    end = serializers.DateField(required=False)
+
+    def validate(self, attrs):
+        if attrs.get('start') and attrs.get('end') and attrs['start'] > attrs['end']:
+            raise serializers.ValidationError('start must not be after end')
+        return attrs
+
+
+def start_of_day(day):
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def csv_value(value):
+    if value is None:
+        return ''
+    if isinstance(value, ENCODED_TYPES):
+        return DjangoJSONEncoder().default(value)
+    # Text such as usernames or notes is escaped; numbers and dates keep their sign
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+def encode_csv(headings, rows):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(headings)
+    for count, row in enumerate(rows, 1):
+        writer.writerow([csv_value(value) for value in row])
+        if count % settings.EXPORT_FLUSH_ROWS == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def encode_jsonl(headings, rows):
+    encoder = DjangoJSONEncoder(separators=(',', ':'))
+    lines = []
+    for row in rows:
+        lines.append(encoder.encode(dict(zip(headings, row))))
+        if len(lines) == settings.EXPORT_FLUSH_ROWS:
+            yield '\n'.join(lines) + '\n'
+            lines = []
+    if lines:
+        yield '\n'.join(lines) + '\n'
+
+
+def encode_rows(output, headings, rows):
+    """Text chunks of ``rows`` in ``output`` format"""
+    return encode_csv(headings, rows) if output == 'csv' else encode_jsonl(headings, rows)
+
+
+async def iterate_in_thread(chunks):
+    """Async iterator over a sync one, advancing it in Django's sync thread"""
+    chunks = iter(chunks)
+    done = object()
+    next_chunk = sync_to_async(next)
+    while (chunk := await next_chunk(chunks, done)) is not done:
+        yield chunk
+
+
+def export_response(request, export, queryset=None):
+    """Validate the export query parameters on ``request`` and stream the rows as a download"""
+    query = ExportQuerySerializer(data=request.query_params)
+    query.is_valid(raise_exception=True)
+    output, start, end = (query.validated_data.get(name) for name in ('output', 'start', 'end'))
+
+    chunks = encode_rows(output, export.headings, export.rows(queryset, start, end))
+    if isinstance(request._request, ASGIRequest):
+        chunks = iterate_in_thread(chunks)
+    response = StreamingHttpResponse(chunks, content_type=EXPORT_FORMATS[output])
+    response['Content-Disposition'] = f'attachment; filename="{export.filename(output, start, end)}"'
+    # Ask nginx not to buffer the whole download before passing it on
+    response['X-Accel-Buffering'] = 'no'
+    patch_cache_control(response, private=True, no_store=True)
+    return response
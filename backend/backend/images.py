@@ -0,0 +1,180 @@
+"""Resized WebP/JPEG variants of uploaded images.
+
+Serializers expose ``srcset`` strings whose URLs point at ``image_variant``.
+That view renders the requested width and format with Pillow on first use,
+stores it under ``variants/`` with a name derived from a hash of the source
+bytes and the variant spec, and redirects to it. A variant file never
+changes once written, so it can be cached forever; the redirect itself is
+cached for as long as the source version in its ``?v=`` parameter holds.
+A ``?v=`` that is not the source row's current version is ignored, and
+concurrent first requests for a variant render it once.
+"""
+import hashlib
+import time
+from io import BytesIO
+
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import models
+from django.http import Http404, HttpResponseRedirect
+from django.urls import reverse
+from django.utils.cache import patch_cache_control
+from django.views.decorators.http import require_safe
+from PIL import Image, ImageOps
+
+VARIANT_DIR = 'variants'
+# format -> (Pillow format, file extension, save options)
+VARIANT_FORMATS = {
+    'webp': ('WEBP', 'webp', {'quality': 80, 'method': 4}),
+    'jpeg': ('JPEG', 'jpg', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+# Variant names are fixed per source version, so the mapping can be kept long;
+# without a version it is only kept as long as the unversioned redirect
+VARIANT_NAME_TTL = 7 * 24 * 60 * 60
+UNVERSIONED_TTL = 5 * 60
+# How long other requests wait for a variant someone else is rendering
+VARIANT_RENDER_WAIT = 10
+
+
+def is_variant_source(name):
+    return (
+        bool(name) and '..' not in name.split('/')
+        and name.startswith(tuple(settings.IMAGE_VARIANT_SOURCES))
+    )
+
+
+def render_variant(data, width, fmt):
+    """Return ``data`` (an encoded image) resized to at most ``width`` pixels wide"""
+    pillow_format, _, options = VARIANT_FORMATS[fmt]
+    image = Image.open(BytesIO(data))
+    # Let the JPEG decoder downscale while decoding (keeping both sides >= width,
+    # since EXIF rotation may swap them)
+    image.draft('RGB', (width, width))
+    image = ImageOps.exif_transpose(image)
+    if image.width > width:
+        image = image.resize((width, max(1, round(image.height * width / image.width))), Image.LANCZOS)
+
+    if fmt == 'jpeg' and image.mode != 'RGB':
+        background = Image.new('RGB', image.size, 'white')
+        rgba = image.convert('RGBA')
+        background.paste(rgba, mask=rgba.getchannel('A'))
+        image = background
+    elif image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA' if 'A' in image.getbands() or 'transparency' in image.info else 'RGB')
+
+    output = BytesIO()
+    image.save(output, pillow_format, **options)
+    return output.getvalue()
+
+
+def get_variant(source_name, width, fmt, version=''):
+    """Return ``(storage name, version)`` of the ``width``/``fmt`` variant of ``source_name``.
+
+    ``version`` (the URL's ``?v=``) is only used when it is the current
+    version of the row holding the image; otherwise the variant is looked up
+    unversioned, so made-up values cannot fill the cache. Rendering happens
+    on the first request.
+    """
+    name = cache.get(variant_key(source_name, version, width, fmt))
+    if name is not None:
+        return name, version
+    if version and version != current_version(source_name):
+        version = ''
+        name = cache.get(variant_key(source_name, version, width, fmt))
+        if name is not None:
+            return name, version
+
+    with default_storage.open(source_name, 'rb') as source:
+        data = source.read()
+    digest = hashlib.sha256(data + f'|{width}|{fmt}'.encode()).hexdigest()[:24]
+    name = save_variant(f'{VARIANT_DIR}/{digest}-{width}.{VARIANT_FORMATS[fmt][1]}', data, width, fmt)
+    cache.set(variant_key(source_name, version, width, fmt), name, VARIANT_NAME_TTL if version else UNVERSIONED_TTL)
+    return name, version
+
+
+def variant_key(source_name, version, width, fmt):
+    return f'images:variant:{source_name}:{version}:{width}:{fmt}'
+
+
+def save_variant(name, data, width, fmt):
+    """Render and store the variant ``name`` unless it exists; returns the stored name.
+
+    A cache lock makes concurrent first requests render it once: the others
+    wait for the file, or take over when the lock expires.
+    """
+    lock = f'images:rendering:{name}'
+    while not default_storage.exists(name):
+        if cache.add(lock, True, VARIANT_RENDER_WAIT):
+            try:
+                if not default_storage.exists(name):
+                    return default_storage.save(name, ContentFile(render_variant(data, width, fmt)))
+            finally:
+                cache.delete(lock)
+        else:
+            time.sleep(0.05)
+    return name
+
+
+def image_fields():
+    """``(model, field name, upload folder)`` for the image fields variants are made from"""
+    return [
+        (model, field.name, field.upload_to)
+        for model in apps.get_models()
+        for field in model._meta.get_fields()
+        if isinstance(field, models.ImageField) and isinstance(field.upload_to, str)
+        and is_variant_source(field.upload_to)
+    ]
+
+
+def current_version(source_name):
+    """``version_of`` the row whose image is ``source_name``, or ``None`` when there is none"""
+    for model, field_name, upload_to in image_fields():
+        if source_name.startswith(upload_to):
+            row = model._default_manager.filter(**{field_name: source_name}).first()
+            if row is not None:
+                return version_of(row)
+    return None
+
+
+def variant_url(source_name, width, fmt, version=''):
+    url = reverse('image-variant', args=[width, fmt, source_name])
+    return f'{url}?v={version}' if version else url
+
+
+def image_srcset(image, version='', request=None):
+    """``{'webp': 'url 64w, ...', 'jpeg': ...}`` for an image field, or ``None`` when empty"""
+    if not image:
+        return None
+    srcset = {}
+    for fmt in VARIANT_FORMATS:
+        candidates = []
+        for width in settings.IMAGE_VARIANT_WIDTHS:
+            url = variant_url(image.name, width, fmt, version)
+            if request is not None:
+                url = request.build_absolute_uri(url)
+            candidates.append(f'{url} {width}w')
+        srcset[fmt] = ', '.join(candidates)
+    return srcset
+
+
+def version_of(instance):
+    """Source version for variant URLs: the row's ``updated_at`` as a timestamp"""
+    updated_at = getattr(instance, 'updated_at', None)
+    return str(int(updated_at.timestamp())) if updated_at else ''
+
+
+@require_safe
+def image_variant(request, width, fmt, path):
+    if width not in settings.IMAGE_VARIANT_WIDTHS or fmt not in VARIANT_FORMATS or not is_variant_source(path):
+        raise Http404('No such image variant')
+    try:
+        name, version = get_variant(path, width, fmt, request.GET.get('v', ''))
+    except (OSError, Image.DecompressionBombError):
+        raise Http404('No such image')
+    response = HttpResponseRedirect(default_storage.url(name))
+    # Versioned URLs only change when the source does
+    patch_cache_control(response, public=True, max_age=24 * 60 * 60 if version else UNVERSIONED_TTL)
+    return response
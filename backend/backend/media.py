@@ -0,0 +1,143 @@
+"""Production serving of user uploads under ``MEDIA_ROOT``.
+
+Replaces ``django.conf.urls.static.static()``, which only works with
+``DEBUG`` on and has no validators. Every response carries an ``ETag`` and
+``Last-Modified`` so revalidation is a 304, single byte ranges are honoured,
+and content-addressed folders (``MEDIA_IMMUTABLE_PREFIXES``) are cached as
+immutable.
+
+With ``MEDIA_SENDFILE = 'nginx'`` (``X-Accel-Redirect`` to
+``MEDIA_ACCEL_PREFIX``) or ``'apache'`` (``X-Sendfile``) the worker only
+checks the file and sets headers; the front proxy sends the bytes and
+handles ranges itself. Otherwise whole files go out through ``FileResponse``,
+which uses the server's ``wsgi.file_wrapper`` (sendfile) when there is one.
+"""
+import mimetypes
+import os
+import re
+import stat
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, Http404, HttpResponse
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, parse_http_date_safe
+from django.views.decorators.http import require_safe
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+class RangeFile:
+    """Read at most ``length`` bytes of ``file`` from ``start``"""
+
+    def __init__(self, file, start, length):
+        file.seek(start)
+        self.file = file
+        self.remaining = length
+
+    def read(self, size=-1):
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def close(self):
+        self.file.close()
+
+
+def parse_range(header, size):
+    """``(start, end)`` inclusive for a single ``bytes=`` range, ``None`` to send the whole file.
+
+    Raises ``ValueError`` when the range cannot be satisfied.
+    """
+    match = RANGE_RE.match(header.strip())
+    if not match or not any(match.groups()):
+        # Malformed or multiple ranges: ignore the header
+        return None
+    first, last = match.groups()
+    if not first:
+        length = int(last)
+        if length == 0:
+            raise ValueError
+        return max(0, size - length), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or end < start:
+        raise ValueError
+    return start, end
+
+
+def range_applies(request, etag, last_modified):
+    """``If-Range`` allows the range only when the validator still matches"""
+    if_range = request.headers.get('If-Range')
+    if not if_range:
+        return True
+    if if_range.startswith(('"', 'W/')):
+        return if_range == etag
+    return parse_http_date_safe(if_range) == last_modified
+
+
+def is_immutable(path):
+    return path.startswith(tuple(settings.MEDIA_IMMUTABLE_PREFIXES))
+
+
+@require_safe
+def serve_media(request, path):
+    try:
+        fullpath = safe_join(settings.MEDIA_ROOT, path)
+        stats = os.stat(fullpath)
+    except (SuspiciousFileOperation, ValueError, OSError):
+        raise Http404('Not found')
+    if not stat.S_ISREG(stats.st_mode):
+        raise Http404('Not found')
+
+    etag = f'"{stats.st_mtime_ns:x}-{stats.st_size:x}"'
+    last_modified = int(stats.st_mtime)
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        response = file_response(request, fullpath, path, stats.st_size, etag, last_modified)
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    if is_immutable(path):
+        patch_cache_control(response, public=True, max_age=365 * 24 * 60 * 60, immutable=True)
+    else:
+        patch_cache_control(response, public=True, max_age=settings.MEDIA_CACHE_MAX_AGE)
+    return response
+
+
+def file_response(request, fullpath, path, size, etag, last_modified):
+    content_type, encoding = mimetypes.guess_type(fullpath)
+    content_type = content_type or 'application/octet-stream'
+
+    if settings.MEDIA_SENDFILE:
+        response = HttpResponse(content_type=content_type)
+        if settings.MEDIA_SENDFILE == 'nginx':
+            response['X-Accel-Redirect'] = quote(settings.MEDIA_ACCEL_PREFIX + path)
+        else:
+            response['X-Sendfile'] = fullpath
+        return response
+
+    byte_range = None
+    if 'Range' in request.headers and range_applies(request, etag, last_modified):
+        try:
+            byte_range = parse_range(request.headers['Range'], size)
+        except ValueError:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{size}'
+            return response
+
+    file = open(fullpath, 'rb')
+    if byte_range is None:
+        response = FileResponse(file, content_type=content_type)
+    else:
+        start, end = byte_range
+        response = FileResponse(RangeFile(file, start, end - start + 1), status=206, content_type=content_type)
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+        response['Content-Length'] = str(end - start + 1)
+    if encoding:
+        response['Content-Encoding'] = encoding
+    response['Accept-Ranges'] = 'bytes'
+    return response
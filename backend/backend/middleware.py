@@ -0,0 +1,38 @@
+"""Per-request database metrics for the load tests in ``benchmarks/``.
+
+Enabled with ``QUERY_COUNT_HEADER`` (off by default). Every query Django runs
+while the view builds its response is counted through
+``connection.execute_wrapper``, so it works with ``DEBUG`` off, and the
+totals go out as ``X-Query-Count`` and ``X-Query-Time`` (milliseconds).
+Rows a streaming response reads after the view returns are not included.
+"""
+import time
+
+from django.db import connection
+
+
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.duration += time.perf_counter() - started
+
+
+class QueryCountMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        counter = QueryCounter()
+        with connection.execute_wrapper(counter):
+            response = self.get_response(request)
+        response['X-Query-Count'] = str(counter.count)
+        response['X-Query-Time'] = f'{counter.duration * 1000:.2f}'
+        return response
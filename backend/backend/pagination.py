@@ -0,0 +1,147 @@
+"""Pagination shared by the cafe and students APIs.
+
+``KeysetPagination`` behaves exactly like the default page-number pagination
+unless the client sends a ``cursor`` query parameter (empty for the first
+page). In cursor mode there is no ``COUNT(*)`` and no ``OFFSET``: each page
+is fetched with a ``WHERE (ordering) < (last row)`` range on the view's
+``cursor_ordering``, which ends with the primary key so ties are stable.
+Any ``?ordering=`` is ignored in cursor mode.
+"""
+import base64
+import json
+from collections import OrderedDict
+
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+def keyset_filter(ordering, values, forward=True):
+    """``Q`` selecting rows strictly after (or before) ``values`` in ``ordering``"""
+    condition = Q()
+    for i, field in enumerate(ordering):
+        descending = field.startswith('-')
+        lookup = 'lt' if descending == forward else 'gt'
+        step = Q(**{f'{field.lstrip("-")}__{lookup}': values[i]})
+        for previous, value in zip(ordering[:i], values):
+            step &= Q(**{previous.lstrip('-'): value})
+        condition |= step
+    # Redundant bound on the leading column so the planner can seek the index
+    # to the cursor instead of scanning every row before it
+    descending = ordering[0].startswith('-')
+    lookup = 'lte' if descending == forward else 'gte'
+    return Q(**{f'{ordering[0].lstrip("-")}__{lookup}': values[0]}) & condition
+
+
+def encode_cursor(position, forward=True):
+    """Opaque cursor token for a position (one JSON-safe value per ordering field)"""
+    token = json.dumps({'f': forward, 'p': position}, separators=(',', ':'))
+    return base64.urlsafe_b64encode(token.encode()).decode()
+
+
+def decode_cursor(token):
+    """``(forward, position)`` from ``encode_cursor``; raises ``ValueError`` for a bad token"""
+    try:
+        data = json.loads(base64.urlsafe_b64decode(token.encode()))
+        forward, position = bool(data['f']), data['p']
+    except (TypeError, ValueError, KeyError):
+        raise ValueError('Invalid cursor')
+    if not isinstance(position, list):
+        raise ValueError('Invalid cursor')
+    return forward, position
+
+
+def encode_value(value):
+    return value.isoformat() if hasattr(value, 'isoformat') else str(value)
+
+
+def reverse_ordering(ordering):
+    return [field[1:] if field.startswith('-') else f'-{field}' for field in ordering]
+
+
+class KeysetPagination(PageNumberPagination):
+    """Page numbers by default, keyset pages when ``?cursor=`` is present"""
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.cursor_mode = self.cursor_query_param in request.query_params
+        if not self.cursor_mode:
+            return super().paginate_queryset(queryset, request, view)
+
+        self.request = request
+        self.ordering = list(view.cursor_ordering)
+        page_size = self.get_page_size(request)
+        forward, position = self.decode_cursor(request.query_params[self.cursor_query_param])
+
+        if forward:
+            queryset = queryset.order_by(*self.ordering)
+        else:
+            queryset = queryset.order_by(*reverse_ordering(self.ordering))
+        if position is not None:
+            queryset = queryset.filter(keyset_filter(self.ordering, position, forward))
+
+        results = list(queryset[:page_size + 1])
+        has_more = len(results) > page_size
+        results = results[:page_size]
+        if forward:
+            self.has_next, self.has_previous = has_more, position is not None
+        else:
+            results.reverse()
+            self.has_next, self.has_previous = True, has_more
+
+        self.page_results = results
+        return results
+
+    def get_paginated_response(self, data):
+        if not self.cursor_mode:
+            return super().get_paginated_response(data)
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data),
+        ]))
+
+    def get_next_link(self):
+        if not self.cursor_mode:
+            return super().get_next_link()
+        if not self.has_next or not self.page_results:
+            return None
+        return self.cursor_link(self.page_results[-1], forward=True)
+
+    def get_previous_link(self):
+        if not self.cursor_mode:
+            return super().get_previous_link()
+        if not self.has_previous or not self.page_results:
+            return None
+        return self.cursor_link(self.page_results[0], forward=False)
+
+    def get_schema_operation_parameters(self, view):
+        parameters = super().get_schema_operation_parameters(view)
+        parameters.append({
+            'name': self.cursor_query_param,
+            'required': False,
+            'in': 'query',
+            'description': 'Keyset pagination cursor; send it empty for the first page',
+            'schema': {'type': 'string'},
+        })
+        return parameters
+
+    def cursor_link(self, obj, forward):
+        position = [encode_value(getattr(obj, field.lstrip('-'))) for field in self.ordering]
+        url = remove_query_param(self.request.build_absolute_uri(), self.page_query_param)
+        return replace_query_param(url, self.cursor_query_param, encode_cursor(position, forward))
+
+    def decode_cursor(self, token):
+        """Return ``(forward, position)``; an empty token is the first page"""
+        if not token:
+            return True, None
+        try:
+            forward, position = decode_cursor(token)
+        except ValueError:
+            raise NotFound(self.invalid_cursor_message)
+        if len(position) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+        return forward, position
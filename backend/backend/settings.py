@@ -85,6 +85,21 @@ DATABASES = {
 }
 
 
+# Cache
+# Local memory by default; set REDIS_URL to share cached reads across workers
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+if os.environ.get('REDIS_URL'):
+    CACHES['default'] = {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.environ['REDIS_URL'],
+    }
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -138,7 +153,7 @@ MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 # REST Framework Configuration
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'cafe.authentication.RoleJWTAuthentication',
         'rest_framework.authentication.SessionAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
@@ -177,6 +192,8 @@ SIMPLE_JWT = {
     'USER_AUTHENTICATION_RULE': 'rest_framework_simplejwt.authentication.default_user_authentication_rule',
     'AUTH_TOKEN_CLASSES': ('rest_framework_simplejwt.tokens.AccessToken',),
     'TOKEN_TYPE_CLAIM': 'token_type',
+    'TOKEN_USER_CLASS': 'cafe.authentication.RoleTokenUser',
+    'TOKEN_REFRESH_SERIALIZER': 'cafe.serializers.RoleTokenRefreshSerializer',
     'JTI_CLAIM': 'jti',
     'SLIDING_TOKEN_REFRESH_EXP_CLAIM': 'refresh_exp',
     'SLIDING_TOKEN_LIFETIME': timedelta(minutes=5),
@@ -189,4 +206,90 @@ SPECTACULAR_SETTINGS = {
     'DESCRIPTION': 'API for University Cafe Management System',
     'VERSION': '1.0.0',
     'SERVE_INCLUDE_SCHEMA': False,
-}
\ No newline at end of file
+}
+
+# Meal service windows for the student cafe gate (local hours, end exclusive)
+MEAL_SERVICE_WINDOWS = {
+    'breakfast': (7, 9),
+    'lunch': (11, 13),
+    'dinner': (17, 20),
+}
+
+# Student QR codes are rendered on a background thread pool after the row is
+# committed; set STUDENT_QR_ASYNC=0 to render inline (e.g. in scripts)
+STUDENT_QR_ASYNC = os.environ.get('STUDENT_QR_ASYNC', '1') == '1'
+STUDENT_QR_WORKERS = int(os.environ.get('STUDENT_QR_WORKERS', '2'))
+
+# Staff dashboard stats are cached briefly and expired on order/inventory writes
+DASHBOARD_STATS_CACHE_TTL = int(os.environ.get('DASHBOARD_STATS_CACHE_TTL', '5'))
+
+# Upper bound on how long another worker may serve a stale public menu when
+# the cache is not shared (menu writes expire the version immediately locally)
+MENU_VERSION_TTL = int(os.environ.get('MENU_VERSION_TTL', '30'))
+
+# Meal analytics for windows that include today are cached this many seconds
+MEAL_STATS_CACHE_TTL = int(os.environ.get('MEAL_STATS_CACHE_TTL', '30'))
+
+# Access tokens carry the user's role; every request checks it against the
+# profile's role_version. That is only cached when the cache is shared by every
+# worker (Redis), where role changes and deactivations expire it for all of
+# them; a per-process copy would stay stale in the other workers for up to
+# ROLE_VERSION_TTL seconds, so without Redis it is read from the profile row.
+ROLE_VERSION_CACHED = os.environ.get('ROLE_VERSION_CACHED', '1' if os.environ.get('REDIS_URL') else '0') == '1'
+ROLE_VERSION_TTL = int(os.environ.get('ROLE_VERSION_TTL', '60'))
+
+# Refresh-token blacklist checks use an in-process filter (cafe.revocation)
+# that catches up with the table at most every SYNC_INTERVAL seconds and is
+# rebuilt in a background thread every REBUILD_INTERVAL seconds. Expired
+# tokens are removed with `manage.py prune_tokens`, which should be scheduled
+# (e.g. hourly).
+JWT_REVOCATION_SYNC_INTERVAL = float(os.environ.get('JWT_REVOCATION_SYNC_INTERVAL', '1'))
+JWT_REVOCATION_REBUILD_INTERVAL = float(os.environ.get('JWT_REVOCATION_REBUILD_INTERVAL', '3600'))
+
+# Live order events for kitchen screens (cafe.events). The local broker only
+# reaches clients of the same process; with several workers set REDIS_URL.
+EVENTS_REDIS_URL = os.environ.get('REDIS_URL', '')
+EVENTS_BROKER = os.environ.get(
+    'EVENTS_BROKER', 'cafe.events.RedisBroker' if EVENTS_REDIS_URL else 'cafe.events.LocalBroker'
+)
+EVENT_STREAM_HEARTBEAT = int(os.environ.get('EVENT_STREAM_HEARTBEAT', '15'))
+
+# Unread notification counters are kept in the cache and recounted at most
+# this often; broadcasts insert notifications this many rows at a time.
+# Counters are only cached when the cache is shared by every worker (Redis):
+# per-process counters would drift apart, so reads count from the database.
+NOTIFICATION_UNREAD_CACHED = os.environ.get(
+    'NOTIFICATION_UNREAD_CACHED', '1' if os.environ.get('REDIS_URL') else '0'
+) == '1'
+NOTIFICATION_UNREAD_TTL = int(os.environ.get('NOTIFICATION_UNREAD_TTL', '300'))
+NOTIFICATION_BROADCAST_CHUNK_SIZE = int(os.environ.get('NOTIFICATION_BROADCAST_CHUNK_SIZE', '1000'))
+
+# Gate terminal roster sync (students.roster): rows per delta page, and how
+# long a change is held back so transactions committing late are not skipped
+ROSTER_SYNC_PAGE_SIZE = int(os.environ.get('ROSTER_SYNC_PAGE_SIZE', '5000'))
+ROSTER_SYNC_SETTLE = int(os.environ.get('ROSTER_SYNC_SETTLE', '5'))
+
+# Widths (px) of the resized image variants offered in serializer srcsets,
+# and the upload folders they may be made from (backend.images)
+IMAGE_VARIANT_WIDTHS = (64, 160, 320, 640, 1280)
+IMAGE_VARIANT_SOURCES = ('categories/', 'menu_items/', 'media/')
+
+# Uploads are served by backend.media. Set MEDIA_SENDFILE to 'nginx'
+# (X-Accel-Redirect to an internal location serving MEDIA_ROOT at
+# MEDIA_ACCEL_PREFIX) or 'apache' (X-Sendfile) to let the proxy send the
+# bytes. Files under the immutable prefixes are named after their content.
+MEDIA_SENDFILE = os.environ.get('MEDIA_SENDFILE', '')
+MEDIA_ACCEL_PREFIX = os.environ.get('MEDIA_ACCEL_PREFIX', '/protected-media/')
+MEDIA_IMMUTABLE_PREFIXES = ('variants/', 'qr_codes/')
+MEDIA_CACHE_MAX_AGE = int(os.environ.get('MEDIA_CACHE_MAX_AGE', '3600'))
+
+# Streaming exports: rows fetched per server-side cursor round trip, and
+# encoded rows per chunk sent to the client
+EXPORT_CHUNK_SIZE = 2000
+EXPORT_FLUSH_ROWS = 500
+
+# Load testing (benchmarks/): report each request's query count and time in
+# X-Query-Count / X-Query-Time response headers. Leave off in production.
+QUERY_COUNT_HEADER = os.environ.get('QUERY_COUNT_HEADER', '0') == '1'
+if QUERY_COUNT_HEADER:
+    MIDDLEWARE.insert(0, 'backend.middleware.QueryCountMiddleware')
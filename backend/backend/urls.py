@@ -15,12 +15,13 @@ Including another URLconf
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path, include, re_path
 from django.views.generic import RedirectView
 from rest_framework import routers
 from students.views import StudentViewSet, MealLogViewSet
-from django.conf.urls.static import static
 from django.conf import settings
+from backend.images import image_variant
+from backend.media import serve_media
 from drf_spectacular.views import SpectacularAPIView, SpectacularRedocView, SpectacularSwaggerView
 
 router = routers.DefaultRouter()
@@ -36,5 +37,9 @@ urlpatterns = [
     path('api/docs/swagger/', SpectacularSwaggerView.as_view(url_name='schema'), name='swagger-ui'),
     path('api/docs/redoc/', SpectacularRedocView.as_view(url_name='schema'), name='redoc'),
     path('api/cafe/', include('cafe.urls')),
-] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+    # Resized copies of uploaded images (see backend.images)
+    path('images/<int:width>/<str:fmt>/<path:path>', image_variant, name='image-variant'),
+    # Uploads, in production too (see backend.media)
+    re_path(rf'^{settings.MEDIA_URL.lstrip("/")}(?P<path>.+)$', serve_media),
+]
 
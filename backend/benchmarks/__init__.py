@@ -0,0 +1,9 @@
+"""Load tests for a running server: seeded data, concurrent traffic mixes, saved results.
+
+    python manage.py seed_benchmark --scale 1
+    QUERY_COUNT_HEADER=1 python manage.py runserver --noreload   (or gunicorn)
+    python -m benchmarks run --mix lunch-rush --concurrency 16 --duration 30 --save results/lunch.json
+    python -m benchmarks compare results/lunch.json results/lunch-new.json
+
+Only the standard library is used on the client side.
+"""
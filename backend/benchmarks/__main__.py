@@ -0,0 +1,98 @@
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+from datetime import datetime, timezone
+
+from . import report
+from .runner import run_load
+from .scenarios import MIXES, build_context
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(args):
+    with open(args.manifest) as file:
+        manifest = json.load(file)
+    context = build_context(args.base_url, manifest, args.users)
+    print(f'Running {args.mix} with {args.concurrency} workers for {args.duration}s '
+          f'(+{args.warmup}s warm-up) against {args.base_url}', file=sys.stderr)
+
+    samples = run_load(
+        args.base_url, MIXES[args.mix], context, args.concurrency, args.duration, args.warmup, args.seed,
+    )
+    result = report.build_report(samples, args.duration, {
+        'mix': args.mix,
+        'concurrency': args.concurrency,
+        'duration': args.duration,
+        'warmup': args.warmup,
+        'users': len(context.customer_tokens),
+        'base_url': args.base_url,
+        'started_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'revision': git_revision(),
+        'python': platform.python_version(),
+        'dataset': {'seed': manifest['seed'], 'counts': manifest['counts']},
+    })
+    print(report.format_report(result))
+    if result['total']['queries'] is None:
+        print('No query counts: start the server with QUERY_COUNT_HEADER=1 to include them', file=sys.stderr)
+    if args.save:
+        os.makedirs(os.path.dirname(args.save) or '.', exist_ok=True)
+        report.save(result, args.save)
+        print(f'Saved to {args.save}', file=sys.stderr)
+    if args.compare:
+        return show_comparison(report.load(args.compare), result, args.threshold)
+    return 0
+
+
+def show_comparison(baseline, current, threshold):
+    for key in ('mix', 'concurrency', 'duration', 'dataset'):
+        if baseline['meta'].get(key) != current['meta'].get(key):
+            print(f'Warning: runs differ in {key}', file=sys.stderr)
+    rows, regressions = report.compare(baseline, current, threshold)
+    print(report.format_comparison(rows))
+    if regressions:
+        print(f'{len(regressions)} metric(s) regressed by more than {threshold}%', file=sys.stderr)
+        return 1
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks', description='Load tests against a running server')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = commands.add_parser('run', help='Drive a traffic mix against a running server')
+    run_parser.add_argument('--base-url', default='http://127.0.0.1:8000')
+    run_parser.add_argument('--manifest', default='benchmarks/dataset.json', help='Written by manage.py seed_benchmark')
+    run_parser.add_argument('--mix', choices=list(MIXES), default='mixed')
+    run_parser.add_argument('--concurrency', type=int, default=8, help='Concurrent clients')
+    run_parser.add_argument('--duration', type=float, default=30, help='Measured seconds')
+    run_parser.add_argument('--warmup', type=float, default=5, help='Seconds of load before measuring')
+    run_parser.add_argument('--users', type=int, default=50, help='Customers to log in and spread requests over')
+    run_parser.add_argument('--seed', type=int, help='Random seed for the request sequence')
+    run_parser.add_argument('--save', help='Write the results as JSON here')
+    run_parser.add_argument('--compare', help='Results JSON of an earlier run to compare against')
+    run_parser.add_argument('--threshold', type=float, default=10.0, help='Regression threshold in percent')
+
+    compare_parser = commands.add_parser('compare', help='Compare two saved runs')
+    compare_parser.add_argument('baseline')
+    compare_parser.add_argument('current')
+    compare_parser.add_argument('--threshold', type=float, default=10.0, help='Regression threshold in percent')
+
+    args = parser.parse_args(argv)
+    if args.command == 'run':
+        return run(args)
+    return show_comparison(report.load(args.baseline), report.load(args.current), args.threshold)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,117 @@
+"""Latency percentiles, throughput and queries per request; saving and comparing runs."""
+import json
+from collections import Counter, defaultdict
+
+# Compared between runs; higher is worse for all but throughput
+METRICS = ('p50', 'p95', 'p99', 'rps', 'queries')
+
+
+def percentile(ordered, fraction):
+    """Linear-interpolated percentile of an ascending list"""
+    if not ordered:
+        return None
+    position = (len(ordered) - 1) * fraction
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+def summarize(samples, duration):
+    latencies = sorted(sample.latency for sample in samples)
+    queries = [sample.queries for sample in samples if sample.queries is not None]
+    query_times = [sample.query_time for sample in samples if sample.query_time is not None]
+    statuses = Counter(str(sample.status) for sample in samples)
+    return {
+        'requests': len(samples),
+        # Connection failures (status 0) and server errors; 4xx answers are expected in some mixes
+        'errors': sum(count for status, count in statuses.items() if status == '0' or status.startswith('5')),
+        'statuses': dict(sorted(statuses.items())),
+        'rps': round(len(samples) / duration, 2) if duration else None,
+        'mean': round(sum(latencies) / len(latencies), 2) if latencies else None,
+        'p50': rounded(percentile(latencies, 0.50)),
+        'p95': rounded(percentile(latencies, 0.95)),
+        'p99': rounded(percentile(latencies, 0.99)),
+        'max': rounded(latencies[-1] if latencies else None),
+        'queries': round(sum(queries) / len(queries), 2) if queries else None,
+        'queries_max': max(queries) if queries else None,
+        'query_ms': round(sum(query_times) / len(query_times), 2) if query_times else None,
+    }
+
+
+def rounded(value):
+    return None if value is None else round(value, 2)
+
+
+def build_report(samples, duration, meta):
+    by_endpoint = defaultdict(list)
+    for sample in samples:
+        by_endpoint[sample.endpoint].append(sample)
+    return {
+        'meta': meta,
+        'total': summarize(samples, duration),
+        'endpoints': {endpoint: summarize(group, duration) for endpoint, group in sorted(by_endpoint.items())},
+    }
+
+
+def save(report, path):
+    with open(path, 'w') as file:
+        json.dump(report, file, indent=2)
+
+
+def load(path):
+    with open(path) as file:
+        return json.load(file)
+
+
+def format_report(report):
+    lines = [
+        f'{"endpoint":<24} {"reqs":>7} {"err":>5} {"rps":>8} {"p50 ms":>8} {"p95 ms":>8} {"p99 ms":>8} {"queries":>8}',
+    ]
+    rows = list(report['endpoints'].items()) + [('TOTAL', report['total'])]
+    for endpoint, stats in rows:
+        lines.append(
+            f'{endpoint:<24} {stats["requests"]:>7} {stats["errors"]:>5} {cell(stats["rps"])} {cell(stats["p50"])} '
+            f'{cell(stats["p95"])} {cell(stats["p99"])} {cell(stats["queries"])}'
+        )
+    return '\n'.join(lines)
+
+
+def cell(value):
+    return f'{"-":>8}' if value is None else f'{value:>8.2f}'
+
+
+def compare(baseline, current, threshold=10.0):
+    """Per-endpoint metric changes in percent; returns ``(rows, regressions)``.
+
+    A regression is a latency or query metric that grew (or a throughput that
+    fell) by more than ``threshold`` percent.
+    """
+    rows = []
+    regressions = []
+    endpoints = sorted(set(baseline['endpoints']) | set(current['endpoints']))
+    pairs = [(endpoint, baseline['endpoints'].get(endpoint), current['endpoints'].get(endpoint)) for endpoint in endpoints]
+    pairs.append(('TOTAL', baseline['total'], current['total']))
+    for endpoint, before, after in pairs:
+        if before is None or after is None:
+            rows.append((endpoint, 'only in ' + ('current' if before is None else 'baseline'), None, None, None))
+            continue
+        for metric in METRICS:
+            old, new = before.get(metric), after.get(metric)
+            if old is None or new is None:
+                continue
+            change = (new - old) / old * 100 if old else (0.0 if new == old else float('inf'))
+            worse = -change if metric == 'rps' else change
+            rows.append((endpoint, metric, old, new, change))
+            if worse > threshold:
+                regressions.append((endpoint, metric, old, new, change))
+    return rows, regressions
+
+
+def format_comparison(rows):
+    lines = [f'{"endpoint":<24} {"metric":<8} {"baseline":>10} {"current":>10} {"change":>9}']
+    for endpoint, metric, old, new, change in rows:
+        if change is None:
+            lines.append(f'{endpoint:<24} {metric}')
+        else:
+            lines.append(f'{endpoint:<24} {metric:<8} {old:>10.2f} {new:>10.2f} {change:>+8.1f}%')
+    return '\n'.join(lines)
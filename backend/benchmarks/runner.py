@@ -0,0 +1,125 @@
+"""Concurrent HTTP load against a running server.
+
+Each worker thread keeps one persistent connection and loops: pick a weighted
+action from the traffic mix, send its request, record the latency, status and
+the server's ``X-Query-Count``. Requests finished during the warm-up are
+dropped from the samples. An action that raises is recorded as a failed
+request (status 0) under its function name.
+"""
+import http.client
+import json
+import random
+import threading
+import time
+from urllib.parse import urlencode, urlsplit
+
+
+class Sample:
+    __slots__ = ('endpoint', 'status', 'latency', 'queries', 'query_time', 'finished')
+
+    def __init__(self, endpoint, status, latency, queries, query_time, finished):
+        self.endpoint = endpoint
+        self.status = status
+        self.latency = latency
+        self.queries = queries
+        self.query_time = query_time
+        self.finished = finished
+
+
+class Session:
+    """One keep-alive connection to the server, as one browser or terminal would use"""
+
+    def __init__(self, base_url, timeout=30):
+        parts = urlsplit(base_url)
+        connection_class = http.client.HTTPSConnection if parts.scheme == 'https' else http.client.HTTPConnection
+        self.connection_class = connection_class
+        self.netloc = parts.netloc
+        self.timeout = timeout
+        self.connection = None
+        self.samples = []
+        self.recording = False
+
+    def request(self, endpoint, method, path, params=None, body=None, token=None, headers=None):
+        """Send one request; returns ``(status, headers, parsed JSON or None)``"""
+        if params:
+            path = f'{path}?{urlencode(params)}'
+        headers = dict(headers or {})
+        if body is not None:
+            body = json.dumps(body)
+            headers['Content-Type'] = 'application/json'
+        if token:
+            headers['Authorization'] = f'Bearer {token}'
+
+        started = time.perf_counter()
+        try:
+            if self.connection is None:
+                self.connection = self.connection_class(self.netloc, timeout=self.timeout)
+            self.connection.request(method, path, body=body, headers=headers)
+            response = self.connection.getresponse()
+            content = response.read()
+            status = response.status
+        except (OSError, http.client.HTTPException):
+            self.close()
+            response, content, status = None, b'', 0
+        finished = time.perf_counter()
+
+        if self.recording:
+            self.samples.append(Sample(
+                endpoint, status, (finished - started) * 1000,
+                int(response.headers['X-Query-Count']) if response and 'X-Query-Count' in response.headers else None,
+                float(response.headers['X-Query-Time']) if response and 'X-Query-Time' in response.headers else None,
+                finished,
+            ))
+        if response is None:
+            return status, {}, None
+        try:
+            data = json.loads(content) if content else None
+        except ValueError:
+            data = None
+        return status, response.headers, data
+
+    def close(self):
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+
+def run_load(base_url, mix, context, concurrency, duration, warmup=0, seed=None):
+    """Drive ``mix`` (``[(weight, action)]``) from ``concurrency`` threads.
+
+    Returns the samples that finished inside the measured window.
+    """
+    actions = [action for _, action in mix]
+    weights = [weight for weight, _ in mix]
+    started = time.perf_counter()
+    measure_from = started + warmup
+    stop_at = measure_from + duration
+    sessions = [Session(base_url) for _ in range(concurrency)]
+
+    def work(index, session):
+        rng = random.Random(None if seed is None else seed + index)
+        while True:
+            now = time.perf_counter()
+            if now >= stop_at:
+                break
+            session.recording = now >= measure_from
+            action = rng.choices(actions, weights)[0]
+            try:
+                action(session, context, rng)
+            except Exception:
+                # A broken scenario shows up as failed requests, not as missing throughput
+                session.close()
+                if session.recording:
+                    finished = time.perf_counter()
+                    session.samples.append(Sample(action.__name__, 0, (finished - now) * 1000, None, None, finished))
+        session.close()
+
+    threads = [
+        threading.Thread(target=work, args=(index, session), daemon=True)
+        for index, session in enumerate(sessions)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return [sample for session in sessions for sample in session.samples if sample.finished <= stop_at]
@@ -0,0 +1,182 @@
+"""Traffic mixes: weighted actions, each one request as a real client would send it.
+
+Actions take ``(session, context, rng)``. The context comes from the manifest
+written by ``manage.py seed_benchmark`` plus access tokens fetched once
+before the run.
+"""
+import random
+import threading
+from datetime import date, timedelta
+
+from .runner import Session
+
+# Lunch first: that is the rush the gate scenario models
+SCAN_MEAL_TYPES = ('lunch', 'breakfast', 'dinner')
+
+
+class Context:
+    """State shared by all worker threads; anything they change is behind ``lock``"""
+
+    def __init__(self, manifest, staff_token, customer_tokens):
+        self.manifest = manifest
+        self.staff_token = staff_token
+        self.customer_tokens = customer_tokens
+        self.lock = threading.Lock()
+        self._menu_etag = None
+        # Every (student, meal) the server has not served yet today, popped
+        # from the end. The seed only logs past days, so on a fresh dataset
+        # each scan is a first serving until all of them are used up.
+        self.pending_scans = []
+        shuffler = random.Random(manifest['seed'])
+        for meal_type in reversed(SCAN_MEAL_TYPES):
+            students = list(manifest['students'])
+            shuffler.shuffle(students)
+            self.pending_scans.extend((code, meal_type) for code in students)
+
+    @property
+    def menu_etag(self):
+        with self.lock:
+            return self._menu_etag
+
+    @menu_etag.setter
+    def menu_etag(self, etag):
+        with self.lock:
+            self._menu_etag = etag
+
+    def next_scan(self, rng):
+        """``(code, meal_type)`` of a serving not scanned yet, or a repeat once all are"""
+        with self.lock:
+            if self.pending_scans:
+                return self.pending_scans.pop()
+        return rng.choice(self.manifest['students']), rng.choice(SCAN_MEAL_TYPES)
+
+
+def login(session, username, password):
+    status, _, data = session.request('auth.login', 'POST', '/api/cafe/auth/login/', body={
+        'username': username, 'password': password,
+    })
+    if status != 200:
+        raise RuntimeError(f'Could not log in as {username} (HTTP {status}); was seed_benchmark run?')
+    return data['tokens']['access']
+
+
+def build_context(base_url, manifest, users):
+    """Log the staff user and up to ``users`` customers in (not timed)"""
+    session = Session(base_url)
+    try:
+        staff_token = login(session, manifest['staff'], manifest['password'])
+        customer_tokens = [
+            login(session, username, manifest['password']) for username in manifest['customers'][:users]
+        ]
+    finally:
+        session.close()
+    return Context(manifest, staff_token, customer_tokens)
+
+
+# Gate terminals at lunch
+
+def scan_meal(session, context, rng):
+    code, meal_type = context.next_scan(rng)
+    session.request('meals.scan', 'POST', '/api/meals/scan/', body={'code': code, 'meal_type': meal_type})
+
+
+def lookup_student(session, context, rng):
+    # Partial ids typed in by hand
+    session.request('students.lookup', 'GET', '/api/students/lookup/', {
+        'code': rng.choice(context.manifest['students'])[-5:],
+    })
+
+
+def recent_meals(session, context, rng):
+    session.request('meals.list', 'GET', '/api/meals/', {'service_date': date.today().isoformat(), 'cursor': ''})
+
+
+# Customers browsing the menu
+
+def menu_snapshot(session, context, rng):
+    etag = context.menu_etag
+    headers = {'If-None-Match': etag} if etag and rng.random() < 0.5 else None
+    status, response_headers, _ = session.request('menu.snapshot', 'GET', '/api/cafe/menu/', headers=headers)
+    if status == 200:
+        context.menu_etag = response_headers.get('ETag')
+
+
+def menu_items_by_category(session, context, rng):
+    session.request('menu-items.list', 'GET', '/api/cafe/menu-items/', {
+        'category': rng.choice(context.manifest['categories']),
+    }, token=rng.choice(context.customer_tokens))
+
+
+def menu_item_detail(session, context, rng):
+    item = rng.choice(context.manifest['menu_items'])
+    session.request('menu-items.detail', 'GET', f'/api/cafe/menu-items/{item}/',
+                    token=rng.choice(context.customer_tokens))
+
+
+def categories(session, context, rng):
+    session.request('categories.list', 'GET', '/api/cafe/categories/', token=rng.choice(context.customer_tokens))
+
+
+# Customers ordering
+
+def place_order(session, context, rng):
+    menu_items = context.manifest['menu_items']
+    items = rng.sample(menu_items, min(len(menu_items), rng.randint(1, 3)))
+    session.request('orders.create', 'POST', '/api/cafe/orders/', body={
+        'payment_method': rng.choice(['cash', 'card']),
+        'order_items': [{'menu_item': item, 'quantity': rng.randint(1, 2)} for item in items],
+    }, token=rng.choice(context.customer_tokens))
+
+
+def my_orders(session, context, rng):
+    session.request('orders.list', 'GET', '/api/cafe/orders/', {'cursor': ''},
+                    token=rng.choice(context.customer_tokens))
+
+
+def table_availability(session, context, rng):
+    day = date.today() + timedelta(days=rng.randrange(14))
+    session.request('tables.availability', 'GET', '/api/cafe/tables/availability/', {
+        'date': day.isoformat(), 'party_size': rng.randint(1, 6),
+    }, token=rng.choice(context.customer_tokens))
+
+
+# Staff screens polling
+
+def dashboard_stats(session, context, rng):
+    session.request('dashboard.stats', 'GET', '/api/cafe/dashboard/stats/', token=context.staff_token)
+
+
+def order_queue(session, context, rng):
+    session.request('orders.queue', 'GET', '/api/cafe/orders/', {
+        'status': rng.choice(['pending', 'confirmed', 'preparing']), 'cursor': '',
+    }, token=context.staff_token)
+
+
+def unread_notifications(session, context, rng):
+    session.request('notifications.unread', 'GET', '/api/cafe/notifications/unread_count/', token=context.staff_token)
+
+
+def sales_report(session, context, rng):
+    session.request('reports.sales', 'GET', '/api/cafe/reports/sales/', {'period': rng.choice(['week', 'month'])},
+                    token=context.staff_token)
+
+
+def meal_stats(session, context, rng):
+    session.request('meals.stats', 'GET', '/api/meals/stats/', {'days': 7}, token=context.staff_token)
+
+
+MIXES = {
+    'lunch-rush': [(8, scan_meal), (1, lookup_student), (1, recent_meals)],
+    'menu-browsing': [(5, menu_snapshot), (3, menu_items_by_category), (1, menu_item_detail), (1, categories)],
+    'order-placement': [(6, place_order), (3, my_orders), (1, table_availability)],
+    'dashboard-polling': [
+        (3, dashboard_stats), (3, order_queue), (2, unread_notifications), (1, sales_report), (1, meal_stats),
+    ],
+}
+# Everything at once, roughly as a weekday noon looks
+MIXES['mixed'] = (
+    [(weight * 4, action) for weight, action in MIXES['lunch-rush']]
+    + [(weight * 3, action) for weight, action in MIXES['menu-browsing']]
+    + [(weight * 2, action) for weight, action in MIXES['order-placement']]
+    + MIXES['dashboard-polling']
+)
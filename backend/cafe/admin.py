@@ -3,7 +3,8 @@ from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
 from django.contrib.auth.models import User
 from .models import (
     UserProfile, Category, MenuItem, Order, OrderItem, Payment,
-    Table, Reservation, Review, Inventory, StaffSchedule, Notification
+    Table, Reservation, Review, Inventory, StaffSchedule, Notification,
+    DailySalesRollup, CategorySalesRollup, RecipeIngredient, StockDeduction, sync_order_stock
 )
 
 
@@ -13,6 +14,12 @@ class UserProfileInline(admin.StackedInline):
     verbose_name_plural = 'Profile'
 
 
+class RecipeIngredientInline(admin.TabularInline):
+    model = RecipeIngredient
+    extra = 1
+    autocomplete_fields = ['inventory']
+
+
 class UserAdmin(BaseUserAdmin):
     inlines = (UserProfileInline,)
 
@@ -23,6 +30,16 @@ class OrderItemInline(admin.TabularInline):
     readonly_fields = ['total_price']
 
 
+class StockDeductionInline(admin.TabularInline):
+    model = StockDeduction
+    extra = 0
+    can_delete = False
+    readonly_fields = ['inventory', 'quantity', 'shortfall']
+    
+    def has_add_permission(self, request, obj=None):
+        return False
+
+
 @admin.register(UserProfile)
 class UserProfileAdmin(admin.ModelAdmin):
     list_display = ['user', 'role', 'phone', 'is_active', 'date_joined']
@@ -46,6 +63,7 @@ class MenuItemAdmin(admin.ModelAdmin):
     search_fields = ['name', 'description', 'category__name']
     ordering = ['category', 'name']
     readonly_fields = ['profit_margin']
+    inlines = [RecipeIngredientInline]
 
 
 @admin.register(Order)
@@ -54,8 +72,14 @@ class OrderAdmin(admin.ModelAdmin):
     list_filter = ['status', 'payment_status', 'payment_method', 'created_at']
     search_fields = ['customer__username', 'customer__first_name', 'customer__last_name']
     ordering = ['-created_at']
-    inlines = [OrderItemInline]
+    inlines = [OrderItemInline, StockDeductionInline]
     readonly_fields = ['id', 'subtotal', 'tax_amount', 'total_amount', 'created_at', 'updated_at']
+    
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        form.instance.recalculate_totals()
+        # An order added as confirmed has its items only now
+        sync_order_stock(form.instance.pk)
 
 
 @admin.register(OrderItem)
@@ -64,6 +88,14 @@ class OrderItemAdmin(admin.ModelAdmin):
     list_filter = ['order__status', 'menu_item__category']
     search_fields = ['order__customer__username', 'menu_item__name']
     readonly_fields = ['total_price']
+    
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        obj.order.recalculate_totals()
+    
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        obj.order.recalculate_totals()
 
 
 @admin.register(Payment)
@@ -123,6 +155,21 @@ class NotificationAdmin(admin.ModelAdmin):
     ordering = ['-created_at']
 
 
+@admin.register(DailySalesRollup)
+class DailySalesRollupAdmin(admin.ModelAdmin):
+    list_display = ['date', 'orders', 'revenue']
+    date_hierarchy = 'date'
+    ordering = ['-date']
+
+
+@admin.register(CategorySalesRollup)
+class CategorySalesRollupAdmin(admin.ModelAdmin):
+    list_display = ['date', 'category', 'orders', 'items_sold', 'revenue']
+    list_filter = ['category']
+    date_hierarchy = 'date'
+    ordering = ['-date', 'category']
+
+
 # Unregister the default User admin and register our custom one
 admin.site.unregister(User)
 admin.site.register(User, UserAdmin)
\ No newline at end of file
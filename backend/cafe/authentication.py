@@ -0,0 +1,78 @@
+"""JWT authentication that reads the role from the token instead of the database.
+
+Safe (read-only) requests are authenticated from the signed claims alone:
+``request.user`` is a ``RoleTokenUser`` whose ``profile`` is an unsaved
+``UserProfile`` carrying the token's role, so permission checks and
+``request.user.profile`` work without a query. The only lookup is the
+profile's ``role_version`` (see ``cafe.cache.get_role_version``): one
+indexed read, or a shared cache hit with ``ROLE_VERSION_CACHED``. A token
+stamped with an older version is rejected, and a deactivated ``User`` has
+no version at all, so role changes and deactivations take effect in every
+worker immediately instead of when the token expires.
+
+Unsafe requests still load the ``User`` row, since writes assign it to
+foreign keys.
+"""
+from django.conf import settings
+from django.utils.functional import cached_property
+from rest_framework import permissions
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.models import TokenUser
+from rest_framework_simplejwt.settings import api_settings
+
+from .cache import get_role_version
+from .models import UserProfile
+from .tokens import ROLE_CLAIM, ROLE_VERSION_CLAIM
+
+
+class RoleTokenUser(TokenUser):
+    """Stateless user backed by a validated token with role claims"""
+
+    @cached_property
+    def profile(self):
+        return UserProfile(
+            user_id=self.id,
+            role=self.token[ROLE_CLAIM],
+            role_version=self.token[ROLE_VERSION_CLAIM],
+        )
+
+
+class RoleJWTAuthentication(JWTAuthentication):
+    def authenticate(self, request):
+        header = self.get_header(request)
+        if header is None:
+            return None
+        raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            return None
+        validated_token = self.get_validated_token(raw_token)
+
+        if ROLE_CLAIM not in validated_token:
+            # Issued before role claims existed
+            return self.get_user(validated_token), validated_token
+
+        self.check_role_version(validated_token)
+        if request.method in permissions.SAFE_METHODS:
+            return RoleTokenUser(validated_token), validated_token
+        return self.get_user(validated_token), validated_token
+
+    def check_role_version(self, validated_token):
+        user_id = validated_token[api_settings.USER_ID_CLAIM]
+        version = validated_token.get(ROLE_VERSION_CLAIM)
+        current = get_role_version(user_id)
+        if current != version and settings.ROLE_VERSION_CACHED:
+            # The cached version may be older than a freshly issued token
+            current = get_role_version(user_id, refresh=True)
+        if current is None or current != version:
+            raise AuthenticationFailed('Token role is out of date', code='token_role_outdated')
+
+
+def authenticate_access_token(raw_token):
+    """Validate a raw access token (e.g. from a query string) and return its ``RoleTokenUser``"""
+    authentication = RoleJWTAuthentication()
+    validated_token = authentication.get_validated_token(raw_token)
+    if ROLE_CLAIM not in validated_token:
+        raise AuthenticationFailed('Token has no role claim', code='token_not_valid')
+    authentication.check_role_version(validated_token)
+    return RoleTokenUser(validated_token)
@@ -0,0 +1,90 @@
+"""Free tables and start times for reservations.
+
+Bookings are stored as ``[starts_at, ends_at)`` intervals with a partial
+index on ``(table, starts_at, ends_at)`` over active bookings, so a day's
+availability is one index range read for every suitable table. Each table's
+bookings are merged into busy blocks and swept once against the slot grid.
+"""
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from django.db import transaction
+from django.utils import timezone
+from rest_framework import serializers
+
+from .models import Reservation, Table
+
+
+def busy_blocks(intervals):
+    """Merge ``(start, end)`` pairs sorted by start into disjoint blocks"""
+    blocks = []
+    for start, end in intervals:
+        if blocks and start <= blocks[-1][1]:
+            blocks[-1][1] = max(blocks[-1][1], end)
+        else:
+            blocks.append([start, end])
+    return blocks
+
+
+def free_slots(blocks, window_start, window_end, length, step):
+    """Start times on the ``step`` grid where ``length`` fits between ``blocks``"""
+    slots = []
+    slot = window_start
+    index = 0
+    while slot + length <= window_end:
+        while index < len(blocks) and blocks[index][1] <= slot:
+            index += 1
+        if index < len(blocks) and blocks[index][0] < slot + length:
+            # Jump to the first grid point after this block
+            steps = -(-(blocks[index][1] - window_start) // step)
+            slot = window_start + steps * step
+            continue
+        slots.append(slot)
+        slot += step
+    return slots
+
+
+def table_availability(day, opens, closes, party_size, duration, step):
+    """``[(table, [slot starts])]`` for active tables seating ``party_size`` with a free slot"""
+    window_start = timezone.make_aware(datetime.combine(day, opens))
+    window_end = timezone.make_aware(datetime.combine(day, closes))
+    tables = list(
+        Table.objects.filter(is_active=True, capacity__gte=party_size)
+        .exclude(status='maintenance').order_by('capacity', 'number')
+    )
+    bookings = defaultdict(list)
+    rows = Reservation.objects.active().overlapping(window_start, window_end).filter(
+        table__in=[table.pk for table in tables]
+    ).order_by('table', 'starts_at').values_list('table', 'starts_at', 'ends_at')
+    for table_id, starts_at, ends_at in rows:
+        bookings[table_id].append((starts_at, ends_at))
+
+    length, step = timedelta(minutes=duration), timedelta(minutes=step)
+    availability = []
+    for table in tables:
+        slots = free_slots(busy_blocks(bookings[table.pk]), window_start, window_end, length, step)
+        if slots:
+            availability.append((table, slots))
+    return availability
+
+
+def book(reservation):
+    """Save ``reservation`` unless it overlaps an active booking on its table.
+
+    The table row is locked (``SELECT ... FOR UPDATE``) for the rest of the
+    transaction, so concurrent bookings of one table are checked and saved
+    one at a time; bookings of other tables do not wait.
+    """
+    with transaction.atomic():
+        list(Table.objects.select_for_update().filter(pk=reservation.table_id).values_list('pk'))
+        if reservation.status in Reservation.ACTIVE_STATUSES:
+            reservation.set_interval()
+            clashes = Reservation.objects.active().overlapping(reservation.starts_at, reservation.ends_at).filter(
+                table_id=reservation.table_id
+            )
+            if reservation.pk:
+                clashes = clashes.exclude(pk=reservation.pk)
+            if clashes.exists():
+                raise serializers.ValidationError({'table': ['This table is already booked for that time.']})
+        reservation.save()
+    return reservation
@@ -0,0 +1,108 @@
+"""Cache keys and invalidation helpers for cafe read paths"""
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Max
+
+DASHBOARD_STATS_KEY = 'cafe:dashboard-stats'
+MENU_VERSION_KEY = 'cafe:menu-version'
+
+
+def role_version_key(user_id):
+    return f'cafe:role-version:{user_id}'
+
+
+def unread_count_key(user_id):
+    return f'cafe:unread-notifications:{user_id}'
+
+
+def invalidate_dashboard_stats():
+    cache.delete(DASHBOARD_STATS_KEY)
+
+
+def get_menu_version():
+    """Return a stamp that changes whenever a menu item or category changes.
+
+    The stamp is derived from the tables (latest ``updated_at`` and row
+    counts), so it is correct across processes; it is cached until the next
+    menu write in this process, or ``MENU_VERSION_TTL`` seconds at most.
+    """
+    version = cache.get(MENU_VERSION_KEY)
+    if version is None:
+        from .models import Category, MenuItem
+
+        items = MenuItem.objects.aggregate(changed=Max('updated_at'), total=Count('id'))
+        categories = Category.objects.aggregate(changed=Max('updated_at'), total=Count('id'))
+        stamp = f"{items['changed']}|{items['total']}|{categories['changed']}|{categories['total']}"
+        version = hashlib.sha1(stamp.encode()).hexdigest()[:16]
+        cache.set(MENU_VERSION_KEY, version, settings.MENU_VERSION_TTL)
+    return version
+
+
+def bump_menu_version():
+    cache.delete(MENU_VERSION_KEY)
+
+
+def get_role_version(user_id, refresh=False):
+    """Return the user's current ``UserProfile.role_version``.
+
+    ``None`` if there is no profile or the ``User`` is deactivated. With
+    ``ROLE_VERSION_CACHED`` it is cached until the profile's role or the user's
+    ``is_active`` changes, or ``ROLE_VERSION_TTL`` seconds at most, and
+    ``refresh`` forces a database read. Otherwise every call reads the profile
+    row by its unique ``user_id``.
+    """
+    key = role_version_key(user_id)
+    version = None if refresh or not settings.ROLE_VERSION_CACHED else cache.get(key)
+    if version is None:
+        from .models import UserProfile
+
+        version = UserProfile.objects.filter(user_id=user_id, user__is_active=True).values_list(
+            'role_version', flat=True
+        ).first()
+        if version is not None and settings.ROLE_VERSION_CACHED:
+            cache.set(key, version, settings.ROLE_VERSION_TTL)
+    return version
+
+
+def expire_role_version(user_id):
+    cache.delete(role_version_key(user_id))
+
+
+def get_unread_count(user_id):
+    """Return the user's unread notification count.
+
+    With ``NOTIFICATION_UNREAD_CACHED`` the counter is adjusted in place as
+    notifications are created and read, and recounted (from the partial unread
+    index) after ``NOTIFICATION_UNREAD_TTL`` seconds at most, or when a write
+    could not be applied to it. Otherwise every read counts from the index.
+    """
+    key = unread_count_key(user_id)
+    count = cache.get(key) if settings.NOTIFICATION_UNREAD_CACHED else None
+    if count is None:
+        from .models import Notification
+
+        count = Notification.objects.filter(user_id=user_id, is_read=False).count()
+        if settings.NOTIFICATION_UNREAD_CACHED:
+            cache.set(key, count, settings.NOTIFICATION_UNREAD_TTL)
+    return count
+
+
+def adjust_unread_count(user_id, delta):
+    # A counter that is not cached is simply recounted on the next read
+    if not settings.NOTIFICATION_UNREAD_CACHED:
+        return
+    try:
+        cache.incr(unread_count_key(user_id), delta)
+    except ValueError:
+        pass
+
+
+def reset_unread_count(user_id):
+    if settings.NOTIFICATION_UNREAD_CACHED:
+        cache.set(unread_count_key(user_id), 0, settings.NOTIFICATION_UNREAD_TTL)
+
+
+def expire_unread_counts(user_ids):
+    cache.delete_many([unread_count_key(user_id) for user_id in user_ids])
@@ -0,0 +1,202 @@
+"""Publish/subscribe for live screens (kitchen queue, notification badges).
+
+Publishers are ordinary (sync) Django code such as signal handlers; each
+event is serialised once and handed to every subscriber, so N screens cost
+one query/serialisation plus N queue puts. Subscribers are async SSE views
+running on the ASGI event loop.
+
+``LocalBroker`` fans out inside one process. With several worker processes
+set ``EVENTS_BROKER = 'cafe.events.RedisBroker'`` (the default when
+``REDIS_URL`` is set): events are published to Redis and each process runs a
+single listener that fans them out locally.
+"""
+import asyncio
+import json
+import logging
+import threading
+from collections import defaultdict
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+from rest_framework.utils.encoders import JSONEncoder
+
+logger = logging.getLogger(__name__)
+
+ORDERS_CHANNEL = 'orders'
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def user_channel(user_id):
+    """Notifications for one user"""
+    return f'notifications:user:{user_id}'
+
+
+def role_channel(role):
+    """Broadcast notifications for every user with ``role``"""
+    return f'notifications:role:{role}'
+
+
+def encode_event(event_type, data):
+    return json.dumps({'type': event_type, 'data': data}, cls=JSONEncoder)
+
+
+def sse_message(message, event_id=None):
+    """Format one server-sent event (``message`` is already JSON)"""
+    prefix = f'id: {event_id}\n' if event_id is not None else ''
+    return f'{prefix}data: {message}\n\n'
+
+
+class SubscriptionOverflow(Exception):
+    """The subscriber fell too far behind; it should reconnect and take a new snapshot"""
+
+
+class Subscription:
+    _OVERFLOW = object()
+
+    def __init__(self, broker, channels, maxsize=1000):
+        self.broker = broker
+        self.channels = channels
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize)
+
+    def offer(self, message):
+        """Queue a message; runs on the subscriber's event loop"""
+        try:
+            self.queue.put_nowait(message)
+        except asyncio.QueueFull:
+            self.queue.get_nowait()
+            self.queue.put_nowait(self._OVERFLOW)
+
+    async def get(self, timeout=None):
+        """Next message, or ``None`` when ``timeout`` passes first"""
+        try:
+            message = await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+        if message is self._OVERFLOW:
+            raise SubscriptionOverflow
+        return message
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+
+class LocalBroker:
+    """In-process fan-out; ``publish`` may be called from any thread"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscriptions = defaultdict(set)
+
+    def publish(self, channel, message):
+        with self._lock:
+            subscriptions = list(self._subscriptions.get(channel, ()))
+        for subscription in subscriptions:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.offer, message)
+            except RuntimeError:
+                # The subscriber's loop has closed
+                self.unsubscribe(subscription)
+
+    async def subscribe(self, *channels):
+        """One queue receiving the messages of every channel in ``channels``"""
+        subscription = Subscription(self, channels)
+        with self._lock:
+            for channel in channels:
+                self._subscriptions[channel].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            for channel in subscription.channels:
+                subscribers = self._subscriptions.get(channel)
+                if subscribers is not None:
+                    subscribers.discard(subscription)
+                    if not subscribers:
+                        del self._subscriptions[channel]
+
+    def has_subscribers(self, channel):
+        return bool(self._subscriptions.get(channel))
+
+
+class RedisBroker(LocalBroker):
+    """Cross-process fan-out over Redis pub/sub (requires the ``redis`` package)"""
+    prefix = 'cafe-events:'
+
+    def __init__(self):
+        super().__init__()
+        import redis
+
+        self.url = settings.EVENTS_REDIS_URL
+        self.client = redis.Redis.from_url(self.url)
+        self._listener = None
+        self._listener_lock = None
+
+    def publish(self, channel, message):
+        self.client.publish(self.prefix + channel, message)
+
+    def has_subscribers(self, channel):
+        # Subscribers may be connected to other processes
+        return True
+
+    async def subscribe(self, *channels):
+        await self._ensure_listener()
+        return await super().subscribe(*channels)
+
+    async def _ensure_listener(self):
+        if self._listener_lock is None:
+            self._listener_lock = asyncio.Lock()
+        async with self._listener_lock:
+            if self._listener is None or self._listener.done():
+                import redis.asyncio
+
+                pubsub = redis.asyncio.Redis.from_url(self.url).pubsub()
+                await pubsub.psubscribe(self.prefix + '*')
+                self._listener = asyncio.create_task(self._listen(pubsub))
+
+    async def _listen(self, pubsub):
+        try:
+            async for message in pubsub.listen():
+                if message['type'] == 'pmessage':
+                    channel = message['channel'].decode()[len(self.prefix):]
+                    super().publish(channel, message['data'].decode())
+        except Exception:
+            logger.exception('Redis event listener stopped')
+
+
+def get_broker():
+    global _broker
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                _broker = import_string(settings.EVENTS_BROKER)()
+    return _broker
+
+
+def has_subscribers(channel):
+    return get_broker().has_subscribers(channel)
+
+
+def publish(channel, event_type, data):
+    get_broker().publish(channel, encode_event(event_type, data))
+
+
+async def event_stream(subscription, snapshot):
+    """Yield server-sent events: ``snapshot`` first, then every published message.
+
+    A comment line is sent every ``EVENT_STREAM_HEARTBEAT`` seconds of quiet so
+    proxies keep the connection open. If the subscriber falls behind, a
+    ``reset`` event is sent and the stream ends; the client reconnects and
+    gets a fresh snapshot.
+    """
+    try:
+        yield sse_message(snapshot)
+        while True:
+            message = await subscription.get(timeout=settings.EVENT_STREAM_HEARTBEAT)
+            yield sse_message(message) if message is not None else ': keepalive\n\n'
+    except SubscriptionOverflow:
+        yield sse_message(encode_event('reset', None))
+    finally:
+        subscription.close()
@@ -0,0 +1,26 @@
+from backend.exports import Export
+from .models import Order, Payment
+
+ORDER_EXPORT = Export('orders', Order, [
+    ('id', 'id'),
+    ('created_at', 'created_at'),
+    ('completed_at', 'completed_at'),
+    ('customer', 'customer__username'),
+    ('status', 'status'),
+    ('payment_status', 'payment_status'),
+    ('payment_method', 'payment_method'),
+    ('subtotal', 'subtotal'),
+    ('tax_amount', 'tax_amount'),
+    ('total_amount', 'total_amount'),
+], date_field='created_at')
+
+PAYMENT_EXPORT = Export('payments', Payment, [
+    ('id', 'id'),
+    ('order', 'order_id'),
+    ('created_at', 'created_at'),
+    ('completed_at', 'completed_at'),
+    ('amount', 'amount'),
+    ('payment_method', 'payment_method'),
+    ('status', 'status'),
+    ('transaction_id', 'transaction_id'),
+], date_field='created_at')
@@ -0,0 +1,17 @@
+import django_filters
+
+from .models import Inventory
+
+
+class InventoryFilter(django_filters.FilterSet):
+    """Inventory filters; ``is_low_stock`` is evaluated in SQL"""
+    is_low_stock = django_filters.BooleanFilter(method='filter_low_stock')
+
+    class Meta:
+        model = Inventory
+        fields = ['is_active', 'is_low_stock']
+
+    def filter_low_stock(self, queryset, name, value):
+        if value:
+            return queryset.low_stock()
+        return queryset.exclude(pk__in=queryset.low_stock().values('pk'))
@@ -0,0 +1,82 @@
+import statistics
+import time
+import uuid
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from backend.pagination import KeysetPagination, encode_cursor, encode_value
+from cafe.models import Order
+from cafe.views import OrderViewSet
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare page-number and cursor pagination on the order list at increasing depths. '
+        'Rows are seeded inside a transaction that is rolled back afterwards.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1_000_000, help='Orders to seed')
+        parser.add_argument('--page-size', type=int, default=20)
+        parser.add_argument('--repeat', type=int, default=5, help='Timed fetches per depth (median reported)')
+        parser.add_argument('--batch-size', type=int, default=10_000, help='Rows per seeding insert')
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self.seed(options['rows'], options['batch_size'])
+                self.run(options['rows'], options['page_size'], options['repeat'])
+                raise Rollback
+        except Rollback:
+            self.stdout.write('Seeded rows rolled back')
+
+    def seed(self, rows, batch_size):
+        customer = User.objects.create_user(f'benchmark-{uuid.uuid4().hex[:8]}')
+        done = 0
+        while done < rows:
+            size = min(batch_size, rows - done)
+            Order.objects.bulk_create([Order(customer=customer) for _ in range(size)], batch_size=batch_size)
+            done += size
+            if done % (batch_size * 10) == 0 or done == rows:
+                self.stdout.write(f'  seeded {done}/{rows}')
+
+    def run(self, rows, page_size, repeat):
+        queryset = OrderViewSet.queryset.order_by(*OrderViewSet.ordering)
+        total_pages = max(1, Order.objects.count() // page_size)
+        depths = sorted({1, 10, total_pages // 100, total_pages // 10, total_pages // 2, total_pages} - {0})
+
+        self.stdout.write(f'{"page":>10} {"depth (rows)":>14} {"page number ms":>16} {"cursor ms":>12}')
+        for page in depths:
+            offset = (page - 1) * page_size
+            paged = self.time(repeat, PageNumberPagination, queryset, {'page': page}, page_size)
+
+            # Cursor pointing just before the same page (position lookup is not timed)
+            cursor = ''
+            if offset:
+                fields = [field.lstrip('-') for field in OrderViewSet.cursor_ordering]
+                position = Order.objects.order_by(*OrderViewSet.cursor_ordering).values_list(*fields)[offset - 1]
+                cursor = encode_cursor([encode_value(value) for value in position])
+            keyset = self.time(repeat, KeysetPagination, queryset, {'cursor': cursor}, page_size)
+
+            self.stdout.write(f'{page:>10} {offset:>14} {paged:>16.2f} {keyset:>12.2f}')
+
+    def time(self, repeat, pagination_class, queryset, params, page_size):
+        request = Request(APIRequestFactory().get('/api/cafe/orders/', params))
+        samples = []
+        for _ in range(repeat):
+            paginator = pagination_class()
+            paginator.page_size = page_size
+            started = time.perf_counter()
+            page = paginator.paginate_queryset(queryset, request, view=OrderViewSet)
+            list(page)
+            samples.append((time.perf_counter() - started) * 1000)
+        return statistics.median(samples)
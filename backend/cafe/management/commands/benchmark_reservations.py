@@ -0,0 +1,97 @@
+import random
+import statistics
+import time as timer
+import uuid
+from datetime import time, timedelta
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+from rest_framework import serializers
+
+from cafe.availability import book, table_availability
+from cafe.models import Reservation, Table
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        'Time table availability and bookings against a semester of reservations. '
+        'Rows are seeded inside a transaction that is rolled back afterwards.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=16 * 7, help='Days of bookings to seed (default: one semester)')
+        parser.add_argument('--tables', type=int, default=40)
+        parser.add_argument('--per-table', type=int, default=6, help='Bookings per table per day')
+        parser.add_argument('--repeat', type=int, default=50, help='Timed calls per measurement (median reported)')
+        parser.add_argument('--batch-size', type=int, default=5000, help='Rows per seeding insert')
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                first_day = timezone.localdate() + timedelta(days=1)
+                customer, tables = self.seed(first_day, options)
+                self.run(first_day, options['days'], customer, tables, options['repeat'])
+                raise Rollback
+        except Rollback:
+            self.stdout.write('Seeded rows rolled back')
+
+    def seed(self, first_day, options):
+        tag = uuid.uuid4().hex[:6]
+        customer = User.objects.create_user(f'benchmark-{tag}')
+        tables = Table.objects.bulk_create([
+            Table(number=f'B{tag}-{i}', capacity=random.choice([2, 4, 4, 6, 8])) for i in range(options['tables'])
+        ])
+        batch = []
+        total = 0
+        for day_index in range(options['days']):
+            day = first_day + timedelta(days=day_index)
+            for table in tables:
+                # Hour-long bookings between 08:00 and 20:00, without overlaps
+                for hour in sorted(random.sample(range(8, 20), options['per_table'])):
+                    reservation = Reservation(
+                        customer=customer, table=table, date=day, time=time(hour),
+                        party_size=1, status=random.choice(Reservation.ACTIVE_STATUSES + ['cancelled']),
+                    )
+                    reservation.set_interval()
+                    batch.append(reservation)
+            if len(batch) >= options['batch_size'] or day_index == options['days'] - 1:
+                Reservation.objects.bulk_create(batch, batch_size=options['batch_size'])
+                total += len(batch)
+                batch = []
+                self.stdout.write(f'  seeded {total} reservations')
+        return customer, tables
+
+    def run(self, first_day, days, customer, tables, repeat):
+        def availability():
+            day = first_day + timedelta(days=random.randrange(days))
+            table_availability(day, time(8), time(20), random.randint(1, 6), 60, 30)
+
+        def booking():
+            reservation = Reservation(
+                customer=customer,
+                table=random.choice(tables),
+                date=first_day + timedelta(days=random.randrange(days)),
+                time=time(random.randint(8, 19), random.choice([0, 30])),
+            )
+            try:
+                with transaction.atomic():
+                    book(reservation)
+            except serializers.ValidationError:
+                pass
+
+        self.stdout.write(f'{"operation":<32} {"median ms":>10} {"p95 ms":>10}')
+        for name, operation in [('availability (one day)', availability), ('booking (lock + overlap check)', booking)]:
+            samples = []
+            for _ in range(repeat):
+                started = timer.perf_counter()
+                operation()
+                samples.append((timer.perf_counter() - started) * 1000)
+            samples.sort()
+            p95 = samples[min(len(samples) - 1, int(len(samples) * 0.95))]
+            self.stdout.write(f'{name:<32} {statistics.median(samples):>10.2f} {p95:>10.2f}')
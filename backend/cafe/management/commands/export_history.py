@@ -0,0 +1,44 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from backend.exports import EXPORT_FORMATS, encode_rows
+from cafe.exports import ORDER_EXPORT, PAYMENT_EXPORT
+from students.exports import MEAL_LOG_EXPORT
+
+EXPORTS = {export.name: export for export in (ORDER_EXPORT, PAYMENT_EXPORT, MEAL_LOG_EXPORT)}
+
+
+class Command(BaseCommand):
+    help = (
+        'Stream orders, payments or meal logs to a CSV or JSON Lines file in constant memory, '
+        'like the /export/ API endpoints but without a request timeout'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('dataset', choices=list(EXPORTS))
+        parser.add_argument('--output', choices=list(EXPORT_FORMATS), default='csv')
+        parser.add_argument('--start', help='First local date to include (YYYY-MM-DD)')
+        parser.add_argument('--end', help='Last local date to include (YYYY-MM-DD)')
+        parser.add_argument('--file', help='Write here instead of standard output')
+
+    def handle(self, *args, **options):
+        try:
+            start = date.fromisoformat(options['start']) if options['start'] else None
+            end = date.fromisoformat(options['end']) if options['end'] else None
+        except ValueError as exc:
+            raise CommandError(exc)
+        if start and end and start > end:
+            raise CommandError('--start must not be after --end')
+
+        export = EXPORTS[options['dataset']]
+        chunks = encode_rows(options['output'], export.headings, export.rows(start=start, end=end))
+        if not options['file']:
+            for chunk in chunks:
+                self.stdout.write(chunk, ending='')
+            return
+
+        with open(options['file'], 'w', encoding='utf-8', newline='') as file:
+            for chunk in chunks:
+                file.write(chunk)
+        self.stdout.write(self.style.SUCCESS(f'Wrote {export.name} to {options["file"]}'))
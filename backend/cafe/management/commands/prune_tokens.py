@@ -0,0 +1,39 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+
+
+class Command(BaseCommand):
+    help = (
+        'Delete expired outstanding and blacklisted JWTs in bounded batches. '
+        'Safe to run from cron while the API is serving (e.g. hourly).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000, help='Tokens deleted per transaction')
+        parser.add_argument('--pause', type=float, default=0.0, help='Seconds to sleep between batches')
+        parser.add_argument('--max-batches', type=int, default=None, help='Stop after this many batches')
+
+    def handle(self, *args, **options):
+        now = timezone.now()
+        # Expired tokens sit at the low end of the id range, so this walks the primary key
+        expired = OutstandingToken.objects.filter(expires_at__lte=now).order_by('id').values_list('id', flat=True)
+        deleted = batches = 0
+
+        while options['max_batches'] is None or batches < options['max_batches']:
+            ids = list(expired[:options['batch_size']])
+            if not ids:
+                break
+            with transaction.atomic():
+                BlacklistedToken.objects.filter(token_id__in=ids).delete()
+                OutstandingToken.objects.filter(id__in=ids).delete()
+            deleted += len(ids)
+            batches += 1
+            self.stdout.write(f'  deleted {deleted} expired tokens')
+            if options['pause']:
+                time.sleep(options['pause'])
+
+        self.stdout.write(self.style.SUCCESS(f'Pruned {deleted} expired tokens in {batches} batches'))
@@ -0,0 +1,28 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from cafe.models import DailySalesRollup, rebuild_sales_rollups
+
+
+class Command(BaseCommand):
+    help = 'Recompute the daily and per-category sales rollups from completed orders'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--start', help='First date to rebuild (YYYY-MM-DD)')
+        parser.add_argument('--end', help='Last date to rebuild (YYYY-MM-DD)')
+
+    def handle(self, *args, **options):
+        try:
+            start = date.fromisoformat(options['start']) if options['start'] else None
+            end = date.fromisoformat(options['end']) if options['end'] else None
+        except ValueError as exc:
+            raise CommandError(exc)
+
+        rebuild_sales_rollups(start, end)
+        days = DailySalesRollup.objects.all()
+        if start:
+            days = days.filter(date__gte=start)
+        if end:
+            days = days.filter(date__lte=end)
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt sales rollups for {days.count()} days'))
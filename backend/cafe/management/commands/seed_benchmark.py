@@ -0,0 +1,239 @@
+import json
+import random
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Case, When
+from django.utils import timezone
+
+from cafe.models import (
+    Category, MenuItem, Notification, Order, OrderItem, Payment, Reservation, Table, UserProfile,
+    rebuild_sales_rollups,
+)
+from students.models import MealLog, Student
+
+# Every seeded row carries one of these prefixes so --flush can find it again
+USER_PREFIX = 'bench-'
+STUDENT_PREFIX = 'BN'
+CATEGORY_PREFIX = 'Bench '
+TABLE_PREFIX = 'BN'
+
+# Row counts at --scale 1
+DEFAULTS = {
+    'students': 2000,
+    'meal_days': 30,
+    'customers': 200,
+    'orders': 20000,
+    'menu_items': 80,
+    'tables': 30,
+    'reservations': 3000,
+}
+DEPARTMENTS = ['CS', 'EE', 'ME', 'CE', 'BBA', 'ENG', 'LAW', 'ARCH']
+
+
+class Command(BaseCommand):
+    help = (
+        'Seed a synthetic dataset for the load tests in benchmarks/ and write the manifest the '
+        'runner reads. Counts scale with --scale; the same --seed gives the same data.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', type=float, default=1.0, help='Multiplier for the default row counts')
+        for name, default in DEFAULTS.items():
+            parser.add_argument(f'--{name.replace("_", "-")}', type=int, help=f'Default: {default} x scale')
+        parser.add_argument('--seed', type=int, default=1, help='Random seed')
+        parser.add_argument('--password', default='bench-password', help='Password of the seeded users')
+        parser.add_argument('--manifest', default='benchmarks/dataset.json', help='Where to write the manifest')
+        parser.add_argument('--flush', action='store_true', help='Delete earlier benchmark rows first')
+        parser.add_argument('--batch-size', type=int, default=5000, help='Rows per insert')
+
+    def handle(self, *args, **options):
+        counts = {
+            name: options[name] if options[name] is not None else max(1, round(default * options['scale']))
+            for name, default in DEFAULTS.items()
+        }
+        self.random = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        self.today = timezone.localdate()
+
+        if options['flush']:
+            self.flush()
+        elif User.objects.filter(username__startswith=USER_PREFIX).exists():
+            raise CommandError('Benchmark rows already exist; run with --flush to replace them')
+
+        with transaction.atomic():
+            staff, customers = self.seed_users(counts['customers'], options['password'])
+            menu_items = self.seed_menu(counts['menu_items'])
+            students = self.seed_students(counts['students'])
+            self.seed_meal_logs(students, counts['meal_days'])
+            self.seed_orders(customers, menu_items, counts['orders'])
+            tables = self.seed_reservations(customers, counts['tables'], counts['reservations'])
+            Notification.objects.bulk_create([
+                Notification(user=staff, type='system', title=f'Benchmark notice {i}', message='Seeded')
+                for i in range(20)
+            ])
+        rebuild_sales_rollups()
+
+        manifest = {
+            'seed': options['seed'],
+            'counts': counts,
+            'password': options['password'],
+            'staff': staff.username,
+            'customers': [customer.username for customer in customers],
+            'students': [student.student_id for student in students],
+            'menu_items': [item.pk for item in menu_items],
+            'categories': sorted({item.category_id for item in menu_items}),
+            'tables': [table.pk for table in tables],
+        }
+        with open(options['manifest'], 'w') as file:
+            json.dump(manifest, file, indent=2)
+        self.stdout.write(self.style.SUCCESS(f'Seeded benchmark data; manifest written to {options["manifest"]}'))
+
+    def flush(self):
+        with transaction.atomic():
+            # Orders, payments, reservations and notifications go with their users
+            User.objects.filter(username__startswith=USER_PREFIX).delete()
+            Student.objects.filter(student_id__startswith=STUDENT_PREFIX).delete()
+            Category.objects.filter(name__startswith=CATEGORY_PREFIX).delete()
+            Table.objects.filter(number__startswith=TABLE_PREFIX).delete()
+        self.stdout.write('  removed earlier benchmark rows')
+
+    def insert(self, model, rows):
+        created = model.objects.bulk_create(rows, batch_size=self.batch_size)
+        self.stdout.write(f'  seeded {len(created)} {model._meta.verbose_name_plural}')
+        return created
+
+    def seed_users(self, count, password):
+        # One hash for everybody; hashing per user would dominate the run
+        hashed = make_password(password)
+        staff = User(username=f'{USER_PREFIX}staff', password=hashed, first_name='Bench', last_name='Staff')
+        customers = [
+            User(username=f'{USER_PREFIX}customer-{i}', password=hashed, first_name='Bench', last_name=f'Customer {i}')
+            for i in range(count)
+        ]
+        users = self.insert(User, [staff] + customers)
+        # bulk_create skips the post_save signal that creates profiles
+        UserProfile.objects.bulk_create([
+            UserProfile(user=user, role='staff' if user.username == staff.username else 'customer') for user in users
+        ])
+        return users[0], users[1:]
+
+    def seed_menu(self, count):
+        categories = self.insert(Category, [
+            Category(name=f'{CATEGORY_PREFIX}category {i}') for i in range(max(1, count // 10))
+        ])
+        return self.insert(MenuItem, [
+            MenuItem(
+                name=f'Bench item {i}',
+                category=categories[i % len(categories)],
+                price=Decimal(self.random.randrange(150, 1500)) / 100,
+                preparation_time=self.random.randint(2, 20),
+                is_featured=i % 15 == 0,
+            )
+            for i in range(count)
+        ])
+
+    def seed_students(self, count):
+        return self.insert(Student, [
+            Student(
+                student_id=f'{STUDENT_PREFIX}{i:07d}',
+                name=f'Bench Student {i}',
+                email=f'student{i}@bench.invalid',
+                phone='0000000000',
+                department=self.random.choice(DEPARTMENTS),
+                year=self.random.randint(1, 4),
+            )
+            for i in range(count)
+        ])
+
+    def seed_meal_logs(self, students, days):
+        # Past days only, so today's lunch-rush scans are first servings
+        logs = []
+        total = 0
+        for day_index in range(1, days + 1):
+            day = self.today - timedelta(days=day_index)
+            for student in students:
+                for meal_type, (opens, closes) in settings.MEAL_SERVICE_WINDOWS.items():
+                    if self.random.random() < 0.6:
+                        continue
+                    served = time(self.random.randrange(opens, closes), self.random.randrange(60))
+                    logs.append(MealLog(
+                        student=student, meal_type=meal_type, service_date=day,
+                        timestamp=timezone.make_aware(datetime.combine(day, served)),
+                    ))
+            if len(logs) >= self.batch_size:
+                MealLog.objects.bulk_create(logs, batch_size=self.batch_size)
+                total += len(logs)
+                logs = []
+        MealLog.objects.bulk_create(logs, batch_size=self.batch_size)
+        self.stdout.write(f'  seeded {total + len(logs)} meal logs')
+
+    def seed_orders(self, customers, menu_items, count):
+        now = timezone.now()
+        orders, items, created_at = [], [], {}
+        for _ in range(count):
+            # Most history is old and completed; the last day holds the live queue
+            placed = now - timedelta(minutes=self.random.randrange(90 * 24 * 60))
+            if placed > now - timedelta(hours=2):
+                status = self.random.choice(['pending', 'confirmed', 'preparing', 'ready'])
+            else:
+                status = 'cancelled' if self.random.random() < 0.05 else 'completed'
+            order = Order(
+                customer=self.random.choice(customers),
+                status=status,
+                payment_method=self.random.choice(['cash', 'card', 'digital', 'university_card']),
+                payment_status='paid' if status == 'completed' else 'pending',
+                completed_at=placed + timedelta(minutes=15) if status == 'completed' else None,
+                stock_deducted=status in Order.STOCK_DEDUCTED_STATUSES,
+            )
+            order_items = [
+                OrderItem(order=order, menu_item=item, quantity=self.random.randint(1, 3), unit_price=item.price)
+                for item in self.random.sample(menu_items, min(len(menu_items), self.random.randint(1, 4)))
+            ]
+            order.set_totals(sum(item.total_price for item in order_items))
+            created_at[order.pk] = placed
+            orders.append(order)
+            items.extend(order_items)
+
+        self.insert(Order, orders)
+        self.insert(OrderItem, items)
+        self.insert(Payment, [
+            Payment(order=order, amount=order.total_amount, payment_method=order.payment_method, status='completed',
+                    completed_at=order.completed_at)
+            for order in orders if order.status == 'completed'
+        ])
+        # created_at is auto_now_add, so the spread is written afterwards
+        for start in range(0, len(orders), 500):
+            batch = orders[start:start + 500]
+            Order.objects.filter(pk__in=[order.pk for order in batch]).update(created_at=Case(
+                *(When(pk=order.pk, then=created_at[order.pk]) for order in batch)
+            ))
+
+    def seed_reservations(self, customers, table_count, count):
+        tables = self.insert(Table, [
+            Table(number=f'{TABLE_PREFIX}{i}', capacity=self.random.choice([2, 4, 4, 6, 8]))
+            for i in range(table_count)
+        ])
+        # A week back and two ahead, hour-long bookings between 08:00 and 20:00
+        days = [self.today + timedelta(days=offset) for offset in range(-7, 15)]
+        per_table = min(12, -(-count // (len(days) * len(tables))))
+        reservations = []
+        for day in days:
+            for table in tables:
+                for hour in self.random.sample(range(8, 20), per_table):
+                    if len(reservations) == count:
+                        break
+                    reservation = Reservation(
+                        customer=self.random.choice(customers), table=table, date=day, time=time(hour),
+                        party_size=self.random.randint(1, table.capacity),
+                        status=self.random.choice(Reservation.ACTIVE_STATUSES + ['cancelled']),
+                    )
+                    reservation.set_interval()
+                    reservations.append(reservation)
+        self.insert(Reservation, reservations)
+        return tables
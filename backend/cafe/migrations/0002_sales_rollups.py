@@ -0,0 +1,74 @@
+# Generated by Django 5.2.6 on 2026-10-17 19:11
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncDate
+
+
+def backfill_rollups(apps, schema_editor):
+    Order = apps.get_model('cafe', 'Order')
+    OrderItem = apps.get_model('cafe', 'OrderItem')
+    DailySalesRollup = apps.get_model('cafe', 'DailySalesRollup')
+    CategorySalesRollup = apps.get_model('cafe', 'CategorySalesRollup')
+
+    daily_rows = Order.objects.filter(status='completed').annotate(
+        day=TruncDate('created_at')
+    ).values('day').annotate(order_count=Count('id'), total=Sum('total_amount')).order_by()
+    DailySalesRollup.objects.bulk_create([
+        DailySalesRollup(date=row['day'], orders=row['order_count'], revenue=row['total'] or 0)
+        for row in daily_rows
+    ], batch_size=1000)
+
+    category_rows = OrderItem.objects.filter(order__status='completed').annotate(
+        day=TruncDate('order__created_at')
+    ).values('day', 'menu_item__category').annotate(
+        order_count=Count('order', distinct=True),
+        quantity_sold=Sum('quantity'),
+        total=Sum(F('unit_price') * F('quantity')),
+    ).order_by()
+    CategorySalesRollup.objects.bulk_create([
+        CategorySalesRollup(
+            date=row['day'], category_id=row['menu_item__category'], orders=row['order_count'],
+            items_sold=row['quantity_sold'], revenue=row['total'] or 0,
+        )
+        for row in category_rows
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cafe', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailySalesRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(unique=True)),
+                ('orders', models.IntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+            ],
+            options={
+                'ordering': ['date'],
+            },
+        ),
+        migrations.CreateModel(
+            name='CategorySalesRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('orders', models.IntegerField(default=0)),
+                ('items_sold', models.IntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('category', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='sales_rollups', to='cafe.category')),
+            ],
+            options={
+                'ordering': ['date', 'category'],
+                'unique_together': {('date', 'category')},
+            },
+        ),
+        migrations.RunPython(backfill_rollups, migrations.RunPython.noop),
+    ]
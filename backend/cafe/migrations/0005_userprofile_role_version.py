@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-17 19:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cafe', '0004_query_pattern_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userprofile',
+            name='role_version',
+            field=models.PositiveIntegerField(default=1, editable=False),
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.6 on 2026-10-17 19:37
+
+import django.core.validators
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def mark_existing_orders_deducted(apps, schema_editor):
+    # Orders placed before recipes existed must not be deducted on their next save
+    Order = apps.get_model('cafe', 'Order')
+    Order.objects.filter(status__in=['confirmed', 'preparing', 'ready', 'completed']).update(stock_deducted=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cafe', '0005_userprofile_role_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='stock_deducted',
+            field=models.BooleanField(default=False, editable=False),
+        ),
+        migrations.RunPython(mark_existing_orders_deducted, migrations.RunPython.noop),
+        migrations.CreateModel(
+            name='RecipeIngredient',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantity', models.PositiveIntegerField(default=1, validators=[django.core.validators.MinValueValidator(1)])),
+                ('inventory', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='recipe_uses', to='cafe.inventory')),
+                ('menu_item', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='recipe', to='cafe.menuitem')),
+            ],
+            options={
+                'unique_together': {('menu_item', 'inventory')},
+            },
+        ),
+    ]
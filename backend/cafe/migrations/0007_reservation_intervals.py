@@ -0,0 +1,40 @@
+# Generated by Django 5.2.6 on 2026-10-17 19:52
+
+from datetime import datetime, timedelta
+
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def backfill_intervals(apps, schema_editor):
+    Reservation = apps.get_model('cafe', 'Reservation')
+    reservations = []
+    for reservation in Reservation.objects.only('date', 'time', 'duration').iterator(chunk_size=2000):
+        reservation.starts_at = timezone.make_aware(datetime.combine(reservation.date, reservation.time))
+        reservation.ends_at = reservation.starts_at + timedelta(minutes=reservation.duration)
+        reservations.append(reservation)
+        if len(reservations) >= 2000:
+            Reservation.objects.bulk_update(reservations, ['starts_at', 'ends_at'])
+            reservations = []
+    Reservation.objects.bulk_update(reservations, ['starts_at', 'ends_at'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cafe', '0006_recipes_and_stock_deduction'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='reservation',
+            name='starts_at',
+            field=models.DateTimeField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='reservation',
+            name='ends_at',
+            field=models.DateTimeField(editable=False, null=True),
+        ),
+        migrations.RunPython(backfill_intervals, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.6 on 2026-10-17 19:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cafe', '0007_reservation_intervals'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='reservation',
+            name='starts_at',
+            field=models.DateTimeField(editable=False),
+        ),
+        migrations.AlterField(
+            model_name='reservation',
+            name='ends_at',
+            field=models.DateTimeField(editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='reservation',
+            index=models.Index(condition=models.Q(('status__in', ['pending', 'confirmed'])), fields=['table', 'starts_at', 'ends_at'], name='reservation_interval_idx'),
+        ),
+    ]
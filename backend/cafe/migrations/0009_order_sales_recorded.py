@@ -0,0 +1,24 @@
+# Generated by Django 5.2.6 on 2026-10-17 20:06
+
+from django.db import migrations, models
+
+
+def mark_recorded_orders(apps, schema_editor):
+    # 0002 backfilled every completed order into the rollups
+    Order = apps.get_model('cafe', 'Order')
+    Order.objects.filter(status='completed').update(sales_recorded=True)
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cafe', '0008_reservation_interval_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='sales_recorded',
+            field=models.BooleanField(default=False, editable=False),
+        ),
+        migrations.RunPython(mark_recorded_orders, migrations.RunPython.noop),
+    ]
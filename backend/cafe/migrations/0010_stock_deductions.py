@@ -0,0 +1,44 @@
+# Generated by Django 5.2.6 on 2026-10-17 20:08
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import F, Sum
+
+
+def record_open_deductions(apps, schema_editor):
+    # Orders deducted before this migration put back their full recipe needs on
+    # cancel, as they did until now; the amounts actually taken were not kept
+    RecipeIngredient = apps.get_model('cafe', 'RecipeIngredient')
+    StockDeduction = apps.get_model('cafe', 'StockDeduction')
+    rows = RecipeIngredient.objects.filter(
+        menu_item__orderitem__order__stock_deducted=True
+    ).values('menu_item__orderitem__order', 'inventory').annotate(
+        total=Sum(F('quantity') * F('menu_item__orderitem__quantity'))
+    ).order_by()
+    StockDeduction.objects.bulk_create([
+        StockDeduction(order_id=row['menu_item__orderitem__order'], inventory_id=row['inventory'], quantity=row['total'])
+        for row in rows.iterator()
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cafe', '0009_order_sales_recorded'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockDeduction',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantity', models.PositiveIntegerField()),
+                ('inventory', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='deductions', to='cafe.inventory')),
+                ('order', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stock_deductions', to='cafe.order')),
+            ],
+            options={
+                'unique_together': {('order', 'inventory')},
+            },
+        ),
+        migrations.RunPython(record_open_deductions, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-17 20:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cafe', '0010_stock_deductions'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='stockdeduction',
+            name='shortfall',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
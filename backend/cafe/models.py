@@ -1,9 +1,21 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Case, Count, ExpressionWrapper, F, Sum, Value, When
+from django.db.models.functions import TruncDate
 from django.contrib.auth.models import User
+from django.utils import timezone
 from django.core.validators import MinValueValidator, MaxValueValidator
-from decimal import Decimal
+from datetime import datetime, time, timedelta
+from decimal import Decimal, ROUND_HALF_UP
 import uuid
 
+from .cache import bump_menu_version, invalidate_dashboard_stats
+
+CENTS = Decimal('0.01')
+# An order line's price; typed so SQLite sums come back as exact cents, not float noise
+LINE_TOTAL = ExpressionWrapper(
+    F('unit_price') * F('quantity'), output_field=models.DecimalField(max_digits=12, decimal_places=2)
+)
+
 
 class UserProfile(models.Model):
     """Extended user profile with role and additional information"""
@@ -19,10 +31,28 @@ class UserProfile(models.Model):
     address = models.TextField(blank=True, null=True)
     date_joined = models.DateTimeField(auto_now_add=True)
     is_active = models.BooleanField(default=True)
+    # Stamped into access tokens; bumped when the role or active flag changes so older tokens stop working
+    role_version = models.PositiveIntegerField(default=1, editable=False)
     
     def __str__(self):
         return f"{self.user.get_full_name()} ({self.role})"
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_access = (instance.__dict__.get('role'), instance.__dict__.get('is_active'))
+        return instance
+    
+    def save(self, *args, **kwargs):
+        loaded = getattr(self, '_loaded_access', None)
+        if loaded is not None and loaded != (self.role, self.is_active):
+            self.role_version += 1
+            update_fields = kwargs.get('update_fields')
+            if update_fields is not None:
+                kwargs['update_fields'] = {*update_fields, 'role_version'}
+        super().save(*args, **kwargs)
+        self._loaded_access = (self.role, self.is_active)
+    
     @property
     def is_admin(self):
         return self.role == 'admin'
@@ -74,6 +104,14 @@ class MenuItem(models.Model):
     
     class Meta:
         ordering = ['category', 'name']
+        indexes = [
+            # What customers can order: the public menu and the customer list
+            models.Index(
+                fields=['category', 'name'],
+                condition=models.Q(is_active=True, availability='available'),
+                name='menuitem_available_idx',
+            ),
+        ]
     
     def __str__(self):
         return f"{self.name} - ${self.price}"
@@ -122,19 +160,67 @@ class Order(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     completed_at = models.DateTimeField(blank=True, null=True)
+    stock_deducted = models.BooleanField(default=False, editable=False)
+    # Whether the order is currently counted in the sales rollups
+    sales_recorded = models.BooleanField(default=False, editable=False)
+    
+    TAX_RATE = Decimal('0.08')  # 8% tax
+    # Ingredients are taken out of stock once the order reaches any of these
+    STOCK_DEDUCTED_STATUSES = ('confirmed', 'preparing', 'ready', 'completed')
+    # Only ever written by the conditional UPDATEs that claim them
+    CLAIM_FIELDS = ('stock_deducted', 'sales_recorded')
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Keyset pagination on (created_at, id)
+            models.Index(fields=['-created_at', '-id'], name='order_created_id_idx'),
+            # A customer's order history
+            models.Index(fields=['customer', '-created_at', '-id'], name='order_customer_created_idx'),
+            # Status queues and completed-order reports over a created_at range
+            models.Index(fields=['status', '-created_at'], name='order_status_created_idx'),
+        ]
     
     def __str__(self):
         return f"Order {self.id} - {self.customer.username} - ${self.total_amount}"
     
-    def save(self, *args, **kwargs):
-        # Calculate totals
-        self.subtotal = sum(item.total_price for item in self.order_items.all())
-        self.tax_amount = self.subtotal * Decimal('0.08')  # 8% tax
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the stored status so post_save handlers can detect transitions
+        instance._loaded_status = instance.__dict__.get('status')
+        return instance
+    
+    def set_totals(self, subtotal):
+        """Set subtotal, tax and total (rounded to cents) from an items subtotal"""
+        self.subtotal = Decimal(subtotal).quantize(CENTS, ROUND_HALF_UP)
+        self.tax_amount = (self.subtotal * self.TAX_RATE).quantize(CENTS, ROUND_HALF_UP)
         self.total_amount = self.subtotal + self.tax_amount
-        super().save(*args, **kwargs)
+    
+    def recalculate_totals(self):
+        """Recompute totals from the stored items and write them in one update"""
+        subtotal = self.order_items.aggregate(total=Sum(LINE_TOTAL))['total']
+        self.set_totals(subtotal or 0)
+        self.updated_at = timezone.now()
+        Order.objects.filter(pk=self.pk).update(
+            subtotal=self.subtotal,
+            tax_amount=self.tax_amount,
+            total_amount=self.total_amount,
+            updated_at=self.updated_at,
+        )
+    
+    def save(self, *args, **kwargs):
+        # Totals are set by the caller (set_totals / recalculate_totals), not from items here.
+        # Stock moves with the status in this transaction; sales rollups follow after commit
+        if not self._state.adding and kwargs.get('update_fields') is None and not kwargs.get('force_insert'):
+            # A stale copy must not write back claim flags another request has flipped
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.CLAIM_FIELDS
+            ]
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+        self._loaded_status = self.status
 
 
 class OrderItem(models.Model):
@@ -174,6 +260,12 @@ class Payment(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     completed_at = models.DateTimeField(blank=True, null=True)
     
+    class Meta:
+        indexes = [
+            # Keyset pagination on (created_at, id)
+            models.Index(fields=['-created_at', '-id'], name='payment_created_id_idx'),
+        ]
+    
     def __str__(self):
         return f"Payment for Order {self.order.id} - ${self.amount}"
 
@@ -197,6 +289,15 @@ class Table(models.Model):
         return f"Table {self.number} ({self.capacity} seats)"
 
 
+class ReservationQuerySet(models.QuerySet):
+    def active(self):
+        # Bookings that hold their table (matches the partial interval index)
+        return self.filter(status__in=Reservation.ACTIVE_STATUSES)
+    
+    def overlapping(self, starts_at, ends_at):
+        return self.filter(starts_at__lt=ends_at, ends_at__gt=starts_at)
+
+
 class Reservation(models.Model):
     """Table reservations"""
     STATUS_CHOICES = [
@@ -205,6 +306,7 @@ class Reservation(models.Model):
         ('cancelled', 'Cancelled'),
         ('completed', 'Completed'),
     ]
+    ACTIVE_STATUSES = ['pending', 'confirmed']
     
     customer = models.ForeignKey(User, on_delete=models.CASCADE, related_name='reservations')
     table = models.ForeignKey(Table, on_delete=models.CASCADE, related_name='reservations')
@@ -215,12 +317,43 @@ class Reservation(models.Model):
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
     special_requests = models.TextField(blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    # [starts_at, ends_at) is derived from date, time and duration on save
+    starts_at = models.DateTimeField(editable=False)
+    ends_at = models.DateTimeField(editable=False)
+    
+    objects = ReservationQuerySet.as_manager()
     
     class Meta:
         ordering = ['date', 'time']
+        indexes = [
+            # A table's bookings in slot order
+            models.Index(fields=['table', 'date', 'time'], name='reservation_table_slot_idx'),
+            # Overlap checks and availability: active bookings by table and interval
+            models.Index(
+                fields=['table', 'starts_at', 'ends_at'],
+                condition=models.Q(status__in=['pending', 'confirmed']),
+                name='reservation_interval_idx',
+            ),
+        ]
     
     def __str__(self):
         return f"Reservation {self.id} - {self.customer.username} - {self.date} {self.time}"
+    
+    @staticmethod
+    def interval(date, time, duration):
+        """``(starts_at, ends_at)`` for a booking in the cafe's local time"""
+        starts_at = timezone.make_aware(datetime.combine(date, time))
+        return starts_at, starts_at + timedelta(minutes=duration)
+    
+    def set_interval(self):
+        self.starts_at, self.ends_at = self.interval(self.date, self.time, self.duration)
+    
+    def save(self, *args, **kwargs):
+        self.set_interval()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and {'date', 'time', 'duration'} & set(update_fields):
+            kwargs['update_fields'] = {*update_fields, 'starts_at', 'ends_at'}
+        super().save(*args, **kwargs)
 
 
 class Review(models.Model):
@@ -249,6 +382,12 @@ class Review(models.Model):
         return f"{self.customer.username} - {self.menu_item.name} - {self.rating} stars"
 
 
+class InventoryQuerySet(models.QuerySet):
+    def low_stock(self):
+        # SQL equivalent of Inventory.is_low_stock
+        return self.filter(current_stock__lte=F('minimum_stock'))
+
+
 class Inventory(models.Model):
     """Inventory tracking for ingredients"""
     name = models.CharField(max_length=200)
@@ -263,6 +402,8 @@ class Inventory(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    objects = InventoryQuerySet.as_manager()
+    
     class Meta:
         ordering = ['name']
     
@@ -274,6 +415,34 @@ class Inventory(models.Model):
         return self.current_stock <= self.minimum_stock
 
 
+class RecipeIngredient(models.Model):
+    """Inventory used to make one serving of a menu item"""
+    menu_item = models.ForeignKey(MenuItem, on_delete=models.CASCADE, related_name='recipe')
+    inventory = models.ForeignKey(Inventory, on_delete=models.CASCADE, related_name='recipe_uses')
+    quantity = models.PositiveIntegerField(default=1, validators=[MinValueValidator(1)])
+    
+    class Meta:
+        unique_together = ['menu_item', 'inventory']
+    
+    def __str__(self):
+        return f"{self.menu_item.name}: {self.quantity} {self.inventory.unit} {self.inventory.name}"
+
+
+class StockDeduction(models.Model):
+    """Stock actually taken out for an order, put back exactly if the order is cancelled"""
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='stock_deductions')
+    inventory = models.ForeignKey(Inventory, on_delete=models.CASCADE, related_name='deductions')
+    quantity = models.PositiveIntegerField()
+    # Needed by the order but not in stock when it was confirmed
+    shortfall = models.PositiveIntegerField(default=0)
+    
+    class Meta:
+        unique_together = ['order', 'inventory']
+    
+    def __str__(self):
+        return f"Order {self.order_id}: {self.quantity} {self.inventory.name}"
+
+
 class StaffSchedule(models.Model):
     """Staff work schedules"""
     DAY_CHOICES = [
@@ -318,6 +487,224 @@ class Notification(models.Model):
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Each user's notifications, paginated by (created_at, id)
+            models.Index(fields=['user', '-created_at', '-id'], name='notification_user_created_idx'),
+            # A user's unread notifications (partial: "NOT is_read" cannot seek a
+            # composite (user, is_read, ...) index on SQLite)
+            models.Index(
+                fields=['user', '-created_at'],
+                condition=models.Q(is_read=False),
+                name='notification_unread_idx',
+            ),
+        ]
+    
+    def __str__(self):
+        return f"{self.title} - {self.user.username}"
+
+
+class DailySalesRollup(models.Model):
+    """Completed-order totals per day, maintained incrementally as orders complete"""
+    date = models.DateField(unique=True)
+    orders = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    
+    class Meta:
+        ordering = ['date']
+    
+    def __str__(self):
+        return f"{self.date} - {self.orders} orders - ${self.revenue}"
+
+
+class CategorySalesRollup(models.Model):
+    """Completed-order line totals per day and category"""
+    date = models.DateField()
+    category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name='sales_rollups')
+    orders = models.IntegerField(default=0)
+    items_sold = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    
+    class Meta:
+        unique_together = ['date', 'category']
+        ordering = ['date', 'category']
     
     def __str__(self):
-        return f"{self.title} - {self.user.username}"
\ No newline at end of file
+        return f"{self.date} - {self.category.name} - ${self.revenue}"
+
+
+def record_completed_order(order, sign=1):
+    """Add (``sign=1``) or remove (``sign=-1``) a completed order from the sales rollups"""
+    date = timezone.localdate(order.created_at)
+    DailySalesRollup.objects.bulk_create([DailySalesRollup(date=date)], ignore_conflicts=True)
+    DailySalesRollup.objects.filter(date=date).update(
+        orders=F('orders') + sign,
+        revenue=F('revenue') + sign * order.total_amount,
+    )
+    
+    lines = order.order_items.values('menu_item__category').annotate(
+        revenue=Sum(LINE_TOTAL),
+        items_sold=Sum('quantity'),
+    )
+    for line in lines:
+        category_id = line['menu_item__category']
+        CategorySalesRollup.objects.bulk_create(
+            [CategorySalesRollup(date=date, category_id=category_id)], ignore_conflicts=True
+        )
+        CategorySalesRollup.objects.filter(date=date, category_id=category_id).update(
+            orders=F('orders') + sign,
+            items_sold=F('items_sold') + sign * line['items_sold'],
+            revenue=F('revenue') + sign * line['revenue'],
+        )
+
+
+def sync_order_sales(order_id):
+    """Bring an order's share of the sales rollups in line with its stored status.
+
+    ``Order.sales_recorded`` is flipped with a conditional UPDATE before the
+    rollups change, so a completion is counted once however many saves or
+    requests race on it. Called after commit, when an order created as
+    'completed' already has its items.
+    """
+    with transaction.atomic():
+        orders = Order.objects.filter(pk=order_id)
+        if orders.filter(status='completed', sales_recorded=False).update(sales_recorded=True):
+            record_completed_order(orders.get())
+        elif orders.filter(sales_recorded=True).exclude(status='completed').update(sales_recorded=False):
+            record_completed_order(orders.get(), sign=-1)
+
+
+def local_midnight(day):
+    """Aware datetime for the start of ``day`` in the current time zone"""
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def rebuild_sales_rollups(start=None, end=None):
+    """Recompute the sales rollups for ``[start, end]`` (all dates when omitted) from orders"""
+    in_range = Order.objects.all()
+    items = OrderItem.objects.filter(order__status='completed')
+    daily = DailySalesRollup.objects.all()
+    by_category = CategorySalesRollup.objects.all()
+    # Ranges on created_at (not created_at__date) so the indexes stay usable
+    if start:
+        in_range = in_range.filter(created_at__gte=local_midnight(start))
+        items = items.filter(order__created_at__gte=local_midnight(start))
+        daily = daily.filter(date__gte=start)
+        by_category = by_category.filter(date__gte=start)
+    if end:
+        in_range = in_range.filter(created_at__lt=local_midnight(end + timedelta(days=1)))
+        items = items.filter(order__created_at__lt=local_midnight(end + timedelta(days=1)))
+        daily = daily.filter(date__lte=end)
+        by_category = by_category.filter(date__lte=end)
+    orders = in_range.filter(status='completed')
+    
+    daily_rows = orders.annotate(day=TruncDate('created_at')).values('day').annotate(
+        order_count=Count('id'), total=Sum('total_amount'),
+    ).order_by()
+    category_rows = items.annotate(day=TruncDate('order__created_at')).values(
+        'day', 'menu_item__category'
+    ).annotate(
+        order_count=Count('order', distinct=True),
+        quantity_sold=Sum('quantity'),
+        total=Sum(LINE_TOTAL),
+    ).order_by()
+    
+    with transaction.atomic():
+        daily.delete()
+        by_category.delete()
+        DailySalesRollup.objects.bulk_create([
+            DailySalesRollup(date=row['day'], orders=row['order_count'], revenue=row['total'] or 0)
+            for row in daily_rows
+        ], batch_size=1000)
+        CategorySalesRollup.objects.bulk_create([
+            CategorySalesRollup(
+                date=row['day'], category_id=row['menu_item__category'], orders=row['order_count'],
+                items_sold=row['quantity_sold'], revenue=row['total'] or 0,
+            )
+            for row in category_rows
+        ], batch_size=1000)
+        # Later status changes adjust the rebuilt totals from here
+        orders.filter(sales_recorded=False).update(sales_recorded=True)
+        in_range.exclude(status='completed').filter(sales_recorded=True).update(sales_recorded=False)
+
+
+def sync_order_stock(order_id):
+    """Take an order's ingredients out of stock or put them back, after its status.
+
+    ``Order.stock_deducted`` is flipped with a conditional UPDATE first, so
+    each order is deducted at most once however many requests confirm it.
+    Runs in the transaction that changes the status, so the two commit or
+    roll back together. An order created as confirmed is synced by whoever
+    adds its items, once they are saved.
+    """
+    with transaction.atomic():
+        orders = Order.objects.filter(pk=order_id)
+        if orders.filter(status__in=Order.STOCK_DEDUCTED_STATUSES, stock_deducted=False).update(stock_deducted=True):
+            deduct_order_stock(order_id)
+        elif orders.filter(status='cancelled', stock_deducted=True).update(stock_deducted=False):
+            restore_order_stock(order_id)
+
+
+def deduct_order_stock(order_id):
+    """Take the order's ingredients out of stock, never below zero.
+
+    The inventory rows are locked and read once. The amount taken from each,
+    and any shortfall, is recorded in ``StockDeduction`` and stock changes in
+    one UPDATE. Staff are notified of a shortfall, and menu items left without
+    enough of an ingredient for one serving are marked ``out_of_stock``.
+    """
+    needed = dict(
+        RecipeIngredient.objects.filter(menu_item__orderitem__order=order_id).values('inventory').annotate(
+            total=Sum(F('quantity') * F('menu_item__orderitem__quantity'))
+        ).values_list('inventory', 'total')
+    )
+    if not needed:
+        return
+    in_stock = Inventory.objects.select_for_update().filter(pk__in=needed).order_by('pk')
+    taken = {pk: min(needed[pk], stock) for pk, stock in in_stock.values_list('pk', 'current_stock')}
+    deductions = StockDeduction.objects.bulk_create([
+        StockDeduction(order_id=order_id, inventory_id=pk, quantity=quantity, shortfall=needed[pk] - quantity)
+        for pk, quantity in taken.items() if needed[pk]
+    ])
+    now = timezone.now()
+    change_stock(taken, -1, now)
+    notify_stock_shortfall(order_id, [deduction for deduction in deductions if deduction.shortfall])
+    
+    exhausted = MenuItem.objects.filter(
+        availability='available',
+        recipe__inventory__in=needed,
+        recipe__inventory__current_stock__lt=F('recipe__quantity'),
+    )
+    if MenuItem.objects.filter(pk__in=exhausted.values('pk')).update(availability='out_of_stock', updated_at=now):
+        bump_menu_version()
+
+
+def notify_stock_shortfall(order_id, deductions):
+    """Send every active staff member and admin an inventory alert about an order taken short"""
+    if not deductions:
+        return
+    names = dict(Inventory.objects.filter(pk__in=[d.inventory_id for d in deductions]).values_list('pk', 'name'))
+    message = ', '.join(f'{names[d.inventory_id]}: {d.shortfall} short' for d in deductions)
+    staff = User.objects.filter(is_active=True, profile__role__in=['staff', 'admin']).values_list('pk', flat=True)
+    for user_id in staff:
+        # One by one so each unread counter and live stream is updated
+        Notification.objects.create(
+            user_id=user_id, type='inventory', title=f'Order {order_id} is short of stock', message=message,
+        )
+
+
+def restore_order_stock(order_id):
+    """Put back exactly what ``deduct_order_stock`` took for the order"""
+    deductions = StockDeduction.objects.filter(order_id=order_id)
+    change_stock(dict(deductions.values_list('inventory', 'quantity')), 1, timezone.now())
+    deductions.delete()
+
+
+def change_stock(quantities, sign, now):
+    """Add (``sign=1``) or remove (``sign=-1``) ``{inventory pk: quantity}`` in one UPDATE"""
+    quantities = {pk: quantity for pk, quantity in quantities.items() if quantity}
+    if not quantities:
+        return
+    change = Case(*[When(pk=pk, then=Value(quantity)) for pk, quantity in quantities.items()])
+    Inventory.objects.filter(pk__in=quantities).update(current_stock=F('current_stock') + sign * change, updated_at=now)
+    # QuerySet.update() sends no post_save; low-stock counts are on the dashboard
+    transaction.on_commit(invalidate_dashboard_stats)
@@ -0,0 +1,153 @@
+"""In-process filter over the simplejwt token blacklist.
+
+simplejwt checks ``BlacklistedToken`` with a join on every refresh-token
+use. Instead, each process keeps the jtis of unexpired blacklisted tokens as
+64-bit fingerprints: a sorted ``array`` (8 bytes per token, searched with
+``bisect``) plus a small set of recent additions that is merged in
+periodically. A fingerprint hit is confirmed against the database, so a
+collision can never reject a valid token.
+
+The filter is kept in step incrementally by reading only blacklist rows
+added since the last sync (an indexed primary-key range). The range starts
+at the high-water mark from ``SYNC_LOOKBACK`` seconds earlier, so rows from
+transactions that committed out of id order are still picked up. Every
+``JWT_REVOCATION_REBUILD_INTERVAL`` seconds the filter is rebuilt from
+scratch in a background thread, which also drops tokens that have expired;
+requests keep using the old filter until the new one is swapped in. Only
+the first build, before there is anything to check against, runs inline.
+"""
+import hashlib
+import threading
+import time
+from array import array
+from bisect import bisect_left
+from collections import deque
+
+from django.conf import settings
+from django.db import connection
+from django.utils import timezone
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken
+
+SYNC_LOOKBACK = 30
+MERGE_THRESHOLD = 1024
+
+
+def fingerprint(jti):
+    return int.from_bytes(hashlib.blake2b(str(jti).encode(), digest_size=8).digest(), 'big')
+
+
+class RevocationFilter:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """Forget everything; the next check rebuilds from the database"""
+        with self._lock:
+            self._sorted = array('Q')
+            self._recent = set()
+            self._watermarks = deque()
+            self._synced_id = 0
+            self._synced_at = None
+            self._rebuilt_at = None
+            self._rebuilding = False
+            # A background rebuild started before a reset is discarded
+            self._generation = getattr(self, '_generation', 0) + 1
+
+    def __len__(self):
+        return len(self._sorted) + len(self._recent)
+
+    def is_revoked(self, jti):
+        self.sync()
+        if not self._contains(fingerprint(jti)):
+            return False
+        return BlacklistedToken.objects.filter(token__jti=jti).exists()
+
+    def add(self, jti):
+        """Record a token blacklisted by this process without waiting for the next sync"""
+        with self._lock:
+            self._recent.add(fingerprint(jti))
+
+    def sync(self, force=False):
+        now = time.monotonic()
+        if not force and self._synced_at is not None and now - self._synced_at < settings.JWT_REVOCATION_SYNC_INTERVAL:
+            return
+        with self._lock:
+            if self._rebuilt_at is None:
+                self._swap(*self._build(), now, covered=self._recent)
+            else:
+                if now - self._rebuilt_at >= settings.JWT_REVOCATION_REBUILD_INTERVAL and not self._rebuilding:
+                    self._rebuilding = True
+                    threading.Thread(
+                        target=self._rebuild_in_background, args=(self._generation,),
+                        name='revocation-filter-rebuild', daemon=True,
+                    ).start()
+                self._catch_up(now)
+            self._synced_at = now
+
+    def rebuild(self, generation=None):
+        """Build a fresh filter without holding the lock, then swap it in"""
+        with self._lock:
+            covered = set(self._recent)
+        values, max_id = self._build()
+        with self._lock:
+            if generation is None or generation == self._generation:
+                self._swap(values, max_id, time.monotonic(), covered)
+                self._rebuilding = False
+
+    def _contains(self, value):
+        if value in self._recent:
+            return True
+        index = bisect_left(self._sorted, value)
+        return index < len(self._sorted) and self._sorted[index] == value
+
+    def _rows(self, since_id):
+        return BlacklistedToken.objects.filter(
+            id__gt=since_id, token__expires_at__gt=timezone.now()
+        ).order_by('id').values_list('id', 'token__jti').iterator(chunk_size=5000)
+
+    def _build(self):
+        values = array('Q')
+        max_id = 0
+        for row_id, jti in self._rows(0):
+            values.append(fingerprint(jti))
+            max_id = row_id
+        return array('Q', sorted(set(values))), max_id
+
+    def _swap(self, values, max_id, now, covered):
+        # Called with the lock held. ``covered`` are the recent additions from
+        # before the build read the table; later ones are kept (they are not
+        # merged into the sorted array while a rebuild is running).
+        self._sorted = values
+        self._recent = self._recent - covered
+        # Earlier watermarks are kept so the next catch-up still looks back
+        self._synced_id = max(self._synced_id, max_id)
+        self._watermarks.append((now, self._synced_id))
+        self._rebuilt_at = now
+
+    def _rebuild_in_background(self, generation):
+        try:
+            self.rebuild(generation)
+        finally:
+            # Let a failed rebuild be retried on the next sync
+            with self._lock:
+                if generation == self._generation:
+                    self._rebuilding = False
+            # The thread's own database connection
+            connection.close()
+
+    def _catch_up(self, now):
+        # Re-read from the high-water mark of SYNC_LOOKBACK seconds ago
+        while len(self._watermarks) > 1 and now - self._watermarks[1][0] >= SYNC_LOOKBACK:
+            self._watermarks.popleft()
+        since_id = self._watermarks[0][1]
+        for row_id, jti in self._rows(since_id):
+            self._recent.add(fingerprint(jti))
+            self._synced_id = max(self._synced_id, row_id)
+        self._watermarks.append((now, self._synced_id))
+        if len(self._recent) >= MERGE_THRESHOLD and not self._rebuilding:
+            self._sorted = array('Q', sorted(set(self._sorted).union(self._recent)))
+            self._recent = set()
+
+
+revocation_filter = RevocationFilter()
@@ -1,9 +1,23 @@
+from datetime import time
+from functools import partial
+
 from rest_framework import serializers
+from django.conf import settings
 from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import Prefetch, prefetch_related_objects
 from django.contrib.auth import authenticate
+from rest_framework_simplejwt.serializers import TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+from backend.images import image_srcset, version_of
+from .tokens import RoleRefreshToken
+from .availability import book
+from .cache import expire_unread_counts
+from .events import publish, role_channel, user_channel
 from .models import (
     UserProfile, Category, MenuItem, Order, OrderItem, Payment, 
-    Table, Reservation, Review, Inventory, StaffSchedule, Notification
+    Table, Reservation, Review, Inventory, StaffSchedule, Notification, RecipeIngredient,
+    sync_order_stock,
 )
 
 
@@ -43,20 +57,18 @@ class UserRegistrationSerializer(serializers.ModelSerializer):
     
     def create(self, validated_data):
         password = validated_data.pop('password')
-        password_confirm = validated_data.pop('password_confirm')
+        validated_data.pop('password_confirm')
         role = validated_data.pop('role', 'customer')
         phone = validated_data.pop('phone', '')
         
-        user = User.objects.create_user(**validated_data)
+        # One user insert; the post_save signal creates the profile from _profile_defaults
+        validated_data['username'] = User.normalize_username(validated_data['username'])
+        validated_data['email'] = User.objects.normalize_email(validated_data.get('email', ''))
+        user = User(**validated_data)
         user.set_password(password)
-        user.save()
-        
-        # Create user profile
-        UserProfile.objects.create(
-            user=user,
-            role=role,
-            phone=phone
-        )
+        user._profile_defaults = {'role': role, 'phone': phone}
+        with transaction.atomic():
+            user.save()
         
         return user
 
@@ -83,6 +95,26 @@ class LoginSerializer(serializers.Serializer):
         return attrs
 
 
+class RoleTokenRefreshSerializer(TokenRefreshSerializer):
+    """Token refresh that re-reads the role, so refreshed access tokens carry the current one"""
+    token_class = RoleRefreshToken
+    
+    def validate(self, attrs):
+        refresh = self.token_class(attrs['refresh'])
+        refresh.restamp_role()
+        data = {'access': str(refresh.access_token)}
+        
+        if jwt_settings.ROTATE_REFRESH_TOKENS:
+            if jwt_settings.BLACKLIST_AFTER_ROTATION:
+                refresh.blacklist()
+            refresh.set_jti()
+            refresh.set_exp()
+            refresh.set_iat()
+            data['refresh'] = str(refresh)
+        
+        return data
+
+
 class CategorySerializer(serializers.ModelSerializer):
     """Category serializer"""
     menu_items_count = serializers.SerializerMethodField()
@@ -93,6 +125,9 @@ class CategorySerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'created_at', 'updated_at', 'menu_items_count']
     
     def get_menu_items_count(self, obj):
+        # Annotated by CategoryViewSet; fall back to a query for freshly saved instances
+        if hasattr(obj, 'active_menu_items_count'):
+            return obj.active_menu_items_count
         return obj.menu_items.filter(is_active=True).count()
 
 
@@ -100,13 +135,14 @@ class MenuItemSerializer(serializers.ModelSerializer):
     """Menu item serializer"""
     category_name = serializers.CharField(source='category.name', read_only=True)
     image_url = serializers.SerializerMethodField()
+    image_srcset = serializers.SerializerMethodField()
     profit_margin = serializers.ReadOnlyField()
     
     class Meta:
         model = MenuItem
         fields = [
             'id', 'name', 'description', 'category', 'category_name', 'price', 'cost',
-            'image', 'image_url', 'availability', 'preparation_time', 'calories',
+            'image', 'image_url', 'image_srcset', 'availability', 'preparation_time', 'calories',
             'allergens', 'is_featured', 'is_active', 'created_at', 'updated_at', 'profit_margin'
         ]
         read_only_fields = ['id', 'created_at', 'updated_at', 'profit_margin']
@@ -117,18 +153,31 @@ class MenuItemSerializer(serializers.ModelSerializer):
             if request:
                 return request.build_absolute_uri(obj.image.url)
         return None
+    
+    def get_image_srcset(self, obj):
+        return image_srcset(obj.image, version_of(obj), self.context.get('request'))
+
+
+class MenuCategorySerializer(serializers.ModelSerializer):
+    """Category with its active menu items, for the public menu snapshot"""
+    items = MenuItemSerializer(source='active_items', many=True, read_only=True)
+    
+    class Meta:
+        model = Category
+        fields = ['id', 'name', 'description', 'image', 'items']
 
 
 class OrderItemSerializer(serializers.ModelSerializer):
     """Order item serializer"""
     menu_item_name = serializers.CharField(source='menu_item.name', read_only=True)
     menu_item_image = serializers.SerializerMethodField()
+    menu_item_image_srcset = serializers.SerializerMethodField()
     total_price = serializers.ReadOnlyField()
     
     class Meta:
         model = OrderItem
         fields = [
-            'id', 'menu_item', 'menu_item_name', 'menu_item_image', 'quantity',
+            'id', 'menu_item', 'menu_item_name', 'menu_item_image', 'menu_item_image_srcset', 'quantity',
             'unit_price', 'special_instructions', 'total_price'
         ]
         read_only_fields = ['id', 'total_price']
@@ -139,6 +188,9 @@ class OrderItemSerializer(serializers.ModelSerializer):
             if request:
                 return request.build_absolute_uri(obj.menu_item.image.url)
         return None
+    
+    def get_menu_item_image_srcset(self, obj):
+        return image_srcset(obj.menu_item.image, version_of(obj.menu_item), self.context.get('request'))
 
 
 class OrderSerializer(serializers.ModelSerializer):
@@ -160,27 +212,69 @@ class OrderSerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'subtotal', 'tax_amount', 'total_amount', 'created_at', 'updated_at']
 
 
+class OrderItemInputSerializer(serializers.Serializer):
+    """One line of a new order; the price is always taken from the menu"""
+    menu_item = serializers.IntegerField(min_value=1)
+    quantity = serializers.IntegerField(min_value=1, default=1)
+    special_instructions = serializers.CharField(required=False, allow_blank=True, allow_null=True)
+
+
 class OrderCreateSerializer(serializers.ModelSerializer):
-    """Order creation serializer"""
-    order_items = OrderItemSerializer(many=True)
+    """Order creation serializer.
+
+    Menu prices are read in one query, items are inserted with one
+    ``bulk_create`` and the order is written once with its final totals.
+    """
+    order_items = OrderItemInputSerializer(many=True, allow_empty=False, write_only=True)
     
     class Meta:
         model = Order
         fields = ['payment_method', 'notes', 'order_items']
     
+    def validate_order_items(self, items):
+        ids = [item['menu_item'] for item in items]
+        if len(set(ids)) != len(ids):
+            raise serializers.ValidationError('Each menu item may only appear once per order.')
+        
+        menu_items = MenuItem.objects.filter(
+            is_active=True, availability='available'
+        ).in_bulk(ids)
+        unavailable = [pk for pk in ids if pk not in menu_items]
+        if unavailable:
+            raise serializers.ValidationError(
+                f"Menu items not available: {', '.join(str(pk) for pk in unavailable)}"
+            )
+        for item in items:
+            item['menu_item'] = menu_items[item['menu_item']]
+        return items
+    
     def create(self, validated_data):
         order_items_data = validated_data.pop('order_items')
-        order = Order.objects.create(**validated_data)
-        
-        for item_data in order_items_data:
-            OrderItem.objects.create(order=order, **item_data)
+        order = Order(**validated_data)
+        items = [
+            OrderItem(order=order, unit_price=item['menu_item'].price, **item)
+            for item in order_items_data
+        ]
+        order.set_totals(sum(item.total_price for item in items))
         
+        with transaction.atomic():
+            order.save()
+            OrderItem.objects.bulk_create(items)
+            # An order created as confirmed takes its stock with the items
+            sync_order_stock(order.pk)
         return order
+    
+    def to_representation(self, instance):
+        # Respond with the full order, items included, as the other order endpoints do
+        prefetch_related_objects(
+            [instance], Prefetch('order_items', queryset=OrderItem.objects.select_related('menu_item'))
+        )
+        return OrderSerializer(instance, context=self.context).data
 
 
 class PaymentSerializer(serializers.ModelSerializer):
     """Payment serializer"""
-    order_id = serializers.CharField(source='order.id', read_only=True)
+    order_id = serializers.CharField(read_only=True)
     status_display = serializers.CharField(source='get_status_display', read_only=True)
     
     class Meta:
@@ -216,6 +310,36 @@ class ReservationSerializer(serializers.ModelSerializer):
             'created_at'
         ]
         read_only_fields = ['id', 'created_at']
+    
+    def validate(self, attrs):
+        table = attrs.get('table', getattr(self.instance, 'table', None))
+        party_size = attrs.get('party_size', getattr(self.instance, 'party_size', 1))
+        if table is not None and party_size > table.capacity:
+            raise serializers.ValidationError({'party_size': [f'Table {table.number} seats {table.capacity}.']})
+        return attrs
+    
+    def create(self, validated_data):
+        return book(Reservation(**validated_data))
+    
+    def update(self, instance, validated_data):
+        for field, value in validated_data.items():
+            setattr(instance, field, value)
+        return book(instance)
+
+
+class TableAvailabilityQuerySerializer(serializers.Serializer):
+    """Query for /tables/availability/: a day, a party size and an opening window"""
+    date = serializers.DateField()
+    party_size = serializers.IntegerField(min_value=1, default=1)
+    start = serializers.TimeField(default=time(8, 0))
+    end = serializers.TimeField(default=time(20, 0))
+    duration = serializers.IntegerField(min_value=15, max_value=8 * 60, default=60)
+    step = serializers.IntegerField(min_value=5, max_value=120, default=30)
+    
+    def validate(self, attrs):
+        if attrs['end'] <= attrs['start']:
+            raise serializers.ValidationError({'end': ['Must be after start.']})
+        return attrs
 
 
 class ReviewSerializer(serializers.ModelSerializer):
@@ -247,6 +371,17 @@ class InventorySerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'is_low_stock', 'created_at', 'updated_at']
 
 
+class RecipeIngredientSerializer(serializers.ModelSerializer):
+    """Recipe line: inventory used per serving of a menu item"""
+    inventory_name = serializers.CharField(source='inventory.name', read_only=True)
+    unit = serializers.CharField(source='inventory.unit', read_only=True)
+    
+    class Meta:
+        model = RecipeIngredient
+        fields = ['id', 'menu_item', 'inventory', 'inventory_name', 'unit', 'quantity']
+        read_only_fields = ['id']
+
+
 class StaffScheduleSerializer(serializers.ModelSerializer):
     """Staff schedule serializer"""
     staff_name = serializers.CharField(source='staff.get_full_name', read_only=True)
@@ -274,6 +409,52 @@ class NotificationSerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'created_at']
 
 
+class NotificationBroadcastSerializer(serializers.Serializer):
+    """Create the same notification for many users (all active users by default)"""
+    type = serializers.ChoiceField(choices=Notification.TYPE_CHOICES, default='system')
+    title = serializers.CharField(max_length=200)
+    message = serializers.CharField()
+    roles = serializers.ListField(
+        child=serializers.ChoiceField(choices=UserProfile.ROLE_CHOICES), required=False, allow_empty=False
+    )
+    users = serializers.ListField(
+        child=serializers.IntegerField(), required=False, allow_empty=False, max_length=5000
+    )
+    
+    def recipients(self, validated_data):
+        users = User.objects.filter(is_active=True)
+        if 'roles' in validated_data:
+            users = users.filter(profile__role__in=validated_data['roles'])
+        if 'users' in validated_data:
+            users = users.filter(pk__in=validated_data['users'])
+        return list(users.order_by('pk').values_list('pk', flat=True))
+    
+    def create(self, validated_data):
+        fields = {name: validated_data[name] for name in ('type', 'title', 'message')}
+        user_ids = self.recipients(validated_data)
+        chunk_size = settings.NOTIFICATION_BROADCAST_CHUNK_SIZE
+        
+        # One INSERT per chunk; bulk_create sends no post_save, so the unread
+        # counters and live streams are updated once for the whole broadcast
+        with transaction.atomic():
+            for start in range(0, len(user_ids), chunk_size):
+                Notification.objects.bulk_create([
+                    Notification(user_id=user_id, **fields) for user_id in user_ids[start:start + chunk_size]
+                ])
+            transaction.on_commit(partial(expire_unread_counts, user_ids))
+            if 'users' in validated_data:
+                channels = [user_channel(user_id) for user_id in user_ids]
+            else:
+                roles = validated_data.get('roles') or [role for role, _ in UserProfile.ROLE_CHOICES]
+                channels = [role_channel(role) for role in roles]
+            for channel in channels:
+                transaction.on_commit(partial(publish, channel, 'notification.broadcast', fields))
+        return {'created': len(user_ids)}
+    
+    def to_representation(self, instance):
+        return instance
+
+
 class DashboardStatsSerializer(serializers.Serializer):
     """Dashboard statistics serializer"""
     total_orders = serializers.IntegerField()
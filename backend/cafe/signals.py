@@ -1,16 +1,104 @@
-from django.db.models.signals import post_save
+from functools import partial
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_delete
 from django.dispatch import receiver
 from django.contrib.auth.models import User
-from .models import UserProfile
+from .cache import (
+    adjust_unread_count, bump_menu_version, expire_role_version, expire_unread_counts, invalidate_dashboard_stats
+)
+from .events import ORDERS_CHANNEL, has_subscribers, publish, user_channel
+from .models import (
+    UserProfile, Category, MenuItem, Order, Inventory, Notification, record_completed_order, sync_order_sales,
+    sync_order_stock,
+)
 
 @receiver(post_save, sender=User)
 def create_user_profile(sender, instance, created, **kwargs):
+    # Profile fields can be passed in by setting ``user._profile_defaults`` before the first save.
+    # Later User saves (e.g. the last_login update) leave the profile alone.
+    if created:
+        UserProfile.objects.create(user=instance, **getattr(instance, '_profile_defaults', {}))
+
+@receiver(post_save, sender=Order)
+def update_sales_rollups(sender, instance, created, **kwargs):
+    # Only transitions into or out of "completed" touch the rollups. After commit,
+    # so an order created as completed is counted with its items
+    previous = getattr(instance, '_loaded_status', None)
+    if (instance.status == 'completed') != (previous == 'completed'):
+        transaction.on_commit(partial(sync_order_sales, instance.pk))
+
+@receiver(post_save, sender=Order)
+def update_order_stock(sender, instance, created, **kwargs):
+    # Inside Order.save's transaction. A new order has no items yet: whoever adds
+    # them calls sync_order_stock, which claims the change, so extra calls are harmless
     if created:
-        UserProfile.objects.create(user=instance)
+        return
+    if instance.status in Order.STOCK_DEDUCTED_STATUSES or instance.status == 'cancelled':
+        sync_order_stock(instance.pk)
+
+@receiver(pre_delete, sender=Order)
+def remove_deleted_order_from_rollups(sender, instance, **kwargs):
+    # pre_delete: the order items are still there to attribute categories
+    if Order.objects.filter(pk=instance.pk, sales_recorded=True).update(sales_recorded=False):
+        record_completed_order(instance, sign=-1)
+
+@receiver([post_save, post_delete], sender=Order)
+@receiver([post_save, post_delete], sender=Inventory)
+def expire_dashboard_stats(sender, **kwargs):
+    invalidate_dashboard_stats()
+
+@receiver([post_save, post_delete], sender=MenuItem)
+@receiver([post_save, post_delete], sender=Category)
+def expire_menu_version(sender, **kwargs):
+    bump_menu_version()
+
+@receiver([post_save, post_delete], sender=UserProfile)
+def expire_cached_role_version(sender, instance, **kwargs):
+    expire_role_version(instance.user_id)
 
 @receiver(post_save, sender=User)
-def save_user_profile(sender, instance, **kwargs):
-    try:
-        instance.profile.save()
-    except UserProfile.DoesNotExist:
-        UserProfile.objects.create(user=instance)
+def expire_role_version_of_user(sender, instance, created, update_fields=None, **kwargs):
+    # Deactivated users must lose token access at once; last_login updates are skipped
+    if not created and (update_fields is None or 'is_active' in update_fields):
+        expire_role_version(instance.pk)
+
+def publish_order_event(order_id, event_type):
+    from .serializers import OrderSerializer
+
+    order = Order.objects.select_related('customer').prefetch_related('order_items__menu_item').filter(
+        pk=order_id
+    ).first()
+    if order is not None:
+        publish(ORDERS_CHANNEL, event_type, OrderSerializer(order).data)
+
+@receiver(post_save, sender=Order)
+def stream_order_changes(sender, instance, created, **kwargs):
+    # Serialised once after commit (when the items exist), however many screens are watching
+    if created:
+        event_type = 'order.created'
+    elif instance.status != getattr(instance, '_loaded_status', None):
+        event_type = 'order.status'
+    else:
+        return
+    if has_subscribers(ORDERS_CHANNEL):
+        transaction.on_commit(partial(publish_order_event, instance.pk, event_type))
+
+@receiver(post_save, sender=Notification)
+def count_new_notification(sender, instance, created, **kwargs):
+    if not created:
+        # Edits may change is_read; recount on the next read
+        transaction.on_commit(partial(expire_unread_counts, [instance.user_id]))
+        return
+    if not instance.is_read:
+        transaction.on_commit(partial(adjust_unread_count, instance.user_id, 1))
+    channel = user_channel(instance.user_id)
+    if has_subscribers(channel):
+        from .serializers import NotificationSerializer
+
+        transaction.on_commit(partial(publish, channel, 'notification.created', NotificationSerializer(instance).data))
+
+@receiver(post_delete, sender=Notification)
+def uncount_deleted_notification(sender, instance, **kwargs):
+    if not instance.is_read:
+        transaction.on_commit(partial(adjust_unread_count, instance.user_id, -1))
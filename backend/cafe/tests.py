@@ -1,3 +1,1273 @@
-from django.test import TestCase
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+from io import BytesIO, StringIO
+import csv
+import json
+import random
+import shutil
+import tempfile
+from time import sleep
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection, transaction
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APITestCase
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+
+from backend import images
+from backend.images import version_of
+from benchmarks import report
+from benchmarks.runner import run_load
+from benchmarks.scenarios import Context, place_order
+
+from .models import (
+    UserProfile, Category, MenuItem, Order, OrderItem, Payment, Table, Reservation, Review,
+    Inventory, StaffSchedule, Notification, RecipeIngredient, DailySalesRollup, CategorySalesRollup,
+    StockDeduction, rebuild_sales_rollups
+)
+from .revocation import revocation_filter
+from .serializers import OrderCreateSerializer
+from .tokens import RoleRefreshToken
+
+
+class QueryPlanMixin:
+    """EXPLAIN the queries an endpoint runs and check which index they use"""
+
+    def explain(self, sql):
+        with connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                # Test tables are tiny; without this the planner always prefers a seq scan
+                cursor.execute('SET LOCAL enable_seqscan = off')
+                cursor.execute(f'EXPLAIN {sql}')
+            else:
+                cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+            return '\n'.join(' '.join(str(column) for column in row) for row in cursor.fetchall())
+
+    def assertUsesIndex(self, queries, table, index_names):
+        """The first non-count query reading ``table`` uses one of ``index_names``"""
+        index_names = [index_names] if isinstance(index_names, str) else index_names
+        sql = next(
+            query['sql'] for query in queries
+            if f'FROM "{table}"' in query['sql'] and not query['sql'].startswith('SELECT COUNT(*)')
+        )
+        plan = self.explain(sql)
+        self.assertTrue(any(name in plan for name in index_names), f'{index_names} not used:\n{sql}\n{plan}')
+
+    def assertEndpointUsesIndex(self, url, table, index_names, params=None):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200, url)
+        self.assertUsesIndex(queries, table, index_names)
+
+
+class ListQueryCountTests(APITestCase):
+    """Every list endpoint costs a fixed number of queries, whatever the page size"""
+
+    # count + page for the paginated list, plus any prefetches
+    EXPECTED_QUERIES = {
+        '/api/cafe/users/': 2,
+        '/api/cafe/profiles/': 2,
+        '/api/cafe/categories/': 2,
+        '/api/cafe/menu-items/': 2,
+        '/api/cafe/orders/': 4,
+        '/api/cafe/order-items/': 2,
+        '/api/cafe/payments/': 2,
+        '/api/cafe/tables/': 2,
+        '/api/cafe/reservations/': 2,
+        '/api/cafe/reviews/': 2,
+        '/api/cafe/inventory/': 2,
+        '/api/cafe/staff-schedules/': 2,
+        '/api/cafe/notifications/': 2,
+    }
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user('staff', password='password123')
+        cls.staff.profile.role = 'staff'
+        cls.staff.profile.save()
+
+    def setUp(self):
+        self.client.force_authenticate(self.staff)
+        # Resolve the staff profile up front so it is not counted per request
+        self.staff.profile
+
+    def add_rows(self, count):
+        start = Category.objects.count()
+        days = ['monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday']
+        for i in range(start, start + count):
+            customer = User.objects.create_user(f'customer{i}', first_name='Customer', last_name=str(i))
+            category = Category.objects.create(name=f'Category {i}')
+            item = MenuItem.objects.create(name=f'Item {i}', category=category, price=Decimal('3.50'))
+            MenuItem.objects.create(name=f'Side {i}', category=category, price=Decimal('1.50'))
+            order = Order.objects.create(customer=customer)
+            OrderItem.objects.create(order=order, menu_item=item, quantity=2, unit_price=item.price)
+            Payment.objects.create(order=order, amount=Decimal('7.00'), payment_method='cash')
+            table = Table.objects.create(number=f'T{i}')
+            Reservation.objects.create(customer=customer, table=table, date=date(2025, 1, 1), time=time(12))
+            Review.objects.create(customer=customer, menu_item=item, order=order, rating=5)
+            Inventory.objects.create(name=f'Stock {i}')
+            StaffSchedule.objects.create(
+                staff=customer, day=days[i % 7], start_time=time(8), end_time=time(16)
+            )
+            Notification.objects.create(user=self.staff, type='system', title='Hi', message='Hello')
+
+    def list_queries(self):
+        counts = {}
+        for url in self.EXPECTED_QUERIES:
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, 200, url)
+            counts[url] = len(queries)
+        return counts
+
+    def test_list_query_counts_do_not_grow_with_page_size(self):
+        self.add_rows(2)
+        self.assertEqual(self.list_queries(), self.EXPECTED_QUERIES)
+
+        self.add_rows(15)
+        self.assertEqual(self.list_queries(), self.EXPECTED_QUERIES)
+
+
+class CategoryListTests(APITestCase):
+    def setUp(self):
+        user = User.objects.create_user('customer', password='password123')
+        self.client.force_authenticate(user)
+
+    def test_menu_items_count_is_annotated_for_hundreds_of_categories(self):
+        categories = Category.objects.bulk_create([Category(name=f'Category {i:03d}') for i in range(300)])
+        MenuItem.objects.bulk_create([
+            MenuItem(name=f'Item {i}', category=category, price=Decimal('2.00'), is_active=i % 3 != 0)
+            for category in categories for i in range(3)
+        ])
+
+        # count + page, independent of the number of categories
+        with self.assertNumQueries(2):
+            response = self.client.get('/api/cafe/categories/', {'page': 15})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['count'], 300)
+        self.assertTrue(all(row['menu_items_count'] == 2 for row in response.data['results']))
+
+
+class MenuSnapshotTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        category = Category.objects.create(name='Drinks')
+        self.tea = MenuItem.objects.create(name='Tea', category=category, price=Decimal('1.00'))
+
+    def get(self, if_none_match=None):
+        headers = {'HTTP_IF_NONE_MATCH': if_none_match} if if_none_match else {}
+        return self.client.get('/api/cafe/menu/', **headers)
+
+    def test_full_response_carries_the_etag(self):
+        response = self.get()
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['ETag'].startswith('"menu-'))
+        data = json.loads(response.content)
+        self.assertEqual([item['name'] for item in data['categories'][0]['items']], ['Tea'])
+
+        with self.assertNumQueries(0):
+            self.assertEqual(self.get().content, response.content)
+
+    def test_matching_etags_get_304(self):
+        etag = self.get()['ETag']
+        for header in (etag, f'W/{etag}', f'"other", {etag}', f'W/"other",W/{etag}', '*'):
+            response = self.get(header)
+            self.assertEqual(response.status_code, 304, header)
+            self.assertEqual(response['ETag'], etag)
+            self.assertEqual(response.content, b'')
+
+    def test_stale_etags_get_the_new_menu(self):
+        etag = self.get()['ETag']
+        self.assertEqual(self.get('"menu-0000", W/"other"').status_code, 200)
+
+        self.tea.name = 'Green tea'
+        self.tea.save()
+        response = self.get(etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertIn(b'Green tea', response.content)
+
+
+class OrderCreateTests(APITestCase):
+    def setUp(self):
+        self.customer = User.objects.create_user('customer', password='password123')
+        self.client.force_authenticate(self.customer)
+        category = Category.objects.create(name='Catering')
+        self.items = MenuItem.objects.bulk_create([
+            MenuItem(name=f'Tray {i}', category=category, price=Decimal('12.35') + i)
+            for i in range(40)
+        ])
+
+    def test_totals_are_computed_from_menu_prices(self):
+        response = self.client.post('/api/cafe/orders/', {
+            'payment_method': 'card',
+            'order_items': [
+                {'menu_item': self.items[0].pk, 'quantity': 3},
+                {'menu_item': self.items[1].pk, 'quantity': 1, 'special_instructions': 'No nuts'},
+            ],
+        }, format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+
+        order = Order.objects.get(pk=response.data['id'])
+        self.assertEqual(order.subtotal, Decimal('50.40'))
+        self.assertEqual(order.tax_amount, Decimal('4.03'))
+        self.assertEqual(order.total_amount, Decimal('54.43'))
+        self.assertEqual(response.data['total_amount'], '54.43')
+        self.assertEqual(len(response.data['order_items']), 2)
+
+    def test_query_count_does_not_grow_with_order_size(self):
+        order_items = [{'menu_item': item.pk, 'quantity': 2} for item in self.items]
+        # menu prices, order insert, one items insert and the response re-read (plus savepoints)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post('/api/cafe/orders/', {'order_items': order_items[:2]}, format='json')
+        self.assertEqual(response.status_code, 201)
+
+        with self.assertNumQueries(len(queries)):
+            response = self.client.post('/api/cafe/orders/', {'order_items': order_items}, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(OrderItem.objects.filter(order_id=response.data['id']).count(), 40)
+
+    def test_unavailable_and_duplicate_items_are_rejected(self):
+        self.items[2].availability = 'out_of_stock'
+        self.items[2].save()
+
+        response = self.client.post('/api/cafe/orders/', {
+            'order_items': [{'menu_item': self.items[2].pk}],
+        }, format='json')
+        self.assertEqual(response.status_code, 400)
+
+        response = self.client.post('/api/cafe/orders/', {
+            'order_items': [{'menu_item': self.items[0].pk}, {'menu_item': self.items[0].pk}],
+        }, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Order.objects.exists())
+
+
+class CursorPaginationTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('reader', password='password123')
+        self.client.force_authenticate(self.user)
+        Notification.objects.bulk_create([
+            Notification(user=self.user, type='system', title=f'Note {i}', message='Hello')
+            for i in range(45)
+        ])
+        # Identical timestamps: pages must still be stable through the id tie-break
+        Notification.objects.update(created_at=Notification.objects.first().created_at)
+        self.user.profile
+
+    def test_cursor_pages_walk_every_row_once_without_counting(self):
+        seen = []
+        url = '/api/cafe/notifications/?cursor='
+        while url:
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertNotIn('count', response.data)
+            self.assertFalse(any('COUNT(' in query['sql'] for query in queries))
+            seen.extend(row['id'] for row in response.data['results'])
+            last_page = response.data
+            url = response.data['next']
+
+        expected = list(Notification.objects.order_by('-created_at', '-id').values_list('id', flat=True))
+        self.assertEqual(seen, expected)
+
+        previous = self.client.get(last_page['previous'])
+        self.assertEqual([row['id'] for row in previous.data['results']], expected[20:40])
+
+    def test_page_numbers_remain_the_default(self):
+        response = self.client.get('/api/cafe/notifications/', {'page': 2})
+        self.assertEqual(response.data['count'], 45)
+        self.assertEqual(len(response.data['results']), 20)
+
+    def test_invalid_cursor_is_rejected(self):
+        response = self.client.get('/api/cafe/notifications/', {'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, 404)
+
+
+class QueryPlanTests(QueryPlanMixin, APITestCase):
+    """List and report queries keep using the indexes declared for them"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user('staff', password='password123')
+        cls.staff.profile.role = 'staff'
+        cls.staff.profile.save()
+        cls.customer = User.objects.create_user('customer', password='password123')
+        category = Category.objects.create(name='Drinks')
+        MenuItem.objects.create(name='Tea', category=category, price=Decimal('1.00'))
+        Order.objects.create(customer=cls.customer)
+        cls.table = Table.objects.create(number='T1')
+        Reservation.objects.create(customer=cls.customer, table=cls.table, date=date(2025, 1, 1), time=time(12))
+        Notification.objects.create(user=cls.customer, type='system', title='Hi', message='Hello')
+
+    def test_customer_endpoints(self):
+        self.client.force_authenticate(self.customer)
+        self.assertEndpointUsesIndex('/api/cafe/orders/', 'cafe_order', 'order_customer_created_idx')
+        self.assertEndpointUsesIndex('/api/cafe/menu-items/', 'cafe_menuitem', 'menuitem_available_idx')
+        self.assertEndpointUsesIndex('/api/cafe/notifications/', 'cafe_notification', 'notification_user_created_idx')
+        self.assertEndpointUsesIndex(
+            '/api/cafe/notifications/', 'cafe_notification', 'notification_unread_idx', {'is_read': 'false'}
+        )
+
+    def test_staff_endpoints(self):
+        self.client.force_authenticate(self.staff)
+        self.assertEndpointUsesIndex('/api/cafe/orders/', 'cafe_order', 'order_created_id_idx', {'cursor': ''})
+        self.assertEndpointUsesIndex(
+            '/api/cafe/orders/', 'cafe_order', 'order_status_created_idx', {'status': 'pending'}
+        )
+        self.assertEndpointUsesIndex(
+            '/api/cafe/reservations/', 'cafe_reservation', 'reservation_table_slot_idx', {'table': self.table.pk}
+        )
+        self.assertEndpointUsesIndex(
+            '/api/cafe/reports/sales/', 'cafe_dailysalesrollup',
+            ['sqlite_autoindex_cafe_dailysalesrollup', 'cafe_dailysalesrollup_date_key'],
+        )
+
+    def test_sales_rollup_rebuild_reads_orders_by_status_and_range(self):
+        with CaptureQueriesContext(connection) as queries:
+            rebuild_sales_rollups(date(2025, 1, 1), date(2025, 1, 31))
+        self.assertUsesIndex(queries, 'cafe_order', 'order_status_created_idx')
+
+
+class RoleTokenTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('customer', password='password123')
+        category = Category.objects.create(name='Drinks')
+        MenuItem.objects.create(name='Tea', category=category, price=Decimal('1.00'))
+
+    def login(self):
+        response = self.client.post('/api/cafe/auth/login/', {'username': 'customer', 'password': 'password123'})
+        self.assertEqual(response.status_code, 200)
+        return response.data['tokens']
+
+    @override_settings(ROLE_VERSION_CACHED=True)
+    def test_reads_authenticate_from_the_token_without_queries(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {self.login()['access']}")
+        self.client.get('/api/cafe/menu-items/')  # warms the cached role version
+
+        # count + page only: no user or profile lookups
+        with self.assertNumQueries(2):
+            response = self.client.get('/api/cafe/menu-items/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['count'], 1)
+
+    @override_settings(ROLE_VERSION_CACHED=False)
+    def test_without_a_shared_cache_the_role_version_is_read_every_time(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {self.login()['access']}")
+        self.client.get('/api/cafe/menu-items/')
+
+        # role version + count + page, and nothing cached a worker could keep
+        with self.assertNumQueries(3):
+            self.assertEqual(self.client.get('/api/cafe/menu-items/').status_code, 200)
+        # Deactivated by another worker: no signal reaches this process
+        User.objects.filter(pk=self.user.pk).update(is_active=False)
+        self.assertEqual(self.client.get('/api/cafe/menu-items/').status_code, 401)
+
+    def test_role_change_invalidates_tokens_until_refreshed(self):
+        tokens = self.login()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {tokens['access']}")
+        self.assertEqual(self.client.get('/api/cafe/inventory/').status_code, 200)
+        self.assertEqual(self.client.post('/api/cafe/inventory/', {'name': 'Milk'}).status_code, 403)
+
+        profile = self.user.profile
+        profile.role = 'staff'
+        profile.save()
+        self.assertEqual(self.client.get('/api/cafe/inventory/').status_code, 401)
+
+        self.client.credentials()
+        response = self.client.post('/api/cafe/auth/token/refresh/', {'refresh': tokens['refresh']})
+        self.assertEqual(response.status_code, 200)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {response.data['access']}")
+        self.assertEqual(self.client.post('/api/cafe/inventory/', {'name': 'Milk'}).status_code, 201)
+        self.assertEqual(self.client.get('/api/cafe/orders/').status_code, 200)
+
+    def test_login_without_a_profile_creates_one(self):
+        UserProfile.objects.filter(user=self.user).delete()
+        tokens = self.login()
+        self.assertEqual(UserProfile.objects.get(user=self.user).role, 'customer')
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {tokens['access']}")
+        self.assertEqual(self.client.get('/api/cafe/menu-items/').status_code, 200)
+
+    def test_deactivated_user_loses_read_access(self):
+        tokens = self.login()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {tokens['access']}")
+        self.assertEqual(self.client.get('/api/cafe/menu-items/').status_code, 200)
+
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.client.get('/api/cafe/menu-items/').status_code, 401)
+        self.client.credentials()
+        response = self.client.post('/api/cafe/auth/token/refresh/', {'refresh': tokens['refresh']})
+        self.assertEqual(response.status_code, 401)
+
+
+class TokenRevocationTests(APITestCase):
+    def setUp(self):
+        revocation_filter.reset()
+        self.user = User.objects.create_user('customer', password='password123')
+
+    def test_unrevoked_refresh_tokens_are_checked_without_queries(self):
+        raw = str(RoleRefreshToken.for_user(self.user))
+        revocation_filter.sync(force=True)
+        with self.assertNumQueries(0):
+            RoleRefreshToken(raw)
+
+    def test_logged_out_refresh_token_is_rejected(self):
+        tokens = self.client.post(
+            '/api/cafe/auth/login/', {'username': 'customer', 'password': 'password123'}
+        ).data['tokens']
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {tokens['access']}")
+        self.assertEqual(self.client.post('/api/cafe/auth/logout/', {'refresh': tokens['refresh']}).status_code, 200)
+
+        self.client.credentials()
+        response = self.client.post('/api/cafe/auth/token/refresh/', {'refresh': tokens['refresh']})
+        self.assertEqual(response.status_code, 401)
+
+    def test_tokens_blacklisted_by_another_process_are_picked_up(self):
+        token = RoleRefreshToken.for_user(self.user)
+        revocation_filter.sync(force=True)
+        BlacklistedToken.objects.create(token=OutstandingToken.objects.get(jti=token['jti']))
+
+        revocation_filter.sync(force=True)
+        self.assertTrue(revocation_filter.is_revoked(token['jti']))
+        self.assertFalse(revocation_filter.is_revoked(RoleRefreshToken.for_user(self.user)['jti']))
+
+    @override_settings(JWT_REVOCATION_REBUILD_INTERVAL=0)
+    def test_rebuild_runs_outside_the_request(self):
+        token = RoleRefreshToken.for_user(self.user)
+        token.blacklist()
+        revocation_filter.sync(force=True)
+        self.assertTrue(revocation_filter.is_revoked(token['jti']))
+        OutstandingToken.objects.filter(jti=token['jti']).update(expires_at=timezone.now() - timedelta(seconds=1))
+
+        with mock.patch('cafe.revocation.threading.Thread') as thread:
+            revocation_filter.sync(force=True)
+            revocation_filter.sync(force=True)
+        # One rebuild is started; the requests keep using the old filter meanwhile
+        thread.assert_called_once()
+        thread.return_value.start.assert_called_once()
+        self.assertEqual(len(revocation_filter), 1)
+
+        # What the thread runs: the expired token is dropped when the new filter is swapped in
+        revocation_filter.rebuild(*thread.call_args.kwargs['args'])
+        self.assertEqual(len(revocation_filter), 0)
+        with mock.patch('cafe.revocation.threading.Thread') as thread:
+            revocation_filter.sync(force=True)
+        thread.assert_called_once()
+
+    def test_prune_tokens_deletes_only_expired_tokens(self):
+        expired = timezone.now() - timedelta(days=1)
+        for i in range(7):
+            outstanding = OutstandingToken.objects.create(user=self.user, jti=f'old-{i}', token='x', expires_at=expired)
+            if i % 2:
+                BlacklistedToken.objects.create(token=outstanding)
+        RoleRefreshToken.for_user(self.user).blacklist()
+
+        call_command('prune_tokens', batch_size=3, stdout=StringIO())
+        self.assertEqual(OutstandingToken.objects.count(), 1)
+        self.assertEqual(BlacklistedToken.objects.count(), 1)
+
+
+class AccountWriteTests(APITestCase):
+    """Registration and login touch the user and profile rows exactly once"""
+
+    @staticmethod
+    def writes(queries):
+        return [query['sql'].split(' (')[0].split(' SET')[0] for query in queries
+                if query['sql'].startswith(('INSERT', 'UPDATE', 'DELETE'))]
+
+    def test_registration_inserts_one_user_and_one_profile(self):
+        # username check, savepoint, user insert, profile insert, release, outstanding token insert
+        with self.assertNumQueries(6) as queries:
+            response = self.client.post('/api/cafe/auth/register/', {
+                'username': 'newcomer', 'email': 'newcomer@example.com', 'role': 'staff', 'phone': '555',
+                'password': 'password123', 'password_confirm': 'password123',
+            })
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertEqual(self.writes(queries.captured_queries), [
+            'INSERT INTO "auth_user"',
+            'INSERT INTO "cafe_userprofile"',
+            'INSERT INTO "token_blacklist_outstandingtoken"',
+        ])
+        profile = User.objects.get(username='newcomer').profile
+        self.assertEqual((profile.role, profile.phone), ('staff', '555'))
+
+    def test_login_only_updates_last_login(self):
+        user = User.objects.create_user('customer', password='password123')
+
+        # user lookup, last_login update, outstanding token insert, profile for the role claim
+        with self.assertNumQueries(4) as queries:
+            response = self.client.post('/api/cafe/auth/login/', {'username': 'customer', 'password': 'password123'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.writes(queries.captured_queries), [
+            'UPDATE "auth_user"',
+            'INSERT INTO "token_blacklist_outstandingtoken"',
+        ])
+        update = next(query['sql'] for query in queries.captured_queries if query['sql'].startswith('UPDATE'))
+        self.assertRegex(update, r'^UPDATE "auth_user" SET "last_login" = [^,]+ WHERE')
+        user.refresh_from_db()
+        self.assertIsNotNone(user.last_login)
+
+
+class OrderStreamTests(APITestCase):
+    def setUp(self):
+        self.staff = User.objects.create_user('kitchen', password='password123')
+        self.staff.profile.role = 'staff'
+        self.staff.profile.save()
+        self.customer = User.objects.create_user('customer', password='password123')
+        category = Category.objects.create(name='Hot food')
+        self.item = MenuItem.objects.create(name='Soup', category=category, price=Decimal('3.50'))
+        self.pending = Order.objects.create(customer=self.customer, payment_method='cash')
+        Order.objects.create(customer=self.customer, payment_method='cash', status='completed')
+
+    def token(self, user):
+        return str(RoleRefreshToken.for_user(user).access_token)
+
+    def advance_order(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.pending.status = 'preparing'
+            self.pending.save()
+
+    async def read_event(self, content):
+        return json.loads((await anext(content)).decode().removeprefix('data: '))
+
+    async def test_stream_sends_snapshot_then_status_changes(self):
+        token = await sync_to_async(self.token)(self.staff)
+        response = await self.async_client.get('/api/cafe/orders/stream/', {'token': token})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        content = aiter(response.streaming_content)
+
+        snapshot = await self.read_event(content)
+        self.assertEqual(snapshot['type'], 'snapshot')
+        self.assertEqual([order['id'] for order in snapshot['data']], [str(self.pending.pk)])
+
+        await sync_to_async(self.advance_order)()
+        event = await self.read_event(content)
+        self.assertEqual(event['type'], 'order.status')
+        self.assertEqual(event['data']['id'], str(self.pending.pk))
+        self.assertEqual(event['data']['status'], 'preparing')
+        await content.aclose()
+
+    async def test_customers_and_anonymous_clients_are_refused(self):
+        token = await sync_to_async(self.token)(self.customer)
+        response = await self.async_client.get('/api/cafe/orders/stream/', {'token': token})
+        self.assertEqual(response.status_code, 403)
+        response = await self.async_client.get('/api/cafe/orders/stream/')
+        self.assertEqual(response.status_code, 401)
+@override_settings(NOTIFICATION_UNREAD_CACHED=True, ROLE_VERSION_CACHED=True)
+
+@override_settings(NOTIFICATION_UNREAD_CACHED=True)
+class NotificationCounterTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('customer', password='password123')
+        self.admin = User.objects.create_user('manager', password='password123')
+        self.admin.profile.role = 'admin'
+        self.admin.profile.save()
+        self.notifications = Notification.objects.bulk_create([
+            Notification(user=self.user, type='order', title=f'Order {i}', message='Ready') for i in range(3)
+        ])
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {RoleRefreshToken.for_user(self.user).access_token}')
+
+    def unread_count(self):
+        response = self.client.get('/api/cafe/notifications/unread_count/')
+        self.assertEqual(response.status_code, 200)
+        return response.data['unread_count']
+
+    def test_counter_is_cached_and_kept_up_to_date(self):
+        self.assertEqual(self.unread_count(), 3)
+        response = self.client.post(f'/api/cafe/notifications/{self.notifications[0].pk}/mark_read/')
+        self.assertEqual(response.status_code, 200)
+        # Marking it again must not decrement twice
+        self.client.post(f'/api/cafe/notifications/{self.notifications[0].pk}/mark_read/')
+        with self.assertNumQueries(0):
+            self.assertEqual(self.unread_count(), 2)
+
+        self.client.post('/api/cafe/notifications/mark_all_read/')
+        with self.assertNumQueries(0):
+            self.assertEqual(self.unread_count(), 0)
+
+    @override_settings(NOTIFICATION_UNREAD_CACHED=False)
+    def test_counter_is_read_from_the_database_without_a_shared_cache(self):
+        self.assertEqual(self.unread_count(), 3)
+        # As another worker's stale counter would be
+        cache.set(f'cafe:unread-notifications:{self.user.pk}', 7)
+        self.assertEqual(self.unread_count(), 3)
+
+        self.client.post(f'/api/cafe/notifications/{self.notifications[0].pk}/mark_read/')
+        self.assertEqual(self.unread_count(), 2)
+
+    def test_other_users_notifications_are_not_found(self):
+        other = Notification.objects.create(user=self.admin, type='system', title='Hi', message='Hello')
+        response = self.client.post(f'/api/cafe/notifications/{other.pk}/mark_read/')
+        self.assertEqual(response.status_code, 404)
+        other.refresh_from_db()
+        self.assertFalse(other.is_read)
+
+    @override_settings(NOTIFICATION_BROADCAST_CHUNK_SIZE=2)
+    def test_broadcast_inserts_in_chunks_and_expires_counters(self):
+        User.objects.bulk_create([User(username=f'student{i}') for i in range(3)])
+        self.assertEqual(self.unread_count(), 3)
+
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {RoleRefreshToken.for_user(self.admin).access_token}')
+        with CaptureQueriesContext(connection) as queries, self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/cafe/notifications/broadcast/', {
+                'title': 'Closed on Friday', 'message': 'The cafe is closed for the holiday.',
+            }, format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertEqual(response.data, {'created': 5})
+        inserts = [query for query in queries.captured_queries if query['sql'].startswith('INSERT INTO "cafe_notification"')]
+        self.assertEqual(len(inserts), 3)
+        self.assertEqual(Notification.objects.filter(type='system').count(), 5)
+
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {RoleRefreshToken.for_user(self.user).access_token}')
+        self.assertEqual(self.unread_count(), 4)
+
+    def notify(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Notification.objects.create(user=self.user, type='payment', title='Paid', message='Thanks')
+
+    async def test_stream_sends_unread_count_then_new_notifications(self):
+        token = await sync_to_async(lambda: str(RoleRefreshToken.for_user(self.user).access_token))()
+        response = await self.async_client.get('/api/cafe/notifications/stream/', {'token': token})
+        self.assertEqual(response.status_code, 200)
+        content = aiter(response.streaming_content)
+        first = json.loads((await anext(content)).decode().removeprefix('data: '))
+        self.assertEqual(first, {'type': 'unread', 'data': {'unread_count': 3}})
+
+        notification = await sync_to_async(self.notify)()
+        event = json.loads((await anext(content)).decode().removeprefix('data: '))
+        self.assertEqual(event['type'], 'notification.created')
+        self.assertEqual(event['data']['id'], notification.pk)
+        await content.aclose()
+
+    def test_only_admins_can_broadcast(self):
+        response = self.client.post('/api/cafe/notifications/broadcast/', {'title': 'Hi', 'message': 'Hello'})
+        self.assertEqual(response.status_code, 403)
+
+
+class SalesRollupTests(APITestCase):
+    def setUp(self):
+        self.customer = User.objects.create_user('customer', password='password123')
+        self.drinks = Category.objects.create(name='Drinks')
+        self.snacks = Category.objects.create(name='Snacks')
+        self.tea = MenuItem.objects.create(name='Tea', category=self.drinks, price=Decimal('0.10'))
+        self.chips = MenuItem.objects.create(name='Chips', category=self.snacks, price=Decimal('0.20'))
+
+    def create_order(self, status='pending', items=((0, 1), (1, 1))):
+        menu = [self.tea, self.chips]
+        order = Order.objects.create(customer=self.customer, status=status)
+        OrderItem.objects.bulk_create([
+            OrderItem(order=order, menu_item=menu[index], quantity=quantity, unit_price=menu[index].price)
+            for index, quantity in items
+        ])
+        order.recalculate_totals()
+        return order
+
+    def rollups(self):
+        daily = DailySalesRollup.objects.get(date=timezone.localdate())
+        by_category = {
+            rollup.category_id: (rollup.orders, rollup.items_sold, rollup.revenue)
+            for rollup in CategorySalesRollup.objects.all()
+        }
+        return (daily.orders, daily.revenue), by_category
+
+    def test_order_created_completed_is_counted_with_its_items(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            order = self.create_order('completed', items=((0, 3), (1, 1)))
+        daily, by_category = self.rollups()
+        self.assertEqual(daily, (1, order.total_amount))
+        self.assertEqual(by_category, {
+            self.drinks.pk: (1, 3, Decimal('0.30')),
+            self.snacks.pk: (1, 1, Decimal('0.20')),
+        })
+
+    def test_each_transition_is_counted_once(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            order = self.create_order()
+        self.assertFalse(DailySalesRollup.objects.exists())
+
+        # Two requests completing the same order from stale copies
+        first, second = Order.objects.get(pk=order.pk), Order.objects.get(pk=order.pk)
+        for copy in (first, second):
+            copy.status = 'completed'
+            with self.captureOnCommitCallbacks(execute=True):
+                copy.save()
+        self.assertEqual(self.rollups()[0], (1, Decimal('0.32')))
+
+        first.status = 'cancelled'
+        with self.captureOnCommitCallbacks(execute=True):
+            first.save()
+        self.assertEqual(self.rollups(), ((0, Decimal('0.00')), {
+            self.drinks.pk: (0, 0, Decimal('0.00')), self.snacks.pk: (0, 0, Decimal('0.00')),
+        }))
+
+        # Deleting an order that is not counted leaves the rollups alone
+        with self.captureOnCommitCallbacks(execute=True):
+            second.delete()
+        self.assertEqual(self.rollups()[0], (0, Decimal('0.00')))
+
+    def test_deleting_a_completed_order_removes_it(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            order = self.create_order('completed')
+        order.delete()
+        self.assertEqual(self.rollups()[0], (0, Decimal('0.00')))
+
+    def test_rebuild_matches_incremental_totals(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            for _ in range(3):
+                self.create_order('completed')
+            self.create_order()
+        incremental = self.rollups()
+
+        rebuild_sales_rollups()
+        self.assertEqual(self.rollups(), incremental)
+        self.assertEqual(Order.objects.filter(sales_recorded=True).count(), 3)
+
+    def test_report_totals_are_exact(self):
+        staff = User.objects.create_user('staff', password='password123')
+        staff.profile.role = 'staff'
+        staff.profile.save()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.create_order('completed', items=((0, 1),))
+            self.create_order('completed', items=((1, 1),))
+        self.client.force_authenticate(staff)
+
+        response = self.client.get('/api/cafe/reports/sales/', {'period': 'week'})
+        self.assertEqual(response.status_code, 200)
+        data = json.loads(response.content)
+        # 0.11 + 0.22 summed as floats would be 0.33000000000000002
+        self.assertEqual(data['total_revenue'], 0.33)
+        self.assertEqual(data['total_orders'], 2)
+
+
+class StockDeductionTests(APITestCase):
+    def setUp(self):
+        customer = User.objects.create_user('customer', password='password123')
+        category = Category.objects.create(name='Breakfast')
+        self.bagel = MenuItem.objects.create(name='Bagel', category=category, price=Decimal('2.50'))
+        self.toast = MenuItem.objects.create(name='Toast', category=category, price=Decimal('1.50'))
+        self.bread = Inventory.objects.create(name='Bread', current_stock=10)
+        self.butter = Inventory.objects.create(name='Butter', current_stock=100)
+        RecipeIngredient.objects.bulk_create([
+            RecipeIngredient(menu_item=self.bagel, inventory=self.bread, quantity=1),
+            RecipeIngredient(menu_item=self.bagel, inventory=self.butter, quantity=2),
+            RecipeIngredient(menu_item=self.toast, inventory=self.bread, quantity=2),
+            RecipeIngredient(menu_item=self.toast, inventory=self.butter, quantity=1),
+        ])
+        self.order = Order.objects.create(customer=customer)
+        OrderItem.objects.bulk_create([
+            OrderItem(order=self.order, menu_item=self.bagel, quantity=2, unit_price=self.bagel.price),
+            OrderItem(order=self.order, menu_item=self.toast, quantity=3, unit_price=self.toast.price),
+        ])
+
+    def set_status(self, status, order=None):
+        order = order or self.order
+        order.status = status
+        with self.captureOnCommitCallbacks(execute=True):
+            order.save()
+        self.bread.refresh_from_db()
+        self.butter.refresh_from_db()
+
+    def test_confirming_deducts_every_line_in_one_update(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.set_status('confirmed')
+        updates = [query for query in queries.captured_queries if query['sql'].startswith('UPDATE "cafe_inventory"')]
+        self.assertEqual(len(updates), 1)
+        self.assertEqual(self.bread.current_stock, 2)  # 10 - 2*1 - 3*2
+        self.assertEqual(self.butter.current_stock, 93)  # 100 - 2*2 - 3*1
+
+        # Later transitions do not deduct again
+        self.set_status('completed')
+        self.assertEqual(self.bread.current_stock, 2)
+
+    def test_items_are_marked_out_of_stock_when_an_ingredient_runs_out(self):
+        self.set_status('confirmed')
+        # Two slices left still make one toast
+        self.assertEqual(MenuItem.objects.filter(availability='out_of_stock').count(), 0)
+
+        order = Order.objects.create(customer=self.order.customer)
+        OrderItem.objects.create(order=order, menu_item=self.toast, quantity=1, unit_price=self.toast.price)
+        self.set_status('confirmed', order)
+        self.assertEqual(
+            set(MenuItem.objects.filter(availability='out_of_stock').values_list('name', flat=True)),
+            {'Bagel', 'Toast'},
+        )
+
+    def test_stock_never_goes_negative_and_shortfalls_are_reported(self):
+        staff = User.objects.create_user('staff', password='password123')
+        staff.profile.role = 'staff'
+        staff.profile.save()
+        self.bread.current_stock = 3
+        self.bread.save()
+        self.set_status('confirmed')
+        self.assertEqual(self.bread.current_stock, 0)
+        self.toast.refresh_from_db()
+        self.bagel.refresh_from_db()
+        self.assertEqual(self.toast.availability, 'out_of_stock')
+        self.assertEqual(self.bagel.availability, 'out_of_stock')
+        self.assertEqual(
+            list(self.order.stock_deductions.values_list('inventory__name', 'quantity', 'shortfall').order_by('pk')),
+            [('Bread', 3, 5), ('Butter', 7, 0)],
+        )
+        alert = Notification.objects.get(user=staff)
+        self.assertEqual((alert.type, alert.message), ('inventory', 'Bread: 5 short'))
+        self.assertFalse(Notification.objects.filter(user=self.order.customer).exists())
+
+        # Only the three slices actually taken go back
+        self.set_status('cancelled')
+        self.assertEqual(self.butter.current_stock, 100)
+        self.assertEqual(self.bread.current_stock, 3)
+        self.assertFalse(StockDeduction.objects.exists())
+
+    def test_a_failed_deduction_rolls_the_status_back(self):
+        self.order.status = 'confirmed'
+        with mock.patch('cafe.models.change_stock', side_effect=RuntimeError), self.assertRaises(RuntimeError):
+            self.order.save()
+        self.order.refresh_from_db()
+        self.assertEqual((self.order.status, self.order.stock_deducted), ('pending', False))
+        self.assertFalse(StockDeduction.objects.exists())
+
+    def test_order_created_confirmed_is_deducted_with_its_items(self):
+        serializer = OrderCreateSerializer(data={'order_items': [{'menu_item': self.bagel.pk}]})
+        serializer.is_valid(raise_exception=True)
+        order = serializer.save(customer=self.order.customer, status='confirmed')
+        self.bread.refresh_from_db()
+        self.assertEqual(self.bread.current_stock, 9)
+        self.assertTrue(Order.objects.get(pk=order.pk).stock_deducted)
+        self.assertEqual(
+            dict(order.stock_deductions.values_list('inventory__name', 'quantity')), {'Bread': 1, 'Butter': 2}
+        )
+
+    def test_deducting_refreshes_the_dashboard_low_stock_count(self):
+        staff = User.objects.create_user('staff', password='password123')
+        staff.profile.role = 'staff'
+        staff.profile.save()
+        Inventory.objects.filter(pk=self.bread.pk).update(minimum_stock=5)
+        self.client.force_authenticate(staff)
+        self.assertEqual(self.client.get('/api/cafe/dashboard/stats/').data['low_stock_items'], 0)
+
+        # Bread 10 -> 2, under its minimum of 5; the cached count is dropped on commit
+        self.set_status('confirmed')
+        self.assertEqual(self.client.get('/api/cafe/dashboard/stats/').data['low_stock_items'], 1)
+
+
+class DashboardStatsTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.staff = User.objects.create_user('staff', password='password123')
+        self.staff.profile.role = 'staff'
+        self.staff.profile.save()
+        self.client.force_authenticate(self.staff)
+        self.customer = User.objects.create_user('customer', password='password123')
+        Order.objects.create(customer=self.customer, total_amount=Decimal('10.00'))
+        self.flour = Inventory.objects.create(name='Flour', current_stock=50, minimum_stock=10)
+
+    def test_repeated_reads_are_served_from_the_cache(self):
+        first = self.client.get('/api/cafe/dashboard/stats/')
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(first.data['total_orders'], 1)
+        self.assertEqual(first.data['pending_orders'], 1)
+        self.assertEqual(first.data['low_stock_items'], 0)
+
+        with CaptureQueriesContext(connection) as queries:
+            second = self.client.get('/api/cafe/dashboard/stats/')
+        self.assertEqual(second.data, first.data)
+        self.assertFalse([query for query in queries.captured_queries if 'cafe_order' in query['sql']])
+
+    def test_order_and_inventory_writes_expire_the_cache(self):
+        self.client.get('/api/cafe/dashboard/stats/')
+        Order.objects.create(customer=self.customer, total_amount=Decimal('5.50'))
+        stats = self.client.get('/api/cafe/dashboard/stats/').data
+        self.assertEqual(stats['total_orders'], 2)
+        self.assertEqual(Decimal(stats['total_revenue']), Decimal('15.50'))
+
+        self.flour.current_stock = 5
+        self.flour.save()
+        self.assertEqual(self.client.get('/api/cafe/dashboard/stats/').data['low_stock_items'], 1)
+
+
+class InventoryFilterTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('staff', password='password123')
+        Inventory.objects.bulk_create([
+            Inventory(name='Beans', current_stock=3, minimum_stock=10),
+            Inventory(name='Cups', current_stock=10, minimum_stock=10),
+            Inventory(name='Milk', current_stock=40, minimum_stock=10),
+            Inventory(name='Syrup', current_stock=0, minimum_stock=5, is_active=False),
+        ])
+
+    def names(self, params):
+        self.client.force_authenticate(self.user)
+        response = self.client.get('/api/cafe/inventory/', params)
+        self.assertEqual(response.status_code, 200)
+        return [item['name'] for item in response.data['results']]
+
+    def test_low_stock_includes_items_at_their_minimum(self):
+        self.assertEqual(self.names({'is_low_stock': 'true'}), ['Beans', 'Cups', 'Syrup'])
+        self.assertEqual(self.names({'is_low_stock': 'false'}), ['Milk'])
+
+    def test_filters_combine(self):
+        self.assertEqual(self.names({'is_low_stock': 'true', 'is_active': 'true'}), ['Beans', 'Cups'])
+        self.assertEqual(self.names({'is_active': 'false'}), ['Syrup'])
+        self.assertEqual(len(self.names({})), 4)
+
+
+class ReservationAvailabilityTests(QueryPlanMixin, APITestCase):
+    def setUp(self):
+        self.customer = User.objects.create_user('customer', password='password123')
+        self.client.force_authenticate(self.customer)
+        self.small = Table.objects.create(number='T1', capacity=2)
+        self.large = Table.objects.create(number='T2', capacity=6)
+        self.day = date(2030, 3, 4)
+        Reservation.objects.create(customer=self.customer, table=self.small, date=self.day, time=time(9), duration=90)
+        Reservation.objects.create(
+            customer=self.customer, table=self.small, date=self.day, time=time(11), status='cancelled'
+        )
+        Reservation.objects.create(customer=self.customer, table=self.large, date=self.day, time=time(8))
+
+    def availability(self, **params):
+        response = self.client.get('/api/cafe/tables/availability/', {
+            'date': self.day.isoformat(), 'start': '08:00', 'end': '12:00', **params,
+        })
+        self.assertEqual(response.status_code, 200, response.data)
+        return {table['number']: table['slots'] for table in response.data['tables']}
+
+    def test_slots_skip_active_bookings_and_respect_party_size(self):
+        self.assertEqual(self.availability(), {
+            'T1': ['08:00', '10:30', '11:00'],
+            'T2': ['09:00', '09:30', '10:00', '10:30', '11:00'],
+        })
+        self.assertEqual(list(self.availability(party_size=4)), ['T2'])
+
+    def test_availability_reads_the_interval_index(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.availability()
+        self.assertUsesIndex(queries, 'cafe_reservation', 'reservation_interval_idx')
+
+    def book(self, table, start, duration=60, party_size=2):
+        return self.client.post('/api/cafe/reservations/', {
+            'customer': self.customer.pk, 'table': table.pk, 'date': self.day.isoformat(),
+            'time': start, 'duration': duration, 'party_size': party_size,
+        })
+
+    def test_overlapping_bookings_are_rejected(self):
+        response = self.book(self.small, '10:00')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('table', response.data)
+        # Back to back with the existing booking, and over a cancelled one
+        self.assertEqual(self.book(self.small, '10:30').status_code, 201)
+        self.assertEqual(self.book(self.small, '11:30').status_code, 201)
+
+    def test_moving_a_booking_is_checked_against_the_others(self):
+        reservation = Reservation.objects.get(table=self.large)
+        response = self.client.patch(f'/api/cafe/reservations/{reservation.pk}/', {'time': '08:30'})
+        self.assertEqual(response.status_code, 200, response.data)
+        reservation.refresh_from_db()
+        self.assertEqual(timezone.localtime(reservation.starts_at).time(), time(8, 30))
+
+        self.assertEqual(self.book(self.large, '10:00').status_code, 201)
+        response = self.client.patch(f'/api/cafe/reservations/{reservation.pk}/', {'time': '09:30'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_party_must_fit_the_table(self):
+        response = self.book(self.small, '13:00', party_size=3)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('party_size', response.data)
+
+
+class ImageVariantTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings_override = self.settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        from PIL import Image
+        photo = BytesIO()
+        Image.new('RGBA', (800, 600), (200, 40, 40, 255)).save(photo, 'PNG')
+        category = Category.objects.create(name='Bakery')
+        self.item = MenuItem.objects.create(
+            name='Croissant', category=category, price=Decimal('2.00'),
+            image=SimpleUploadedFile('croissant.png', photo.getvalue(), content_type='image/png'),
+        )
+
+    def test_serializer_offers_a_srcset_per_format(self):
+        self.client.force_authenticate(User.objects.create_user('customer'))
+        response = self.client.get(f'/api/cafe/menu-items/{self.item.pk}/')
+        self.assertEqual(response.status_code, 200)
+        srcset = response.data['image_srcset']
+        self.assertEqual(set(srcset), {'webp', 'jpeg'})
+        self.assertIn('/images/64/webp/menu_items/croissant', srcset['webp'])
+        self.assertTrue(srcset['jpeg'].endswith('1280w'))
+
+    def test_variant_is_rendered_once_and_redirected_to(self):
+        from PIL import Image
+        url = f'/images/160/jpeg/{self.item.image.name}'
+        response = self.client.get(url, {'v': version_of(self.item)})
+        self.assertEqual(response.status_code, 302)
+        self.assertIn('max-age=86400', response['Cache-Control'])
+        name = response['Location'].removeprefix('/media/')
+        self.assertRegex(name, r'^variants/[0-9a-f]{24}-160\.jpg$')
+        with default_storage.open(name) as variant:
+            self.assertEqual(Image.open(variant).size, (160, 120))
+
+        cache.clear()
+        self.assertEqual(self.client.get(url, {'v': version_of(self.item)})['Location'], response['Location'])
+        self.assertEqual(len(default_storage.listdir('variants')[1]), 1)
+
+    def test_unknown_versions_are_served_unversioned(self):
+        url = f'/images/160/jpeg/{self.item.image.name}'
+        versioned = self.client.get(url, {'v': version_of(self.item)})
+        for bogus in ('1', 'x' * 50):
+            response = self.client.get(url, {'v': bogus})
+            self.assertEqual(response['Location'], versioned['Location'])
+            self.assertIn('max-age=300', response['Cache-Control'])
+            self.assertIsNone(cache.get(f'images:variant:{self.item.image.name}:{bogus}:160:jpeg'))
+
+    def test_concurrent_first_requests_render_once(self):
+        from threading import Barrier, Thread
+
+        render_variant = images.render_variant
+        rendered, names = [], []
+        barrier = Barrier(4)
+
+        def slow_render(*args):
+            rendered.append(args[1:])
+            sleep(0.2)
+            return render_variant(*args)
+
+        def fetch():
+            barrier.wait()
+            names.append(images.get_variant(self.item.image.name, 320, 'webp')[0])
+
+        with mock.patch.object(images, 'render_variant', slow_render):
+            threads = [Thread(target=fetch) for _ in range(4)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        self.assertEqual(rendered, [(320, 'webp')])
+        self.assertEqual(len(set(names)), 1)
+        self.assertEqual(len(default_storage.listdir('variants')[1]), 1)
+
+    def test_unknown_sizes_and_sources_are_not_found(self):
+        self.assertEqual(self.client.get(f'/images/100/jpeg/{self.item.image.name}').status_code, 404)
+        self.assertEqual(self.client.get(f'/images/64/gif/{self.item.image.name}').status_code, 404)
+        self.assertEqual(self.client.get('/images/64/jpeg/qr_codes/x.png').status_code, 404)
+        self.assertEqual(self.client.get('/images/64/jpeg/menu_items/missing.png').status_code, 404)
+
+
+class MediaServingTests(APITestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings_override = self.settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        default_storage.save('menu_items/menu.txt', BytesIO(b'0123456789'))
+        default_storage.save('variants/abc-64.jpg', BytesIO(b'jpeg'))
+
+    def body(self, response):
+        return b''.join(response.streaming_content)
+
+    def test_full_and_conditional_requests(self):
+        response = self.client.get('/media/menu_items/menu.txt')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.body(response), b'0123456789')
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertIn('max-age=3600', response['Cache-Control'])
+
+        revalidated = self.client.get('/media/menu_items/menu.txt', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(revalidated.status_code, 304)
+        revalidated = self.client.get('/media/menu_items/menu.txt', HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(revalidated.status_code, 304)
+
+    def test_range_requests(self):
+        response = self.client.get('/media/menu_items/menu.txt', HTTP_RANGE='bytes=2-5')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], 'bytes 2-5/10')
+        self.assertEqual(self.body(response), b'2345')
+
+        response = self.client.get('/media/menu_items/menu.txt', HTTP_RANGE='bytes=-3')
+        self.assertEqual(self.body(response), b'789')
+        response = self.client.get('/media/menu_items/menu.txt', HTTP_RANGE='bytes=20-')
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], 'bytes */10')
+        # A stale If-Range gets the whole file
+        response = self.client.get('/media/menu_items/menu.txt', HTTP_RANGE='bytes=2-5', HTTP_IF_RANGE='"stale"')
+        self.assertEqual(response.status_code, 200)
+
+    def test_content_addressed_files_are_immutable(self):
+        response = self.client.get('/media/variants/abc-64.jpg')
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertIn('max-age=31536000', response['Cache-Control'])
+
+    def test_proxy_offload_sends_no_bytes(self):
+        with self.settings(MEDIA_SENDFILE='nginx'):
+            response = self.client.get('/media/menu_items/menu.txt')
+        self.assertEqual(response['X-Accel-Redirect'], '/protected-media/menu_items/menu.txt')
+        self.assertEqual(response.content, b'')
+        self.assertIn('ETag', response)
+
+    def test_missing_files_and_traversal_are_not_found(self):
+        self.assertEqual(self.client.get('/media/menu_items/other.txt').status_code, 404)
+        self.assertEqual(self.client.get('/media/../manage.py').status_code, 404)
+        self.assertEqual(self.client.get('/media/menu_items/').status_code, 404)
+
+
+class ExportTests(APITestCase):
+    def setUp(self):
+        self.staff = User.objects.create_user('finance', password='password123')
+        self.staff.profile.role = 'staff'
+        self.staff.profile.save()
+        self.customer = User.objects.create_user('customer', password='password123')
+        self.orders = []
+        for day in (1, 2, 3):
+            order = Order.objects.create(customer=self.customer, total_amount=Decimal('7.50'), payment_method='card')
+            Payment.objects.create(order=order, amount=Decimal('7.50'), payment_method='card', status='completed')
+            created_at = timezone.make_aware(datetime(2025, 3, day, 12))
+            Order.objects.filter(pk=order.pk).update(created_at=created_at)
+            Payment.objects.filter(order=order).update(created_at=created_at)
+            self.orders.append(order)
+
+    def download(self, url, **params):
+        self.client.force_authenticate(self.staff)
+        response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return response, b''.join(response.streaming_content).decode()
+
+    def test_orders_stream_as_csv_within_the_date_range(self):
+        with CaptureQueriesContext(connection) as queries:
+            response, body = self.download('/api/cafe/orders/export/', start='2025-03-02', end='2025-03-03')
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        self.assertIn('orders_2025-03-02_2025-03-03.csv', response['Content-Disposition'])
+        rows = list(csv.DictReader(StringIO(body)))
+        self.assertEqual([row['id'] for row in rows], [str(order.pk) for order in self.orders[1:]])
+        self.assertEqual(rows[0]['customer'], 'customer')
+        self.assertEqual(rows[0]['total_amount'], '7.50')
+        self.assertEqual(rows[0]['completed_at'], '')
+        # One projection query, no per-row lookups or prefetches
+        self.assertEqual(len([query for query in queries.captured_queries if 'cafe_order' in query['sql']]), 1)
+
+    def test_csv_escapes_text_that_spreadsheets_would_run(self):
+        self.customer.username = '=HYPERLINK("http://example.com")'
+        self.customer.save()
+        Order.objects.filter(pk=self.orders[0].pk).update(total_amount=Decimal('-7.50'))
+        _, body = self.download('/api/cafe/orders/export/')
+        rows = list(csv.DictReader(StringIO(body)))
+        self.assertEqual(rows[0]['customer'], '\'=HYPERLINK("http://example.com")')
+        self.assertEqual(rows[0]['total_amount'], '-7.50')
+        # JSON Lines is not opened by spreadsheets and keeps the raw value
+        _, body = self.download('/api/cafe/orders/export/', output='jsonl')
+        self.assertEqual(json.loads(body.splitlines()[0])['customer'], '=HYPERLINK("http://example.com")')
+
+    def test_payments_stream_as_json_lines_with_filters(self):
+        Payment.objects.filter(order=self.orders[0]).update(status='failed')
+        response, body = self.download('/api/cafe/payments/export/', output='jsonl', status='completed')
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        rows = [json.loads(line) for line in body.splitlines()]
+        self.assertEqual([row['order'] for row in rows], [str(order.pk) for order in self.orders[1:]])
+        self.assertEqual(rows[0]['amount'], '7.50')
+        self.assertEqual(rows[0]['created_at'], '2025-03-02T12:00:00Z')
+
+    def test_exports_are_staff_only_and_validate_the_range(self):
+        self.client.force_authenticate(self.customer)
+        self.assertEqual(self.client.get('/api/cafe/orders/export/').status_code, 403)
+        self.client.force_authenticate(self.staff)
+        response = self.client.get('/api/cafe/orders/export/', {'start': '2025-03-03', 'end': '2025-03-01'})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.client.get('/api/cafe/orders/export/', {'output': 'xml'}).status_code, 400)
+
+    def test_command_writes_the_same_rows(self):
+        out = StringIO()
+        call_command('export_history', 'orders', '--start', '2025-03-03', stdout=out)
+        rows = list(csv.DictReader(StringIO(out.getvalue())))
+        self.assertEqual([row['id'] for row in rows], [str(self.orders[2].pk)])
+
+
+class BenchmarkSuiteTests(APITestCase):
+    def test_seed_writes_a_manifest_and_refuses_to_double_seed(self):
+        manifest_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, manifest_dir)
+        path = f'{manifest_dir}/dataset.json'
+        sizes = ['--students', '5', '--meal-days', '2', '--customers', '3', '--orders', '20',
+                 '--menu-items', '4', '--tables', '2', '--reservations', '10', '--manifest', path]
+        call_command('seed_benchmark', *sizes, stdout=StringIO())
+
+        with open(path) as file:
+            manifest = json.load(file)
+        self.assertEqual(len(manifest['customers']), 3)
+        self.assertEqual(Order.objects.filter(customer__username__startswith='bench-').count(), 20)
+        self.assertEqual(Reservation.objects.filter(table__number__startswith='BN').count(), 10)
+        self.assertTrue(self.client.login(username=manifest['staff'], password=manifest['password']))
+        # Orders are spread over past days, not all stamped with the seeding time
+        self.assertGreater(Order.objects.dates('created_at', 'day').count(), 1)
+
+        with self.assertRaises(CommandError):
+            call_command('seed_benchmark', *sizes, stdout=StringIO())
+        call_command('seed_benchmark', *sizes, '--flush', stdout=StringIO())
+        self.assertEqual(Order.objects.count(), 20)
+
+    def test_query_count_header(self):
+        user = User.objects.create_user('customer', password='password123')
+        self.client.force_authenticate(user)
+        with self.modify_settings(MIDDLEWARE={'prepend': 'backend.middleware.QueryCountMiddleware'}):
+            response = self.client.get('/api/cafe/categories/')
+        self.assertEqual(response.status_code, 200)
+        self.assertGreater(int(response['X-Query-Count']), 0)
+        self.assertIn('X-Query-Time', response)
+
+    def test_report_percentiles_and_comparison(self):
+        self.assertEqual(report.percentile(list(range(1, 101)), 0.5), 50.5)
+        self.assertEqual(report.percentile([10.0], 0.99), 10.0)
+
+        def run(p95, rps):
+            stats = {'p50': 10.0, 'p95': p95, 'p99': p95, 'rps': rps, 'queries': 2.0}
+            return {'meta': {}, 'total': stats, 'endpoints': {'menu.snapshot': stats}}
+
+        _, regressions = report.compare(run(20.0, 100.0), run(21.0, 95.0))
+        self.assertEqual(regressions, [])
+        _, regressions = report.compare(run(20.0, 100.0), run(30.0, 50.0))
+        self.assertEqual({metric for _, metric, *_ in regressions}, {'p95', 'p99', 'rps'})
+
+    def test_orders_fit_a_menu_smaller_than_the_largest_order(self):
+        context = Context({'seed': 1, 'students': [], 'menu_items': [1]}, 'staff', ['token'])
+        session = mock.Mock()
+        for seed in range(5):
+            place_order(session, context, random.Random(seed))
+            self.assertEqual(len(session.request.call_args.kwargs['body']['order_items']), 1)
+
+    def test_failing_actions_are_reported_as_errors(self):
+        context = Context({'seed': 1, 'students': []}, 'staff', [])
+
+        def broken(session, context, rng):
+            raise KeyError('menu_items')
+
+        samples = run_load('http://127.0.0.1:9', [(1, broken)], context, concurrency=2, duration=0.05)
+        self.assertTrue(samples)
+        self.assertEqual({(sample.endpoint, sample.status) for sample in samples}, {('broken', 0)})
+        self.assertEqual(report.summarize(samples, 0.05)['errors'], len(samples))
+
+    def test_gate_scans_are_first_servings_until_all_are_used(self):
+        context = Context({'seed': 1, 'students': ['STU001', 'STU002']}, 'staff', [])
+        rng = random.Random(1)
+        scans = [context.next_scan(rng) for _ in range(6)]
+        self.assertEqual(len(set(scans)), 6)
+        self.assertEqual({meal_type for _, meal_type in scans[:2]}, {'lunch'})
+        # Only repeats are left afterwards
+        self.assertIn(context.next_scan(rng), scans)
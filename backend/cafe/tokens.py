@@ -0,0 +1,60 @@
+"""JWTs that carry the user's cafe role.
+
+Access and refresh tokens get a ``role`` claim and the ``UserProfile``
+``role_version`` it was read at (``role_version`` claim). The token is
+signed, so the claim can be trusted as long as the version still matches
+the profile; see ``cafe.authentication``. Blacklist checks go through the
+in-process filter in ``cafe.revocation``.
+"""
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, TokenError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from .revocation import revocation_filter
+
+ROLE_CLAIM = 'role'
+ROLE_VERSION_CLAIM = 'role_version'
+
+
+def stamp_role(token, profile):
+    token[ROLE_CLAIM] = profile.role
+    token[ROLE_VERSION_CLAIM] = profile.role_version
+
+
+class RoleRefreshToken(RefreshToken):
+    """Refresh token whose access tokens carry the role claims"""
+
+    @classmethod
+    def for_user(cls, user):
+        from .models import UserProfile
+
+        token = super().for_user(user)
+        try:
+            profile = user.profile
+        except UserProfile.DoesNotExist:
+            # Users created without the post_save signal (bulk_create, raw SQL) get a default profile
+            profile, _ = UserProfile.objects.get_or_create(user=user)
+            user.profile = profile
+        stamp_role(token, profile)
+        return token
+    
+    def check_blacklist(self):
+        # The in-process filter answers "not revoked" without a query
+        if revocation_filter.is_revoked(self[api_settings.JTI_CLAIM]):
+            raise TokenError('Token is blacklisted')
+    
+    def blacklist(self):
+        result = super().blacklist()
+        revocation_filter.add(self[api_settings.JTI_CLAIM])
+        return result
+
+    def restamp_role(self):
+        """Reload the role claims from the profile (the role may have changed since issue)"""
+        from .models import UserProfile
+
+        profile = UserProfile.objects.filter(
+            user_id=self[api_settings.USER_ID_CLAIM], user__is_active=True
+        ).only('role', 'role_version', 'is_active').first()
+        if profile is None or not profile.is_active:
+            raise AuthenticationFailed('User is inactive', code='user_inactive')
+        stamp_role(self, profile)
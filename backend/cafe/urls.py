@@ -15,17 +15,21 @@ router.register(r'tables', views.TableViewSet)
 router.register(r'reservations', views.ReservationViewSet)
 router.register(r'reviews', views.ReviewViewSet)
 router.register(r'inventory', views.InventoryViewSet)
+router.register(r'recipe-ingredients', views.RecipeIngredientViewSet)
 router.register(r'staff-schedules', views.StaffScheduleViewSet)
 router.register(r'notifications', views.NotificationViewSet)
+# Registered on the router so each action's permission_classes apply
+router.register(r'auth', views.AuthViewSet, basename='auth')
 
 urlpatterns = [
+    # Before the router so it is not taken for an order id
+    path('orders/stream/', views.order_stream),
+    path('notifications/stream/', views.notification_stream),
     path('', include(router.urls)),
     path('auth/', include([
-        path('register/', views.AuthViewSet.as_view({'post': 'register'})),
-        path('login/', views.AuthViewSet.as_view({'post': 'login'})),
-        path('logout/', views.AuthViewSet.as_view({'post': 'logout'})),
         path('token/refresh/', TokenRefreshView.as_view()),
     ])),
+    path('menu/', views.MenuSnapshotView.as_view()),
     path('dashboard/stats/', views.DashboardStatsView.as_view()),
     path('reports/sales/', views.SalesReportView.as_view()),
 ]
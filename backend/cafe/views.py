@@ -2,17 +2,28 @@ from rest_framework import viewsets, status, permissions
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.views import APIView
-from rest_framework_simplejwt.tokens import RefreshToken
-from django.contrib.auth.models import User
-from django.db.models import Q, Sum, Count, Avg
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import User, update_last_login
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Q, Sum, Count, Avg, Prefetch
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
 from django.utils import timezone
 from datetime import datetime, timedelta
+from decimal import Decimal
 from django_filters.rest_framework import DjangoFilterBackend
+from backend.exports import export_response
+from backend.pagination import KeysetPagination
 from rest_framework.filters import SearchFilter, OrderingFilter
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.renderers import JSONRenderer
 
 from .models import (
     UserProfile, Category, MenuItem, Order, OrderItem, Payment, 
-    Table, Reservation, Review, Inventory, StaffSchedule, Notification
+    Table, Reservation, Review, Inventory, StaffSchedule, Notification,
+    DailySalesRollup, RecipeIngredient
 )
 from .serializers import (
     UserSerializer, UserProfileSerializer, UserRegistrationSerializer,
@@ -20,9 +31,19 @@ from .serializers import (
     OrderCreateSerializer, OrderItemSerializer, PaymentSerializer,
     TableSerializer, ReservationSerializer, ReviewSerializer,
     InventorySerializer, StaffScheduleSerializer, NotificationSerializer,
-    DashboardStatsSerializer
+    DashboardStatsSerializer, MenuCategorySerializer, NotificationBroadcastSerializer,
+    RecipeIngredientSerializer, TableAvailabilityQuerySerializer
+)
+from .tokens import RoleRefreshToken
+from .authentication import authenticate_access_token
+from .availability import table_availability
+from .exports import ORDER_EXPORT, PAYMENT_EXPORT
+from .events import ORDERS_CHANNEL, encode_event, event_stream, get_broker, role_channel, user_channel
+from .permissions import IsAdmin, IsStaff, IsOwnerOrReadOnly, IsAdminOrReadOnly, IsStaffOrReadOnly
+from .filters import InventoryFilter
+from .cache import (
+    DASHBOARD_STATS_KEY, adjust_unread_count, get_menu_version, get_unread_count, reset_unread_count
 )
-from .permissions import IsOwnerOrReadOnly, IsAdminOrReadOnly, IsStaffOrReadOnly
 
 
 class UserViewSet(viewsets.ModelViewSet):
@@ -38,7 +59,7 @@ class UserViewSet(viewsets.ModelViewSet):
 
 class UserProfileViewSet(viewsets.ModelViewSet):
     """User profile management"""
-    queryset = UserProfile.objects.all()
+    queryset = UserProfile.objects.select_related('user')
     serializer_class = UserProfileSerializer
     permission_classes = [permissions.IsAuthenticated, IsOwnerOrReadOnly]
     filter_backends = [DjangoFilterBackend, SearchFilter, OrderingFilter]
@@ -57,7 +78,7 @@ class AuthViewSet(viewsets.ViewSet):
         serializer = UserRegistrationSerializer(data=request.data)
         if serializer.is_valid():
             user = serializer.save()
-            refresh = RefreshToken.for_user(user)
+            refresh = RoleRefreshToken.for_user(user)
             return Response({
                 'user': UserSerializer(user).data,
                 'tokens': {
@@ -73,7 +94,9 @@ class AuthViewSet(viewsets.ViewSet):
         serializer = LoginSerializer(data=request.data)
         if serializer.is_valid():
             user = serializer.validated_data['user']
-            refresh = RefreshToken.for_user(user)
+            # A single "UPDATE ... SET last_login"; the profile is not rewritten
+            update_last_login(None, user)
+            refresh = RoleRefreshToken.for_user(user)
             profile_data = None
             try:
                 profile_data = UserProfileSerializer(user.profile).data
@@ -95,7 +118,7 @@ class AuthViewSet(viewsets.ViewSet):
         """User logout"""
         try:
             refresh_token = request.data["refresh"]
-            token = RefreshToken(refresh_token)
+            token = RoleRefreshToken(refresh_token)
             token.blacklist()
             return Response({"message": "Logout successful"}, status=status.HTTP_200_OK)
         except Exception as e:
@@ -104,7 +127,9 @@ class AuthViewSet(viewsets.ViewSet):
 
 class CategoryViewSet(viewsets.ModelViewSet):
     """Category management"""
-    queryset = Category.objects.all()
+    queryset = Category.objects.annotate(
+        active_menu_items_count=Count('menu_items', filter=Q(menu_items__is_active=True))
+    )
     serializer_class = CategorySerializer
     permission_classes = [permissions.IsAuthenticated, IsAdminOrReadOnly]
     filter_backends = [DjangoFilterBackend, SearchFilter, OrderingFilter]
@@ -116,7 +141,7 @@ class CategoryViewSet(viewsets.ModelViewSet):
 
 class MenuItemViewSet(viewsets.ModelViewSet):
     """Menu item management"""
-    queryset = MenuItem.objects.all()
+    queryset = MenuItem.objects.select_related('category')
     serializer_class = MenuItemSerializer
     permission_classes = [permissions.IsAuthenticated, IsStaffOrReadOnly]
     filter_backends = [DjangoFilterBackend, SearchFilter, OrderingFilter]
@@ -138,15 +163,60 @@ class MenuItemViewSet(viewsets.ModelViewSet):
         return queryset
 
 
+class MenuSnapshotView(APIView):
+    """Public menu grouped by category, versioned for ETag revalidation.
+
+    Rendered JSON is kept per menu version in this process and in the shared
+    cache, so repeat loads cost a cache lookup (or a 304) instead of queries.
+    """
+    authentication_classes = []
+    permission_classes = [permissions.AllowAny]
+    
+    _local_snapshot = (None, None)
+    
+    def get(self, request):
+        version = get_menu_version()
+        etag = f'"menu-{version}"'
+        # Handles ETag lists and weak tags (compressing proxies send W/"..." back); None unless 304/412
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            response = HttpResponse(self.get_snapshot(request, version), content_type='application/json')
+        response['ETag'] = etag
+        patch_cache_control(response, public=True, max_age=0, must_revalidate=True)
+        return response
+    
+    def get_snapshot(self, request, version):
+        # Image URLs are absolute, so the rendered body depends on the host
+        key = f'cafe:menu-snapshot:{version}:{request.get_host()}'
+        cached_key, body = MenuSnapshotView._local_snapshot
+        if cached_key == key:
+            return body
+        
+        body = cache.get(key)
+        if body is None:
+            categories = Category.objects.filter(is_active=True).prefetch_related(Prefetch(
+                'menu_items',
+                queryset=MenuItem.objects.filter(is_active=True, availability='available').order_by('name'),
+                to_attr='active_items',
+            ))
+            data = MenuCategorySerializer(categories, many=True, context={'request': request}).data
+            body = JSONRenderer().render({'version': version, 'categories': data})
+            cache.set(key, body, 24 * 60 * 60)
+        MenuSnapshotView._local_snapshot = (key, body)
+        return body
+
+
 class OrderViewSet(viewsets.ModelViewSet):
     """Order management"""
-    queryset = Order.objects.all()
+    queryset = Order.objects.select_related('customer').prefetch_related('order_items__menu_item')
     permission_classes = [permissions.IsAuthenticated]
     filter_backends = [DjangoFilterBackend, SearchFilter, OrderingFilter]
     filterset_fields = ['status', 'payment_status', 'payment_method']
     search_fields = ['customer__username', 'customer__first_name', 'customer__last_name']
     ordering_fields = ['created_at', 'total_amount', 'status']
     ordering = ['-created_at']
+    pagination_class = KeysetPagination
+    cursor_ordering = ('-created_at', '-id')
     
     def get_serializer_class(self):
         if self.action == 'create':
@@ -157,64 +227,136 @@ class OrderViewSet(viewsets.ModelViewSet):
         queryset = super().get_queryset()
         # Customers can only see their own orders
         if not self.request.user.profile.is_staff_member:
-            queryset = queryset.filter(customer=self.request.user)
+            queryset = queryset.filter(customer_id=self.request.user.id)
         return queryset
     
     def perform_create(self, serializer):
         serializer.save(customer=self.request.user)
 
+    @action(detail=False, permission_classes=[IsStaff])
+    def export(self, request):
+        """Stream matching orders as CSV or JSON Lines (``?output=``, ``start``/``end`` dates)"""
+        return export_response(request, ORDER_EXPORT, self.filter_queryset(self.get_queryset()))
+
+
+ACTIVE_ORDER_STATUSES = ['pending', 'confirmed', 'preparing', 'ready']
+
+
+def active_orders_snapshot():
+    orders = Order.objects.filter(status__in=ACTIVE_ORDER_STATUSES).select_related(
+        'customer'
+    ).prefetch_related('order_items__menu_item').order_by('created_at')
+    return encode_event('snapshot', OrderSerializer(orders, many=True).data)
+
+
+async def stream_user(request):
+    """Authenticate a stream request; returns ``(user, None)`` or ``(None, error response)``.
+
+    EventSource cannot set headers, so the access token may be passed as ``?token=``.
+    """
+    raw_token = request.GET.get('token')
+    if not raw_token:
+        header = request.headers.get('Authorization', '')
+        raw_token = header[7:] if header.startswith('Bearer ') else ''
+    try:
+        user = await sync_to_async(authenticate_access_token)(raw_token)
+    except AuthenticationFailed as exc:
+        detail = exc.detail if isinstance(exc.detail, dict) else {'detail': exc.detail}
+        return None, JsonResponse(detail, status=status.HTTP_401_UNAUTHORIZED)
+    return user, None
+
+
+def event_stream_response(subscription, snapshot):
+    response = StreamingHttpResponse(event_stream(subscription, snapshot), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+async def order_stream(request):
+    """Live kitchen queue (server-sent events, staff only).
+
+    Sends a ``snapshot`` of active orders, then ``order.created`` and
+    ``order.status`` events as they happen.
+    """
+    user, error = await stream_user(request)
+    if error:
+        return error
+    if not user.profile.is_staff_member:
+        return JsonResponse(
+            {'detail': 'You do not have permission to perform this action.'}, status=status.HTTP_403_FORBIDDEN
+        )
+
+    # Subscribe before taking the snapshot so no change falls between the two
+    subscription = await get_broker().subscribe(ORDERS_CHANNEL)
+    try:
+        snapshot = await sync_to_async(active_orders_snapshot)()
+    except Exception:
+        subscription.close()
+        raise
+    return event_stream_response(subscription, snapshot)
+
 
 class DashboardStatsView(APIView):
     """Dashboard statistics"""
     permission_classes = [permissions.IsAuthenticated, IsStaffOrReadOnly]
     
     def get(self, request):
-        today = timezone.now().date()
-        
-        # Basic stats
-        total_orders = Order.objects.count()
-        total_revenue = Order.objects.aggregate(
-            total=Sum('total_amount')
-        )['total'] or 0
-        total_customers = User.objects.filter(profile__role='customer').count()
-        total_menu_items = MenuItem.objects.filter(is_active=True).count()
-        
-        # Today's stats
-        today_orders = Order.objects.filter(created_at__date=today).count()
-        today_revenue = Order.objects.filter(created_at__date=today).aggregate(
-            total=Sum('total_amount')
-        )['total'] or 0
-        
-        # Pending orders
-        pending_orders = Order.objects.filter(status__in=['pending', 'confirmed', 'preparing']).count()
-        
-        # Low stock items
-        low_stock_items = Inventory.objects.filter(is_low_stock=True).count()
-        
-        stats = {
-            'total_orders': total_orders,
-            'total_revenue': total_revenue,
-            'total_customers': total_customers,
-            'total_menu_items': total_menu_items,
-            'pending_orders': pending_orders,
-            'low_stock_items': low_stock_items,
-            'today_revenue': today_revenue,
-            'today_orders': today_orders,
-        }
+        stats = cache.get(DASHBOARD_STATS_KEY)
+        if stats is None:
+            stats = DashboardStatsSerializer(self.compute_stats()).data
+            cache.set(DASHBOARD_STATS_KEY, stats, settings.DASHBOARD_STATS_CACHE_TTL)
+        return Response(stats)
+    
+    @staticmethod
+    def compute_stats():
+        # A range on created_at (not created_at__date) keeps the index usable
+        today_start = timezone.localtime().replace(hour=0, minute=0, second=0, microsecond=0)
+        today = Q(created_at__gte=today_start)
+        active = Q(status__in=['pending', 'confirmed', 'preparing'])
         
-        serializer = DashboardStatsSerializer(stats)
-        return Response(serializer.data)
+        # Order stats in one pass
+        stats = Order.objects.aggregate(
+            total_orders=Count('id'),
+            total_revenue=Sum('total_amount', default=0),
+            today_orders=Count('id', filter=today),
+            today_revenue=Sum('total_amount', filter=today, default=0),
+            pending_orders=Count('id', filter=active),
+        )
+        stats['total_customers'] = UserProfile.objects.filter(role='customer').count()
+        stats['total_menu_items'] = MenuItem.objects.filter(is_active=True).count()
+        stats['low_stock_items'] = Inventory.objects.low_stock().count()
+        return stats
 
 
 class OrderItemViewSet(viewsets.ModelViewSet):
     """Order item management"""
-    queryset = OrderItem.objects.all()
+    queryset = OrderItem.objects.select_related('menu_item')
     serializer_class = OrderItemSerializer
     permission_classes = [permissions.IsAuthenticated, IsStaffOrReadOnly]
     filter_backends = [DjangoFilterBackend, OrderingFilter]
     filterset_fields = ['order', 'menu_item']
-    ordering_fields = ['created_at']
-    ordering = ['-created_at']
+    ordering_fields = ['order__created_at']
+    ordering = ['-order__created_at']
+    
+    # Order totals are no longer derived on Order.save, so keep them in step with item edits
+    def perform_create(self, serializer):
+        with transaction.atomic():
+            item = serializer.save()
+            item.order.recalculate_totals()
+    
+    def perform_update(self, serializer):
+        previous_order_id = serializer.instance.order_id
+        with transaction.atomic():
+            item = serializer.save()
+            item.order.recalculate_totals()
+            if item.order_id != previous_order_id:
+                Order(pk=previous_order_id).recalculate_totals()
+    
+    def perform_destroy(self, instance):
+        with transaction.atomic():
+            instance.delete()
+            instance.order.recalculate_totals()
 
 
 class PaymentViewSet(viewsets.ModelViewSet):
@@ -226,6 +368,13 @@ class PaymentViewSet(viewsets.ModelViewSet):
     filterset_fields = ['status', 'payment_method']
     ordering_fields = ['created_at', 'amount']
     ordering = ['-created_at']
+    pagination_class = KeysetPagination
+    cursor_ordering = ('-created_at', '-id')
+
+    @action(detail=False, permission_classes=[IsStaff])
+    def export(self, request):
+        """Stream matching payments as CSV or JSON Lines (``?output=``, ``start``/``end`` dates)"""
+        return export_response(request, PAYMENT_EXPORT, self.filter_queryset(self.get_queryset()))
 
 
 class TableViewSet(viewsets.ModelViewSet):
@@ -237,11 +386,37 @@ class TableViewSet(viewsets.ModelViewSet):
     filterset_fields = ['status', 'is_active']
     ordering_fields = ['number', 'capacity']
     ordering = ['number']
+    
+    @action(detail=False)
+    def availability(self, request):
+        """Free tables for a party and their bookable start times on a day"""
+        query = TableAvailabilityQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        params = query.validated_data
+        availability = table_availability(
+            params['date'], params['start'], params['end'],
+            params['party_size'], params['duration'], params['step'],
+        )
+        return Response({
+            'date': params['date'],
+            'party_size': params['party_size'],
+            'duration': params['duration'],
+            'tables': [
+                {
+                    'id': table.id,
+                    'number': table.number,
+                    'capacity': table.capacity,
+                    'location': table.location,
+                    'slots': [timezone.localtime(slot).strftime('%H:%M') for slot in slots],
+                }
+                for table, slots in availability
+            ],
+        })
 
 
 class ReservationViewSet(viewsets.ModelViewSet):
     """Reservation management"""
-    queryset = Reservation.objects.all()
+    queryset = Reservation.objects.select_related('customer', 'table')
     serializer_class = ReservationSerializer
     permission_classes = [permissions.IsAuthenticated]
     filter_backends = [DjangoFilterBackend, OrderingFilter]
@@ -253,7 +428,7 @@ class ReservationViewSet(viewsets.ModelViewSet):
         queryset = super().get_queryset()
         # Customers can only see their own reservations
         if not self.request.user.profile.is_staff_member:
-            queryset = queryset.filter(customer=self.request.user)
+            queryset = queryset.filter(customer_id=self.request.user.id)
         return queryset
     
     def perform_create(self, serializer):
@@ -262,7 +437,7 @@ class ReservationViewSet(viewsets.ModelViewSet):
 
 class ReviewViewSet(viewsets.ModelViewSet):
     """Review management"""
-    queryset = Review.objects.all()
+    queryset = Review.objects.select_related('customer', 'menu_item')
     serializer_class = ReviewSerializer
     permission_classes = [permissions.IsAuthenticated, IsOwnerOrReadOnly]
     filter_backends = [DjangoFilterBackend, OrderingFilter]
@@ -274,7 +449,7 @@ class ReviewViewSet(viewsets.ModelViewSet):
         queryset = super().get_queryset()
         # Customers can only see their own reviews
         if not self.request.user.profile.is_staff_member:
-            queryset = queryset.filter(customer=self.request.user)
+            queryset = queryset.filter(customer_id=self.request.user.id)
         return queryset
     
     def perform_create(self, serializer):
@@ -287,15 +462,24 @@ class InventoryViewSet(viewsets.ModelViewSet):
     serializer_class = InventorySerializer
     permission_classes = [permissions.IsAuthenticated, IsStaffOrReadOnly]
     filter_backends = [DjangoFilterBackend, SearchFilter, OrderingFilter]
-    filterset_fields = ['is_active', 'is_low_stock']
+    filterset_class = InventoryFilter
     search_fields = ['name', 'description', 'supplier']
     ordering_fields = ['name', 'current_stock', 'created_at']
     ordering = ['name']
 
 
+class RecipeIngredientViewSet(viewsets.ModelViewSet):
+    """Menu item recipes (bill of materials)"""
+    queryset = RecipeIngredient.objects.select_related('inventory')
+    serializer_class = RecipeIngredientSerializer
+    permission_classes = [permissions.IsAuthenticated, IsStaffOrReadOnly]
+    filter_backends = [DjangoFilterBackend]
+    filterset_fields = ['menu_item', 'inventory']
+
+
 class StaffScheduleViewSet(viewsets.ModelViewSet):
     """Staff schedule management"""
-    queryset = StaffSchedule.objects.all()
+    queryset = StaffSchedule.objects.select_related('staff')
     serializer_class = StaffScheduleSerializer
     permission_classes = [permissions.IsAuthenticated, IsStaffOrReadOnly]
     filter_backends = [DjangoFilterBackend, OrderingFilter]
@@ -313,23 +497,61 @@ class NotificationViewSet(viewsets.ModelViewSet):
     filterset_fields = ['type', 'is_read']
     ordering_fields = ['created_at']
     ordering = ['-created_at']
+    pagination_class = KeysetPagination
+    cursor_ordering = ('-created_at', '-id')
+    lookup_value_regex = '[0-9]+'
     
     def get_queryset(self):
-        return Notification.objects.filter(user=self.request.user)
+        return Notification.objects.filter(user_id=self.request.user.id)
+    
+    @action(detail=False)
+    def unread_count(self, request):
+        """Number of unread notifications (cached per user)"""
+        return Response({'unread_count': get_unread_count(request.user.id)})
     
     @action(detail=True, methods=['post'])
     def mark_read(self, request, pk=None):
         """Mark notification as read"""
-        notification = self.get_object()
-        notification.is_read = True
-        notification.save()
+        if self.get_queryset().filter(pk=pk, is_read=False).update(is_read=True):
+            adjust_unread_count(request.user.id, -1)
+        else:
+            # Already read, or not this user's notification (404)
+            self.get_object()
         return Response({'status': 'Notification marked as read'})
     
     @action(detail=False, methods=['post'])
     def mark_all_read(self, request):
         """Mark all notifications as read"""
-        Notification.objects.filter(user=request.user, is_read=False).update(is_read=True)
+        Notification.objects.filter(user_id=request.user.id, is_read=False).update(is_read=True)
+        reset_unread_count(request.user.id)
         return Response({'status': 'All notifications marked as read'})
+    
+    @action(detail=False, methods=['post'], permission_classes=[permissions.IsAuthenticated, IsAdmin],
+            serializer_class=NotificationBroadcastSerializer)
+    def broadcast(self, request):
+        """Send the same notification to many users (admin only)"""
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+
+async def notification_stream(request):
+    """The user's notifications as server-sent events.
+
+    Sends the ``unread`` count first, then ``notification.created`` and
+    ``notification.broadcast`` events as they happen.
+    """
+    user, error = await stream_user(request)
+    if error:
+        return error
+    subscription = await get_broker().subscribe(user_channel(user.id), role_channel(user.profile.role))
+    try:
+        unread = await sync_to_async(get_unread_count)(user.id)
+    except Exception:
+        subscription.close()
+        raise
+    return event_stream_response(subscription, encode_event('unread', {'unread_count': unread}))
 
 
 class SalesReportView(APIView):
@@ -349,37 +571,33 @@ class SalesReportView(APIView):
         else:
             start_date = end_date - timedelta(days=7)
         
-        # Sales data
-        orders = Order.objects.filter(
-            created_at__date__range=[start_date, end_date],
-            status='completed'
-        )
+        # Sales data comes from the precomputed rollups: one range scan per table
+        daily = {
+            rollup.date: rollup
+            for rollup in DailySalesRollup.objects.filter(date__range=[start_date, end_date])
+        }
         
         daily_sales = []
         for i in range((end_date - start_date).days + 1):
             date = start_date + timedelta(days=i)
-            day_orders = orders.filter(created_at__date=date)
-            daily_revenue = day_orders.aggregate(total=Sum('total_amount'))['total'] or 0
-            daily_orders = day_orders.count()
-            
+            rollup = daily.get(date)
             daily_sales.append({
                 'date': date.isoformat(),
-                'revenue': float(daily_revenue),
-                'orders': daily_orders
+                'revenue': rollup.revenue if rollup else Decimal('0'),
+                'orders': rollup.orders if rollup else 0
             })
         
         # Category sales
-        category_sales = []
-        for category in Category.objects.all():
-            category_orders = orders.filter(order_items__menu_item__category=category)
-            category_revenue = category_orders.aggregate(total=Sum('total_amount'))['total'] or 0
-            category_orders_count = category_orders.count()
-            
-            category_sales.append({
-                'category': category.name,
-                'revenue': float(category_revenue),
-                'orders': category_orders_count
-            })
+        in_period = Q(sales_rollups__date__range=[start_date, end_date])
+        categories = Category.objects.annotate(
+            revenue=Sum('sales_rollups__revenue', filter=in_period),
+            orders=Sum('sales_rollups__orders', filter=in_period),
+        )
+        category_sales = [{
+            'category': category.name,
+            'revenue': category.revenue or Decimal('0'),
+            'orders': category.orders or 0
+        } for category in categories]
         
         return Response({
             'period': period,
@@ -387,6 +605,6 @@ class SalesReportView(APIView):
             'end_date': end_date.isoformat(),
             'daily_sales': daily_sales,
             'category_sales': category_sales,
-            'total_revenue': float(orders.aggregate(total=Sum('total_amount'))['total'] or 0),
-            'total_orders': orders.count()
-        })
\ No newline at end of file
+            'total_revenue': sum(day['revenue'] for day in daily_sales),
+            'total_orders': sum(day['orders'] for day in daily_sales)
+        })
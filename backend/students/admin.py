@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Student, MealLog
+from .models import Student, MealLog, DuplicateMealLog
 
 
 # Custom Admin for Student model
@@ -59,3 +59,17 @@ class MealLogAdmin(admin.ModelAdmin):
             return obj.description[:50] + '...' if len(obj.description) > 50 else obj.description
         return "-"
     description_short.short_description = 'Description'
+
+
+# Repeat servings moved aside by migration 0005, for audit only
+@admin.register(DuplicateMealLog)
+class DuplicateMealLogAdmin(admin.ModelAdmin):
+    list_display = ('log_id', 'student', 'meal_type', 'service_date', 'timestamp', 'archived_at')
+    list_filter = ('meal_type', 'service_date')
+    readonly_fields = [field.name for field in DuplicateMealLog._meta.get_fields()]
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
@@ -0,0 +1,12 @@
+from backend.exports import Export
+from .models import MealLog
+
+MEAL_LOG_EXPORT = Export('meal_logs', MealLog, [
+    ('log_id', 'log_id'),
+    ('timestamp', 'timestamp'),
+    ('service_date', 'service_date'),
+    ('meal_type', 'meal_type'),
+    ('student_id', 'student__student_id'),
+    ('student_name', 'student__name'),
+    ('department', 'student__department'),
+], date_field='timestamp')
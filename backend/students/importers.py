@@ -0,0 +1,96 @@
+"""Streaming bulk import of registrar exports (CSV or JSON Lines).
+
+Rows are read one at a time, validated a chunk at a time and upserted on
+``student_id`` with a single ``INSERT ... ON CONFLICT`` per chunk, so memory
+use is bounded by the chunk size rather than the file size. QR codes are not
+rendered here; imported students are left ``pending`` for the QR workers.
+"""
+import csv
+import json
+
+from rest_framework import serializers
+
+from .models import Student
+from .serializers import StudentImportSerializer
+
+IMPORT_FIELDS = ['student_id', 'name', 'email', 'phone', 'department', 'year']
+DEFAULT_CHUNK_SIZE = 1000
+MAX_REPORTED_ERRORS = 100
+
+
+def format_for(filename):
+    """Guess the import format from a file name"""
+    return 'jsonl' if filename.lower().endswith(('.jsonl', '.ndjson', '.json')) else 'csv'
+
+
+def iter_records(lines, fmt):
+    """Yield ``(line_number, record, error)`` for each row in an iterable of text lines"""
+    if fmt == 'csv':
+        reader = csv.DictReader(lines)
+        for row in reader:
+            yield reader.line_num, {field: (row.get(field) or '').strip() for field in IMPORT_FIELDS}, None
+        return
+
+    for line_number, line in enumerate(lines, start=1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as exc:
+            yield line_number, None, f'Invalid JSON: {exc}'
+            continue
+        if not isinstance(record, dict):
+            yield line_number, None, 'Expected a JSON object'
+            continue
+        yield line_number, {field: record.get(field) for field in IMPORT_FIELDS}, None
+
+
+def import_students(lines, fmt='csv', chunk_size=DEFAULT_CHUNK_SIZE, progress=None):
+    """Validate and upsert students from ``lines``; return a summary dict.
+
+    ``progress`` is called as ``progress(summary)`` after every chunk.
+    """
+    summary = {'processed': 0, 'imported': 0, 'failed': 0, 'errors': []}
+    validator = StudentImportSerializer()
+    chunk = []
+
+    def record_error(line_number, errors):
+        summary['failed'] += 1
+        if len(summary['errors']) < MAX_REPORTED_ERRORS:
+            summary['errors'].append({'line': line_number, 'errors': errors})
+
+    def flush():
+        # Last occurrence wins when the same student_id appears twice in a chunk
+        students = {}
+        for line_number, record in chunk:
+            try:
+                data = validator.run_validation(record)
+            except serializers.ValidationError as exc:
+                record_error(line_number, {
+                    field: [str(message) for message in messages] for field, messages in exc.detail.items()
+                })
+                continue
+            students[data['student_id']] = Student(qr_status=Student.QR_PENDING, **data)
+        Student.objects.bulk_create(
+            list(students.values()),
+            update_conflicts=True,
+            unique_fields=['student_id'],
+            update_fields=IMPORT_FIELDS[1:] + ['qr_status', 'updated_at'],
+        )
+        summary['imported'] += len(students)
+        summary['processed'] += len(chunk)
+        chunk.clear()
+        if progress:
+            progress(summary)
+
+    for line_number, record, error in iter_records(lines, fmt):
+        if error:
+            summary['processed'] += 1
+            record_error(line_number, [error])
+            continue
+        chunk.append((line_number, record))
+        if len(chunk) >= chunk_size:
+            flush()
+    if chunk:
+        flush()
+    return summary
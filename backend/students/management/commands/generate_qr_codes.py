@@ -0,0 +1,73 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+from students.models import Student
+from students.qr import payload_digest, render_qr_png, rendered_qr_name, store_qr_png
+
+
+class Command(BaseCommand):
+    help = 'Render missing or stale student QR codes in parallel'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                            help='Number of rendering processes')
+        parser.add_argument('--batch-size', type=int, default=200,
+                            help='Students rendered and saved per batch')
+        parser.add_argument('--force', action='store_true',
+                            help='Re-render every student, even if the payload is unchanged')
+
+    def handle(self, *args, **options):
+        students = Student.objects.only(
+            'id', 'student_id', 'name', 'department', 'qr_code', 'qr_status', 'qr_payload_hash'
+        ).order_by('pk')
+        if not options['force']:
+            students = students.filter(
+                Q(qr_code='') | Q(qr_code__isnull=True) | ~Q(qr_status=Student.QR_READY)
+            )
+
+        total = students.count()
+        self.stdout.write(f'{total} students need QR codes')
+        done = rendered = 0
+
+        with ProcessPoolExecutor(max_workers=options['workers']) as pool:
+            batch = []
+            for student in students.iterator(chunk_size=options['batch_size']):
+                batch.append(student)
+                if len(batch) >= options['batch_size']:
+                    rendered += self.process_batch(pool, batch, options['force'])
+                    done += len(batch)
+                    self.stdout.write(f'  {done}/{total}')
+                    batch = []
+            if batch:
+                rendered += self.process_batch(pool, batch, options['force'])
+                done += len(batch)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Processed {done} students, rendered {rendered}, {done - rendered} already up to date'
+        ))
+
+    def process_batch(self, pool, batch, force):
+        digests = [payload_digest(student.qr_payload) for student in batch]
+        stale = []
+        for student, digest in zip(batch, digests):
+            if not force and student.qr_code and student.qr_payload_hash == digest:
+                continue
+            existing = None if force else rendered_qr_name(student, digest)
+            if existing:
+                student.qr_code.name = existing
+            else:
+                stale.append((student, digest))
+
+        # Only the pure payload -> PNG step crosses the process boundary
+        pngs = pool.map(render_qr_png, [student.qr_payload for student, _ in stale])
+        for (student, digest), png in zip(stale, pngs):
+            store_qr_png(student, png, digest)
+
+        for student, digest in zip(batch, digests):
+            student.qr_payload_hash = digest
+            student.qr_status = Student.QR_READY
+        Student.objects.bulk_update(batch, ['qr_code', 'qr_payload_hash', 'qr_status'])
+        return len(stale)
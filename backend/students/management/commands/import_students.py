@@ -0,0 +1,48 @@
+import sys
+from contextlib import nullcontext
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+
+from students.importers import DEFAULT_CHUNK_SIZE, format_for, import_students
+
+
+class Command(BaseCommand):
+    help = 'Stream students from a registrar CSV or JSON Lines export and upsert them on student_id'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="Path to the export, or '-' for stdin")
+        parser.add_argument('--format', dest='fmt', choices=['csv', 'jsonl'],
+                            help='Input format (default: guessed from the file extension)')
+        parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE,
+                            help='Rows validated and upserted per statement')
+        parser.add_argument('--render-qr', action='store_true',
+                            help='Run generate_qr_codes for the imported students afterwards')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['fmt'] or format_for(path)
+
+        def progress(summary):
+            self.stdout.write(
+                f"  {summary['processed']} rows read, {summary['imported']} upserted, {summary['failed']} failed"
+            )
+
+        try:
+            # Only a file opened here is closed here; stdin stays open for the caller
+            stream = nullcontext(sys.stdin) if path == '-' else open(path, newline='', encoding='utf-8-sig')
+        except OSError as exc:
+            raise CommandError(exc)
+        with stream as lines:
+            summary = import_students(lines, fmt, options['chunk_size'], progress)
+
+        for error in summary['errors']:
+            self.stderr.write(f"  line {error['line']}: {error['errors']}")
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {summary['imported']} students from {summary['processed']} rows ({summary['failed']} failed)"
+        ))
+
+        if options['render_qr']:
+            call_command('generate_qr_codes', stdout=self.stdout, stderr=self.stderr)
+        else:
+            self.stdout.write('QR codes are pending; run generate_qr_codes to render them')
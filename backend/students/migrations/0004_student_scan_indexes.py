@@ -0,0 +1,22 @@
+# Generated by Django 5.2.6 on 2026-10-17 19:03
+
+import django.db.models.functions.text
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('students', '0003_student_date_registered_student_qr_code_and_more'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='student',
+            index=models.Index(django.db.models.functions.text.Upper('student_id'), name='student_id_upper_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='student',
+            index=models.Index(fields=['student_id'], name='student_id_prefix_idx', opclasses=['varchar_pattern_ops']),
+        ),
+    ]
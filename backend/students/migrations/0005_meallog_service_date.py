@@ -0,0 +1,81 @@
+# Generated by Django 5.2.6 on 2026-10-17 19:20
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count
+from django.db.models.functions import TruncDate
+
+ARCHIVED_FIELDS = ['log_id', 'student_id', 'meal_type', 'timestamp', 'service_date', 'description']
+
+
+def populate_service_date(apps, schema_editor):
+    MealLog = apps.get_model('students', 'MealLog')
+    DuplicateMealLog = apps.get_model('students', 'DuplicateMealLog')
+    # Local service day of every scan in one UPDATE
+    MealLog.objects.update(service_date=TruncDate('timestamp'))
+
+    # Repeat servings from before the guard cannot satisfy the new constraint.
+    # The first scan of each (student, meal, day) stays; the others move to
+    # DuplicateMealLog instead of being deleted.
+    groups = MealLog.objects.values('student_id', 'meal_type', 'service_date').annotate(
+        servings=Count('log_id')
+    ).filter(servings__gt=1).order_by()
+    repeats = []
+    for group in groups.iterator():
+        rows = MealLog.objects.filter(
+            student_id=group['student_id'], meal_type=group['meal_type'], service_date=group['service_date']
+        ).order_by('timestamp', 'log_id').values(*ARCHIVED_FIELDS)
+        repeats.extend(rows[1:])
+    if not repeats:
+        return
+    DuplicateMealLog.objects.bulk_create([DuplicateMealLog(**row) for row in repeats], batch_size=1000)
+    MealLog.objects.filter(log_id__in=[row['log_id'] for row in repeats]).delete()
+
+
+def restore_duplicates(apps, schema_editor):
+    MealLog = apps.get_model('students', 'MealLog')
+    DuplicateMealLog = apps.get_model('students', 'DuplicateMealLog')
+    archived = list(DuplicateMealLog.objects.values(*ARCHIVED_FIELDS))
+    logs = MealLog.objects.bulk_create([MealLog(**row) for row in archived], batch_size=1000)
+    # timestamp is auto_now_add and was stamped on insert; put the archived scan times back
+    for log, row in zip(logs, archived):
+        log.timestamp = row['timestamp']
+    MealLog.objects.bulk_update(logs, ['timestamp'], batch_size=1000)
+    DuplicateMealLog.objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('students', '0004_student_scan_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='meallog',
+            name='service_date',
+            field=models.DateField(editable=False, null=True),
+        ),
+        migrations.CreateModel(
+            name='DuplicateMealLog',
+            fields=[
+                ('log_id', models.IntegerField(primary_key=True, serialize=False)),
+                ('meal_type', models.CharField(choices=[('breakfast', 'Breakfast'), ('lunch', 'Lunch'), ('dinner', 'Dinner')], max_length=20)),
+                ('timestamp', models.DateTimeField()),
+                ('service_date', models.DateField()),
+                ('description', models.TextField(blank=True, null=True)),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+                ('student', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='students.student')),
+            ],
+        ),
+        migrations.RunPython(populate_service_date, restore_duplicates),
+        migrations.AlterField(
+            model_name='meallog',
+            name='service_date',
+            field=models.DateField(editable=False),
+        ),
+        migrations.AddConstraint(
+            model_name='meallog',
+            constraint=models.UniqueConstraint(fields=('student', 'meal_type', 'service_date'), name='unique_meal_per_service'),
+        ),
+    ]
@@ -0,0 +1,54 @@
+# Generated by Django 5.2.6 on 2026-10-17 19:06
+
+import hashlib
+
+from django.db import migrations, models
+
+
+# Copies of students.qr as of this migration, so later changes there cannot alter it
+def build_payload(student_id, name, department):
+    return f"STUDENT_ID:{student_id}|NAME:{name}|DEPT:{department}"
+
+
+def payload_digest(payload):
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def mark_existing_codes_ready(apps, schema_editor):
+    # Codes rendered synchronously before this migration already match their payload
+    Student = apps.get_model('students', 'Student')
+    students = Student.objects.exclude(qr_code='').exclude(qr_code__isnull=True).only(
+        'student_id', 'name', 'department'
+    )
+    batch = []
+    for student in students.iterator(chunk_size=2000):
+        student.qr_payload_hash = payload_digest(
+            build_payload(student.student_id, student.name, student.department)
+        )
+        student.qr_status = 'ready'
+        batch.append(student)
+        if len(batch) >= 2000:
+            Student.objects.bulk_update(batch, ['qr_payload_hash', 'qr_status'])
+            batch = []
+    Student.objects.bulk_update(batch, ['qr_payload_hash', 'qr_status'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('students', '0005_meallog_service_date'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='student',
+            name='qr_payload_hash',
+            field=models.CharField(blank=True, editable=False, max_length=64),
+        ),
+        migrations.AddField(
+            model_name='student',
+            name='qr_status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('ready', 'Ready'), ('failed', 'Failed')], default='pending', editable=False, max_length=10),
+        ),
+        migrations.RunPython(mark_existing_codes_ready, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-17 19:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('students', '0006_student_qr_status'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='meallog',
+            name='timestamp',
+            field=models.DateTimeField(auto_now_add=True, db_index=True),
+        ),
+    ]
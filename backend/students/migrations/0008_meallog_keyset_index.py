@@ -0,0 +1,17 @@
+# Generated by Django 5.2.6 on 2026-10-17 19:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('students', '0007_meallog_timestamp_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='meallog',
+            index=models.Index(fields=['-timestamp', '-log_id'], name='meallog_timestamp_id_idx'),
+        ),
+    ]
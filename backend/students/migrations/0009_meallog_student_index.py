@@ -0,0 +1,17 @@
+# Generated by Django 5.2.6 on 2026-10-17 19:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('students', '0008_meallog_keyset_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='meallog',
+            index=models.Index(fields=['student', '-timestamp'], name='meallog_student_time_idx'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.6 on 2026-10-17 20:14
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('students', '0010_roster_sync_and_batch_scans'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='student',
+            name='student_id_prefix_idx',
+        ),
+    ]
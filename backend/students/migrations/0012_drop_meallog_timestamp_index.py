@@ -0,0 +1,19 @@
+# Generated by Django 5.2.6 on 2026-10-17 20:19
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('students', '0011_drop_student_id_prefix_index'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='meallog',
+            name='timestamp',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+    ]
@@ -1,12 +1,95 @@
-from django.db import models
+from django.conf import settings
+from django.db import models, transaction
+from django.db.models.functions import Upper
 from django.utils import timezone
-import qrcode
-from io import BytesIO
-from django.core.files import File
-from PIL import Image, ImageDraw
-import datetime
+from functools import partial
+import re
+
+from .qr import build_payload, enqueue_student_qr, payload_digest
+
+
+SCAN_ID_PREFIXES = ('STU', 'NFC', 'BIO')
+
+
+def parse_scan_code(raw):
+    """Return candidate student ids (upper-cased, most specific first) for a scan.
+
+    Accepts the QR payload written by ``Student.save``
+    (``STUDENT_ID:...|NAME:...|DEPT:...``), NFC/BIO prefixed ids such as
+    ``NFC:2024001`` and bare or partial ids typed on a keypad.
+    """
+    code = (raw or '').strip()
+    if 'STUDENT_ID:' in code.upper():
+        for part in code.split('|'):
+            key, _, value = part.partition(':')
+            if key.strip().upper() == 'STUDENT_ID':
+                code = value.strip()
+                break
+    code = code.upper()
+    for prefix in SCAN_ID_PREFIXES[1:]:
+        if code.startswith(prefix + ':'):
+            code = prefix + code[len(prefix) + 1:].strip()
+
+    candidates = []
+    cleaned = re.sub(r'[\s\-._]', '', code)
+    for value in (code, cleaned):
+        if value and value not in candidates:
+            candidates.append(value)
+    if cleaned and not cleaned.startswith(SCAN_ID_PREFIXES):
+        candidates.append(f'STU{cleaned}')
+    return candidates
+
+
+class StudentQuerySet(models.QuerySet):
+    def resolve_scan(self, raw):
+        """Resolve a raw scan to a single student, or ``None``.
+
+        Exact ids are matched through the ``UPPER(student_id)`` index; a
+        unique prefix match on the same expression, as typed or with ``STU``,
+        is the fallback for partial ids.
+        """
+        candidates = parse_scan_code(raw)
+        if not candidates:
+            return None
+
+        matches = {
+            student.student_id_upper: student
+            for student in self.annotate(student_id_upper=Upper('student_id')).filter(
+                student_id_upper__in=candidates
+            )
+        }
+        for candidate in candidates:
+            if candidate in matches:
+                return matches[candidate]
+
+        prefixes = candidates[-1:]
+        if len(candidates) > 1 and candidates[-1] == f'STU{candidates[-2]}':
+            prefixes = candidates[-2:]
+        # The range lets the UPPER(student_id) index be searched; startswith
+        # alone is a LIKE, which scans
+        by_prefix = models.Q()
+        for prefix in prefixes:
+            by_prefix |= models.Q(
+                student_id_upper__gte=prefix,
+                student_id_upper__lt=prefix[:-1] + chr(ord(prefix[-1]) + 1),
+                student_id_upper__startswith=prefix,
+            )
+        partial = list(self.annotate(student_id_upper=Upper('student_id')).filter(by_prefix)[:2])
+        if len(partial) == 1:
+            return partial[0]
+        return None
+
 
 class Student(models.Model):
+    QR_PENDING = 'pending'
+    QR_READY = 'ready'
+    QR_FAILED = 'failed'
+    QR_STATUS_CHOICES = [
+        (QR_PENDING, 'Pending'),
+        (QR_READY, 'Ready'),
+        (QR_FAILED, 'Failed'),
+    ]
+
     student_id = models.CharField(max_length=20, unique=True)
     name = models.CharField(max_length=100)
     email = models.EmailField(max_length=100)
@@ -15,76 +98,111 @@ class Student(models.Model):
     year = models.IntegerField()
     image = models.ImageField(upload_to='media/', blank=True, null=True)
     qr_code = models.ImageField(upload_to='qr_codes/', blank=True, null=True)
+    qr_status = models.CharField(max_length=10, choices=QR_STATUS_CHOICES, default=QR_PENDING, editable=False)
+    qr_payload_hash = models.CharField(max_length=64, blank=True, editable=False)
     date_registered = models.DateTimeField(auto_now_add=True)
+    # Roster sync cursor; QR rendering updates bypass it on purpose
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = StudentQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # Case-insensitive exact and prefix (range) lookups from gate scanners
+            models.Index(Upper('student_id'), name='student_id_upper_idx'),
+            # Roster deltas for gate terminals, keyset on (updated_at, id)
+            models.Index(fields=['updated_at', 'id'], name='student_updated_idx'),
+        ]
     
     def __str__(self):
         return f"{self.name} ({self.student_id})"
     
+    @property
+    def qr_payload(self):
+        return build_payload(self.student_id, self.name, self.department)
+
     def save(self, *args, **kwargs):
-        # Generate QR code when student is created
-        if not self.qr_code:
-            qr = qrcode.QRCode(
-                version=1,
-                error_correction=qrcode.constants.ERROR_CORRECT_L,
-                box_size=10,
-                border=4,
-            )
-            qr_data = f"STUDENT_ID:{self.student_id}|NAME:{self.name}|DEPT:{self.department}"
-            qr.add_data(qr_data)
-            qr.make(fit=True)
-            
-            qr_img = qr.make_image(fill_color="black", back_color="white")
-            # Ensure we have a PIL Image in RGB mode and size it to fit the canvas
-            try:
-                qr_pil = qr_img.convert('RGB')
-            except Exception:
-                # qr_img may already be a PIL image but not support convert
-                qr_pil = Image.new('RGB', qr_img.size)
-                qr_pil.paste(qr_img)
-
-            canvas_size = (400, 400)
-            canvas = Image.new('RGB', canvas_size, 'white')
-
-            # Resize QR if it's larger than the canvas minus margin
-            max_inner = 360
-            w, h = qr_pil.size
-            if w > max_inner or h > max_inner:
-                ratio = min(max_inner / w, max_inner / h)
-                new_size = (max(1, int(w * ratio)), max(1, int(h * ratio)))
-                qr_pil = qr_pil.resize(new_size, Image.LANCZOS)
-                w, h = qr_pil.size
-
-            # Center the QR on the canvas using a 2-tuple box
-            offset = ((canvas_size[0] - w) // 2, (canvas_size[1] - h) // 2)
-            canvas.paste(qr_pil, offset)
-            
-            buffer = BytesIO()
-            canvas.save(buffer, 'PNG')
-            # Ensure buffer is rewound before saving
-            buffer.seek(0)
-            self.qr_code.save(
-                f'qr_code_{self.student_id}.png',
-                File(buffer),
-                save=False
-            )
-            buffer.close()
-        
+        # QR rendering happens off the request thread; only queue it when the
+        # payload actually changed since the last render
+        needs_qr = not self.qr_code or self.qr_payload_hash != payload_digest(self.qr_payload)
+        if needs_qr:
+            self.qr_status = self.QR_PENDING
         super().save(*args, **kwargs)
+        if needs_qr:
+            transaction.on_commit(partial(enqueue_student_qr, self.pk))
+
+
+class DeletedStudent(models.Model):
+    """Tombstone so roster deltas can tell gate terminals to drop a student"""
+    student_id = models.CharField(max_length=20)
+    deleted_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+    def __str__(self):
+        return f"{self.student_id} (deleted {self.deleted_at:%Y-%m-%d})"
 
 
 class MealLog(models.Model):
+    MEAL_TYPE_CHOICES = [
+        ("breakfast", "Breakfast"),
+        ("lunch", "Lunch"),
+        ("dinner", "Dinner"),
+    ]
+
     log_id = models.AutoField(primary_key=True, unique=True)
     student = models.ForeignKey(Student, on_delete=models.CASCADE)
     meal_type = models.CharField(
         max_length=20,
-        choices=[
-            ("breakfast", "Breakfast"),
-            ("lunch", "Lunch"),
-            ("dinner", "Dinner"),
-        ]
+        choices=MEAL_TYPE_CHOICES
     )
-    timestamp = models.DateTimeField(auto_now_add=True)
+    # Set by the server for live scans; batch uploads keep the terminal's scan time
+    timestamp = models.DateTimeField(default=timezone.now)
+    service_date = models.DateField(editable=False)
+    description = models.TextField(blank=True, null=True)
+    # Client-generated key for queued offline scans, so retried uploads are no-ops
+    idempotency_key = models.UUIDField(blank=True, null=True, unique=True, editable=False)
+
+    class Meta:
+        constraints = [
+            # One serving per student, meal and service day
+            models.UniqueConstraint(
+                fields=['student', 'meal_type', 'service_date'],
+                name='unique_meal_per_service',
+            ),
+        ]
+        indexes = [
+            # Keyset pagination on (timestamp, log_id)
+            models.Index(fields=['-timestamp', '-log_id'], name='meallog_timestamp_id_idx'),
+            # A student's meal history
+            models.Index(fields=['student', '-timestamp'], name='meallog_student_time_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.student.name} - {self.meal_type} at {self.timestamp.strftime('%Y-%m-%d %H:%M:%S')}"
+
+    def save(self, *args, **kwargs):
+        if not self.service_date:
+            self.service_date = timezone.localdate(self.timestamp) if self.timestamp else timezone.localdate()
+        super().save(*args, **kwargs)
+
+    @staticmethod
+    def current_meal_type(now=None):
+        """Return the meal being served at ``now`` (local time), or ``None`` when closed"""
+        hour = timezone.localtime(now).hour
+        for meal_type, (start, end) in settings.MEAL_SERVICE_WINDOWS.items():
+            if start <= hour < end:
+                return meal_type
+        return None
+
+
+class DuplicateMealLog(models.Model):
+    """Repeat servings moved out of MealLog when ``unique_meal_per_service`` was added, kept for audit"""
+    log_id = models.IntegerField(primary_key=True)
+    student = models.ForeignKey(Student, on_delete=models.CASCADE, related_name='+')
+    meal_type = models.CharField(max_length=20, choices=MealLog.MEAL_TYPE_CHOICES)
+    timestamp = models.DateTimeField()
+    service_date = models.DateField()
     description = models.TextField(blank=True, null=True)
+    archived_at = models.DateTimeField(auto_now_add=True)
 
     def __str__(self):
-        return f"{self.student.name} - {self.meal_type} at {self.timestamp.strftime('%Y-%m-%d %H:%M:%S')}"
\ No newline at end of file
+        return f"{self.student_id} - {self.meal_type} on {self.service_date} (repeat)"
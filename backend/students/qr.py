@@ -0,0 +1,153 @@
+"""QR code rendering for students.
+
+Rendering is CPU bound (``qrcode`` + Pillow), so it runs off the request
+thread: ``Student.save`` queues the student on a small thread pool and the
+``generate_qr_codes`` management command backfills in a process pool.
+"""
+import hashlib
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+import qrcode
+from PIL import Image
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import close_old_connections
+
+logger = logging.getLogger(__name__)
+
+CANVAS_SIZE = (400, 400)
+MAX_INNER = 360
+
+_executor = None
+
+
+def build_payload(student_id, name, department):
+    return f"STUDENT_ID:{student_id}|NAME:{name}|DEPT:{department}"
+
+
+def payload_digest(payload):
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def qr_filename(student_id, digest):
+    return f'qr_code_{student_id}_{digest[:12]}.png'
+
+
+def render_qr_png(payload):
+    """Render ``payload`` as a centred QR code on a white 400x400 PNG"""
+    qr = qrcode.QRCode(
+        version=1,
+        error_correction=qrcode.constants.ERROR_CORRECT_L,
+        box_size=10,
+        border=4,
+    )
+    qr.add_data(payload)
+    qr.make(fit=True)
+
+    qr_img = qr.make_image(fill_color="black", back_color="white")
+    # Ensure we have a PIL Image in RGB mode and size it to fit the canvas
+    try:
+        qr_pil = qr_img.convert('RGB')
+    except Exception:
+        # qr_img may already be a PIL image but not support convert
+        qr_pil = Image.new('RGB', qr_img.size)
+        qr_pil.paste(qr_img)
+
+    canvas = Image.new('RGB', CANVAS_SIZE, 'white')
+
+    # Resize QR if it's larger than the canvas minus margin
+    w, h = qr_pil.size
+    if w > MAX_INNER or h > MAX_INNER:
+        ratio = min(MAX_INNER / w, MAX_INNER / h)
+        new_size = (max(1, int(w * ratio)), max(1, int(h * ratio)))
+        qr_pil = qr_pil.resize(new_size, Image.LANCZOS)
+        w, h = qr_pil.size
+
+    # Center the QR on the canvas using a 2-tuple box
+    offset = ((CANVAS_SIZE[0] - w) // 2, (CANVAS_SIZE[1] - h) // 2)
+    canvas.paste(qr_pil, offset)
+
+    buffer = BytesIO()
+    canvas.save(buffer, 'PNG')
+    return buffer.getvalue()
+
+
+def rendered_qr_name(student, digest):
+    """Return the stored name of an identical, already rendered code, if any"""
+    field = student.qr_code.field
+    name = field.generate_filename(student, qr_filename(student.student_id, digest))
+    return name if field.storage.exists(name) else None
+
+
+def store_qr_png(student, png, digest):
+    """Write ``png`` to storage for ``student`` and return the stored name"""
+    old_name = student.qr_code.name if student.qr_code else None
+    student.qr_code.save(qr_filename(student.student_id, digest), ContentFile(png), save=False)
+    if old_name and old_name != student.qr_code.name:
+        student.qr_code.storage.delete(old_name)
+    return student.qr_code.name
+
+
+def render_student_qr(pk, force=False):
+    """Render (or confirm) the QR code for one student and mark it ready"""
+    from .models import Student
+
+    student = Student.objects.filter(pk=pk).first()
+    if student is None:
+        return
+
+    digest = payload_digest(student.qr_payload)
+    updates = {'qr_status': Student.QR_READY, 'qr_payload_hash': digest}
+    try:
+        if force or not student.qr_code or student.qr_payload_hash != digest:
+            existing = None if force else rendered_qr_name(student, digest)
+            updates['qr_code'] = existing or store_qr_png(student, render_qr_png(student.qr_payload), digest)
+    except Exception:
+        logger.exception('QR rendering failed for student %s', pk)
+        updates = {'qr_status': Student.QR_FAILED}
+    Student.objects.filter(pk=pk).update(**updates)
+
+
+def render_pending_qr():
+    """Render every student still waiting for a QR code"""
+    from .models import Student
+
+    pending = Student.objects.filter(qr_status=Student.QR_PENDING).values_list('pk', flat=True)
+    for pk in pending.iterator():
+        render_student_qr(pk)
+
+
+def _in_background(func, *args):
+    close_old_connections()
+    try:
+        func(*args)
+    finally:
+        close_old_connections()
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.STUDENT_QR_WORKERS,
+            thread_name_prefix='student-qr',
+        )
+    return _executor
+
+
+def enqueue_student_qr(pk):
+    """Queue QR rendering for a student, or render inline when async is disabled"""
+    if settings.STUDENT_QR_ASYNC:
+        get_executor().submit(_in_background, render_student_qr, pk)
+    else:
+        render_student_qr(pk)
+
+
+def enqueue_pending_qr():
+    """Queue one background sweep over all pending students (used after bulk imports)"""
+    if settings.STUDENT_QR_ASYNC:
+        get_executor().submit(_in_background, render_pending_qr)
+    else:
+        render_pending_qr()
@@ -0,0 +1,123 @@
+"""Roster deltas and batched scan uploads for offline-capable gate terminals.
+
+A terminal keeps a local copy of the roster and asks for the students that
+changed since its ``version`` cursor, an opaque keyset position on
+``(updated_at, id)``. Rows younger than ``ROSTER_SYNC_SETTLE`` seconds are
+held back until a later sync, so a row from a transaction that commits after
+a newer one cannot fall behind the cursor. Deleted students come back as
+tombstones; terminals apply ``removed`` before upserting ``students``.
+
+Scans queued while offline are uploaded in batches and inserted with one
+``INSERT ... ON CONFLICT DO NOTHING``: the ``unique_meal_per_service``
+constraint rejects second servings and the unique ``idempotency_key`` makes
+re-sent scans no-ops.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from backend.pagination import decode_cursor, encode_cursor, encode_value, keyset_filter
+from .models import DeletedStudent, MealLog, Student
+
+ROSTER_ORDERING = ('updated_at', 'id')
+ROSTER_FIELDS = ['id', 'student_id', 'name', 'department', 'year', 'image']
+
+
+def parse_version(version):
+    """Keyset position for a ``version`` cursor; ``None`` for a full sync"""
+    if not version:
+        return None
+    _, position = decode_cursor(version)
+    if len(position) != len(ROSTER_ORDERING):
+        raise ValueError('Invalid cursor')
+    changed = parse_datetime(position[0]) if isinstance(position[0], str) else None
+    if changed is None or not str(position[1]).isdigit():
+        raise ValueError('Invalid cursor')
+    return [changed, int(position[1])]
+
+
+def roster_delta(version=None, limit=None):
+    """Students changed after ``version``, as columns, plus student ids removed since.
+
+    ``complete`` is false when ``limit`` cut the page short; the client asks
+    again with the returned ``version``. ``reset`` (full sync) means the client
+    replaces its roster instead of merging into it.
+    """
+    limit = limit or settings.ROSTER_SYNC_PAGE_SIZE
+    position = parse_version(version)
+    settled = timezone.now() - timedelta(seconds=settings.ROSTER_SYNC_SETTLE)
+
+    students = Student.objects.filter(updated_at__lt=settled)
+    if position is not None:
+        students = students.filter(keyset_filter(ROSTER_ORDERING, position))
+    rows = list(students.order_by(*ROSTER_ORDERING).values_list(*ROSTER_FIELDS, 'updated_at')[:limit + 1])
+    complete = len(rows) <= limit
+    rows = rows[:limit]
+
+    # Tombstones up to where this page stops, so pages never repeat a removal
+    until = settled if complete else rows[-1][-1]
+    removed = []
+    if position is not None:
+        removed = list(DeletedStudent.objects.filter(
+            deleted_at__gt=position[0], deleted_at__lt=until
+        ).order_by('deleted_at').values_list('student_id', flat=True))
+
+    # With nothing new the cursor still moves up to the settled point
+    position = [rows[-1][-1], rows[-1][0]] if rows else [settled, 0]
+    columns = {field: [row[i] for row in rows] for i, field in enumerate(ROSTER_FIELDS)}
+    columns['image'] = [storage_url(name) for name in columns['image']]
+    return {
+        'version': encode_cursor([encode_value(value) for value in position]),
+        'reset': not version,
+        'complete': complete,
+        'count': len(rows),
+        'students': columns,
+        'removed': removed,
+    }
+
+
+def storage_url(name):
+    return Student._meta.get_field('image').storage.url(name) if name else None
+
+
+def record_batch_scans(scans):
+    """Insert validated offline scans; return one result per scan, in order.
+
+    Each scan is a dict with ``key``, ``student`` (pk), ``timestamp`` and an
+    optional ``meal_type``. Results are ``accepted`` (stored now or by an
+    earlier upload of the same key), ``already_served``, ``not_found`` or
+    ``closed``.
+    """
+    known = set(Student.objects.filter(pk__in={scan['student'] for scan in scans}).values_list('pk', flat=True))
+    results = {}
+    logs = []
+    for scan in scans:
+        key = scan['key']
+        if scan['student'] not in known:
+            results[key] = {'key': key, 'status': 'not_found'}
+            continue
+        meal_type = scan.get('meal_type') or MealLog.current_meal_type(scan['timestamp'])
+        if meal_type is None:
+            results[key] = {'key': key, 'status': 'closed'}
+            continue
+        logs.append(MealLog(
+            student_id=scan['student'],
+            meal_type=meal_type,
+            timestamp=scan['timestamp'],
+            service_date=timezone.localdate(scan['timestamp']),
+            idempotency_key=key,
+        ))
+
+    MealLog.objects.bulk_create(logs, ignore_conflicts=True)
+    stored = dict(MealLog.objects.filter(
+        idempotency_key__in=[log.idempotency_key for log in logs]
+    ).values_list('idempotency_key', 'log_id'))
+    for log in logs:
+        key = log.idempotency_key
+        if key in stored:
+            results[key] = {'key': key, 'status': 'accepted', 'log_id': stored[key]}
+        else:
+            results[key] = {'key': key, 'status': 'already_served'}
+    return [results[scan['key']] for scan in scans]
@@ -1,22 +1,93 @@
+from datetime import timedelta
+
+from django.utils import timezone
 from rest_framework import serializers
+from backend.images import image_srcset, version_of
 from .models import Student, MealLog
 
 class StudentSerializer(serializers.ModelSerializer):
     qr_code_url = serializers.SerializerMethodField()
+    image_srcset = serializers.SerializerMethodField()
     
     class Meta:
         model = Student
-        fields = '__all__'
+        exclude = ['qr_payload_hash']
     
     def get_qr_code_url(self, obj):
         if obj.qr_code:
             return obj.qr_code.url
         return None
 
+    def get_image_srcset(self, obj):
+        return image_srcset(obj.image, version_of(obj))
+
+class StudentImportSerializer(serializers.ModelSerializer):
+    """Row validator for bulk imports; uniqueness is handled by the upsert"""
+    class Meta:
+        model = Student
+        fields = ['student_id', 'name', 'email', 'phone', 'department', 'year']
+        extra_kwargs = {'student_id': {'validators': []}}
+
+class StudentLookupSerializer(serializers.ModelSerializer):
+    """Compact student record returned to gate scanners"""
+    image = serializers.SerializerMethodField()
+    image_srcset = serializers.SerializerMethodField()
+
+    # Columns it reads, for ``Student.objects.only(...)``
+    load_fields = ['id', 'student_id', 'name', 'department', 'year', 'image', 'updated_at']
+
+    class Meta:
+        model = Student
+        fields = ['id', 'student_id', 'name', 'department', 'year', 'image', 'image_srcset']
+
+    def get_image(self, obj):
+        if obj.image:
+            return obj.image.url
+        return None
+
+    def get_image_srcset(self, obj):
+        return image_srcset(obj.image, version_of(obj))
+
 class MealLogSerializer(serializers.ModelSerializer):
     student_name = serializers.CharField(source='student.name', read_only=True)
     student_id = serializers.CharField(source='student.student_id', read_only=True)
     
     class Meta:
         model = MealLog
-        fields = '__all__'
\ No newline at end of file
+        fields = '__all__'
+        read_only_fields = ['timestamp']
+
+class MealScanSerializer(serializers.Serializer):
+    code = serializers.CharField()
+    meal_type = serializers.ChoiceField(choices=MealLog.MEAL_TYPE_CHOICES, required=False)
+
+class MealStatsQuerySerializer(serializers.Serializer):
+    """Window for /api/meals/stats/: explicit dates, or the last ``days`` days"""
+    MAX_DAYS = 366
+
+    start = serializers.DateField(required=False)
+    end = serializers.DateField(required=False)
+    days = serializers.IntegerField(required=False, min_value=1, max_value=MAX_DAYS)
+
+    def validate(self, attrs):
+        end = attrs.get('end') or timezone.localdate()
+        start = attrs.get('start') or end - timedelta(days=attrs.get('days', 1) - 1)
+        if start > end:
+            raise serializers.ValidationError('start must not be after end')
+        if (end - start).days >= self.MAX_DAYS:
+            raise serializers.ValidationError(f'The window is limited to {self.MAX_DAYS} days')
+        return {'start': start, 'end': end}
+
+class MealBatchScanSerializer(serializers.Serializer):
+    """One scan queued by a gate terminal while offline"""
+    key = serializers.UUIDField()
+    student = serializers.IntegerField()
+    timestamp = serializers.DateTimeField()
+    meal_type = serializers.ChoiceField(choices=MealLog.MEAL_TYPE_CHOICES, required=False)
+
+    def validate_timestamp(self, value):
+        # A terminal clock running ahead must not log meals in the future
+        return min(value, timezone.now())
+
+class MealBatchSerializer(serializers.Serializer):
+    scans = serializers.ListField(child=MealBatchScanSerializer(), allow_empty=False, max_length=1000)
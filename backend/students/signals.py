@@ -0,0 +1,10 @@
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+
+from .models import DeletedStudent, Student
+
+
+@receiver(post_delete, sender=Student)
+def record_deleted_student(sender, instance, **kwargs):
+    # Gate terminals learn about removals from these in the roster delta
+    DeletedStudent.objects.create(student_id=instance.student_id)
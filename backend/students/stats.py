@@ -0,0 +1,68 @@
+"""Grouped meal-log aggregates for the analytics dashboard.
+
+Each breakdown is one ``GROUP BY`` over a ``timestamp`` range scan; the
+result for a window is cached so dashboards polling the same window share it.
+"""
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count
+from django.db.models.functions import ExtractHour
+from django.utils import timezone
+
+from .models import Student, MealLog
+
+# Closed windows only change when a historic log is edited by hand
+CLOSED_WINDOW_TTL = 60 * 60
+
+
+def window_bounds(start, end):
+    """Aware datetimes for local midnight at ``start`` and after ``end``"""
+    tz = timezone.get_current_timezone()
+    return (
+        timezone.make_aware(datetime.combine(start, time.min), tz),
+        timezone.make_aware(datetime.combine(end + timedelta(days=1), time.min), tz),
+    )
+
+
+def compute_meal_stats(start, end):
+    since, until = window_bounds(start, end)
+    logs = MealLog.objects.filter(timestamp__gte=since, timestamp__lt=until).order_by()
+
+    def grouped(field, **expressions):
+        rows = logs.annotate(**expressions).values(field).annotate(count=Count('pk')).order_by(field)
+        return [{'key': row[field], 'count': row['count']} for row in rows]
+
+    by_day = {row['key']: row['count'] for row in grouped('service_date')}
+    days = [start + timedelta(days=i) for i in range((end - start).days + 1)]
+    totals = logs.aggregate(total=Count('pk'), students=Count('student', distinct=True))
+
+    return {
+        'start_date': start.isoformat(),
+        'end_date': end.isoformat(),
+        'total_meals': totals['total'],
+        'unique_students': totals['students'],
+        'total_students': Student.objects.count(),
+        'by_day': [{'date': day.isoformat(), 'count': by_day.get(day, 0)} for day in days],
+        'by_meal_type': [
+            {'meal_type': row['key'], 'count': row['count']} for row in grouped('meal_type')
+        ],
+        'by_hour': [
+            {'hour': row['key'], 'count': row['count']} for row in grouped('hour', hour=ExtractHour('timestamp'))
+        ],
+        'by_department': [
+            {'department': row['key'], 'count': row['count']} for row in grouped('student__department')
+        ],
+    }
+
+
+def meal_stats(start, end):
+    """Return (cached) meal counts for the local dates ``start``..``end`` inclusive"""
+    key = f'students:meal-stats:{timezone.get_current_timezone_name()}:{start}:{end}'
+    stats = cache.get(key)
+    if stats is None:
+        stats = compute_meal_stats(start, end)
+        ttl = settings.MEAL_STATS_CACHE_TTL if end >= timezone.localdate() else CLOSED_WINDOW_TTL
+        cache.set(key, stats, ttl)
+    return stats
@@ -1,3 +1,458 @@
-from django.test import TestCase
+import gzip
+import json
+import os
+import shutil
+import tempfile
+import uuid
+from datetime import date, datetime
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from PIL import Image
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APITestCase
+
+from cafe.tests import QueryPlanMixin
+from . import qr
+from .importers import import_students
+from .models import Student, StudentQuerySet, MealLog
+from .stats import compute_meal_stats
+
+
+class ListQueryCountTests(APITestCase):
+    """List endpoints cost a fixed number of queries, whatever the page size"""
+
+    # count + page
+    EXPECTED_QUERIES = {
+        '/api/students/': 2,
+        '/api/meals/': 2,
+    }
+
+    def add_rows(self, count):
+        start = Student.objects.count()
+        for i in range(start, start + count):
+            student = Student.objects.create(
+                student_id=f'STU{i:05d}', name=f'Student {i}', email=f's{i}@example.com',
+                phone='555', department='CS', year=1,
+            )
+            MealLog.objects.create(student=student, meal_type='lunch')
+
+    def list_queries(self):
+        counts = {}
+        for url in self.EXPECTED_QUERIES:
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, 200, url)
+            counts[url] = len(queries)
+        return counts
+
+    def test_list_query_counts_do_not_grow_with_page_size(self):
+        self.add_rows(2)
+        self.assertEqual(self.list_queries(), self.EXPECTED_QUERIES)
+
+        self.add_rows(15)
+        self.assertEqual(self.list_queries(), self.EXPECTED_QUERIES)
+
+
+class QueryPlanTests(QueryPlanMixin, APITestCase):
+    def test_meal_history_uses_student_index(self):
+        student = Student.objects.create(student_id='STU00001', name='Student', department='CS', year=1)
+        MealLog.objects.create(student=student, meal_type='lunch')
+        self.assertEndpointUsesIndex('/api/meals/', 'students_meallog', 'meallog_student_time_idx', {'student': student.pk})
+        self.assertEndpointUsesIndex('/api/meals/', 'students_meallog', 'meallog_timestamp_id_idx', {'cursor': ''})
+
+
+class MealStatsTests(QueryPlanMixin, APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        ann = Student.objects.create(student_id='STU00001', name='Ann', department='CS', year=1)
+        ben = Student.objects.create(student_id='STU00002', name='Ben', department='Math', year=2)
+        Student.objects.create(student_id='STU00003', name='Cy', department='Math', year=3)
+
+        def at(day, hour):
+            return timezone.make_aware(datetime(2025, 3, day, hour, 15))
+
+        for student, meal_type, timestamp in [
+            (ann, 'breakfast', at(10, 8)),
+            (ann, 'lunch', at(10, 12)),
+            (ben, 'lunch', at(10, 12)),
+            (ben, 'dinner', at(12, 18)),
+            (ann, 'lunch', at(13, 12)),  # after the window
+        ]:
+            MealLog.objects.create(student=student, meal_type=meal_type, timestamp=timestamp)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_breakdowns_for_a_window(self):
+        stats = compute_meal_stats(date(2025, 3, 10), date(2025, 3, 12))
+        self.assertEqual((stats['total_meals'], stats['unique_students'], stats['total_students']), (4, 2, 3))
+        self.assertEqual(stats['by_day'], [
+            {'date': '2025-03-10', 'count': 3}, {'date': '2025-03-11', 'count': 0}, {'date': '2025-03-12', 'count': 1},
+        ])
+        self.assertEqual(stats['by_meal_type'], [
+            {'meal_type': 'breakfast', 'count': 1}, {'meal_type': 'dinner', 'count': 1}, {'meal_type': 'lunch', 'count': 2},
+        ])
+        self.assertEqual(stats['by_hour'], [{'hour': 8, 'count': 1}, {'hour': 12, 'count': 2}, {'hour': 18, 'count': 1}])
+        self.assertEqual(stats['by_department'], [{'department': 'CS', 'count': 2}, {'department': 'Math', 'count': 2}])
+
+    def test_endpoint_validates_and_caches_the_window(self):
+        params = {'start': '2025-03-10', 'end': '2025-03-12'}
+        response = self.client.get('/api/meals/stats/', params)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['total_meals'], 4)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get('/api/meals/stats/', params).data, response.data)
+
+        self.assertEqual(self.client.get('/api/meals/stats/', {'start': '2025-03-12', 'end': '2025-03-10'}).status_code, 400)
+        self.assertEqual(self.client.get('/api/meals/stats/', {'days': 400}).status_code, 400)
+        response = self.client.get('/api/meals/stats/', {'days': 7})
+        self.assertEqual(len(response.data['by_day']), 7)
+        self.assertEqual(response.data['end_date'], timezone.localdate().isoformat())
+
+    def test_window_is_a_timestamp_range_scan(self):
+        with CaptureQueriesContext(connection) as queries:
+            compute_meal_stats(date(2025, 3, 10), date(2025, 3, 12))
+        self.assertUsesIndex(queries, 'students_meallog', 'meallog_timestamp_id_idx')
+
+
+class StudentLookupTests(QueryPlanMixin, APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.first = Student.objects.create(student_id='STU20240042', name='First', department='CS', year=1)
+        cls.second = Student.objects.create(student_id='STU20240043', name='Second', department='CS', year=1)
+        cls.bare = Student.objects.create(student_id='2023000017', name='Bare', department='Art', year=3)
+        cls.lettered = Student.objects.create(student_id='ENG5531', name='Lettered', department='Eng', year=2)
+        cls.nfc = Student.objects.create(student_id='NFC9001', name='Badge', department='Eng', year=2)
+
+    def lookup(self, code):
+        response = self.client.get('/api/students/lookup/', {'code': code})
+        return response.data['student_id'] if response.status_code == 200 else response.status_code
+
+    def test_exact_and_prefixed_codes(self):
+        self.assertEqual(self.lookup('STU20240042'), 'STU20240042')
+        self.assertEqual(self.lookup(self.first.qr_payload), 'STU20240042')
+        self.assertEqual(self.lookup('20240042'), 'STU20240042')
+        self.assertEqual(self.lookup('NFC:9001'), 'NFC9001')
+        self.assertEqual(self.lookup('2023-000-017'), '2023000017')
+
+    def test_lower_case_codes(self):
+        self.assertEqual(self.lookup('stu20240043'), 'STU20240043')
+        self.assertEqual(self.lookup('eng5531'), 'ENG5531')
+        self.assertEqual(self.lookup('nfc:9001'), 'NFC9001')
+
+    def test_partial_codes_must_be_unique(self):
+        self.assertEqual(self.lookup('eng55'), 'ENG5531')
+        self.assertEqual(self.lookup('2023000'), '2023000017')
+        self.assertEqual(self.lookup('stu2024004'), 404)  # First and Second
+        self.assertEqual(self.lookup('99'), 404)
+        self.assertEqual(self.lookup('  '), 400)
+
+    def test_partial_codes_search_the_upper_index(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.lookup('eng55'), 'ENG5531')
+        partial = [query for query in queries.captured_queries if 'FROM "students_student"' in query['sql']][-1]
+        self.assertIn('student_id_upper_idx', self.explain(partial['sql']))
+
+
+@override_settings(STUDENT_QR_ASYNC=False)
+class QRCodeTests(APITestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings_override = self.settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def create_student(self, **fields):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Student.objects.create(
+                student_id=fields.pop('student_id', 'STU00001'), name='Ann', department='CS', year=1, **fields
+            )
+
+    def test_saving_a_student_renders_its_code_after_commit(self):
+        student = self.create_student()
+        student.refresh_from_db()
+        self.assertEqual(student.qr_status, Student.QR_READY)
+        self.assertEqual(student.qr_payload_hash, qr.payload_digest('STUDENT_ID:STU00001|NAME:Ann|DEPT:CS'))
+        with student.qr_code.open('rb') as file:
+            self.assertEqual(Image.open(file).size, qr.CANVAS_SIZE)
+
+    def test_codes_are_rendered_again_only_when_the_payload_changes(self):
+        student = self.create_student()
+        student.refresh_from_db()
+        first = student.qr_code.name
+
+        student.year = 2
+        with mock.patch.object(qr, 'render_qr_png', wraps=qr.render_qr_png) as render:
+            with self.captureOnCommitCallbacks(execute=True):
+                student.save()
+            render.assert_not_called()
+
+            student.name = 'Anne'
+            with self.captureOnCommitCallbacks(execute=True):
+                student.save()
+            render.assert_called_once_with('STUDENT_ID:STU00001|NAME:Anne|DEPT:CS')
+        student.refresh_from_db()
+        self.assertNotEqual(student.qr_code.name, first)
+        self.assertFalse(student.qr_code.storage.exists(first))
+
+    def test_rendering_failures_are_marked(self):
+        with mock.patch.object(qr, 'render_qr_png', side_effect=ValueError('bad payload')), \
+                self.assertLogs('students.qr', 'ERROR'):
+            student = self.create_student()
+        student.refresh_from_db()
+        self.assertEqual(student.qr_status, Student.QR_FAILED)
+        self.assertFalse(student.qr_code)
+
+    def test_generate_qr_codes_renders_pending_and_stale_students(self):
+        # bulk_create skips Student.save, as an import through raw SQL would
+        Student.objects.bulk_create([
+            Student(student_id=f'STU{i:05d}', name=f'Student {i}', department='CS', year=1) for i in range(3)
+        ])
+        output = StringIO()
+        call_command('generate_qr_codes', workers=1, batch_size=2, stdout=output)
+        self.assertIn('rendered 3', output.getvalue())
+        self.assertEqual(Student.objects.filter(qr_status=Student.QR_READY).exclude(qr_code='').count(), 3)
+
+        Student.objects.filter(student_id='STU00001').update(name='Renamed', qr_status=Student.QR_PENDING)
+        output = StringIO()
+        call_command('generate_qr_codes', workers=1, stdout=output)
+        self.assertIn('Processed 1 students, rendered 1', output.getvalue())
+        renamed = Student.objects.get(student_id='STU00001')
+        self.assertEqual(renamed.qr_payload_hash, qr.payload_digest(renamed.qr_payload))
+
+        output = StringIO()
+        call_command('generate_qr_codes', workers=1, force=True, stdout=output)
+        self.assertIn('Processed 3 students, rendered 3', output.getvalue())
+
+
+class StudentImportTests(APITestCase):
+    CSV = (
+        'student_id,name,email,phone,department,year\n'
+        'STU00001,Ann,ann@example.com,555,CS,1\n'
+        'STU00002,Ben,not-an-email,555,CS,2\n'
+        'STU00003,Cy,cy@example.com,555,Math,3\n'
+    )
+
+    def setUp(self):
+        Student.objects.create(student_id='STU00001', name='Old name', email='old@example.com', department='CS', year=1)
+
+    def test_csv_rows_are_upserted_in_chunks(self):
+        progress = []
+        summary = import_students(StringIO(self.CSV), 'csv', chunk_size=2, progress=lambda s: progress.append(dict(s)))
+        self.assertEqual((summary['processed'], summary['imported'], summary['failed']), (3, 2, 1))
+        self.assertEqual(summary['errors'][0]['line'], 3)
+        self.assertIn('email', summary['errors'][0]['errors'])
+        self.assertEqual(len(progress), 2)
+
+        self.assertEqual(Student.objects.get(student_id='STU00001').name, 'Ann')
+        self.assertEqual(Student.objects.get(student_id='STU00003').qr_status, Student.QR_PENDING)
+        self.assertFalse(Student.objects.filter(student_id='STU00002').exists())
+
+    def test_json_lines_keep_the_last_duplicate_and_report_bad_lines(self):
+        lines = [
+            json.dumps({'student_id': 'STU00004', 'name': 'Dee', 'email': 'd@example.com', 'phone': '1',
+                        'department': 'Art', 'year': 1}),
+            '',
+            '{not json',
+            '[1, 2]',
+            json.dumps({'student_id': 'STU00004', 'name': 'Dee Two', 'email': 'd@example.com', 'phone': '1',
+                        'department': 'Art', 'year': 2}),
+        ]
+        summary = import_students(lines, 'jsonl')
+        self.assertEqual((summary['processed'], summary['imported'], summary['failed']), (4, 1, 2))
+        self.assertEqual([error['line'] for error in summary['errors']], [3, 4])
+        self.assertEqual(Student.objects.get(student_id='STU00004').name, 'Dee Two')
+
+    def test_bulk_import_endpoint(self):
+        upload = SimpleUploadedFile('roster.csv', ('\ufeff' + self.CSV).encode(), content_type='text/csv')
+        response = self.client.post('/api/students/import/', {'file': upload}, format='multipart')
+        self.assertIn(response.status_code, (401, 403))
+
+        staff = User.objects.create_user('staff', password='password123')
+        staff.profile.role = 'staff'
+        staff.profile.save()
+        self.client.force_authenticate(staff)
+        upload.seek(0)
+        with mock.patch('students.views.enqueue_pending_qr') as enqueue:
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.post('/api/students/import/', {'file': upload}, format='multipart')
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(response.data['imported'], 2)
+        enqueue.assert_called_once_with()
+        self.assertEqual(Student.objects.get(student_id='STU00001').name, 'Ann')
+
+        self.assertEqual(self.client.post('/api/students/import/', {}, format='multipart').status_code, 400)
+
+    def test_command_reads_a_file(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False) as file:
+            file.write(self.CSV)
+        self.addCleanup(os.remove, file.name)
+        output, errors = StringIO(), StringIO()
+        call_command('import_students', file.name, stdout=output, stderr=errors)
+        self.assertIn('Imported 2 students from 3 rows (1 failed)', output.getvalue())
+        self.assertIn('line 3', errors.getvalue())
+
+    def test_command_leaves_stdin_open(self):
+        stdin = StringIO(json.dumps({
+            'student_id': 'STU00005', 'name': 'Eve', 'email': 'e@example.com', 'phone': '1', 'department': 'CS', 'year': 1,
+        }) + '\n')
+        with mock.patch('sys.stdin', stdin):
+            call_command('import_students', '-', fmt='jsonl', stdout=StringIO())
+        self.assertFalse(stdin.closed)
+        self.assertTrue(Student.objects.filter(student_id='STU00005').exists())
+
+    def test_command_reports_missing_files(self):
+        with self.assertRaises(CommandError):
+            call_command('import_students', '/nonexistent/roster.csv', stdout=StringIO())
+
+
+class MealScanTests(APITestCase):
+    def setUp(self):
+        self.student = Student.objects.create(student_id='STU00001', name='Student', department='CS', year=1)
+
+    def scan(self):
+        return self.client.post('/api/meals/scan/', {'code': 'STU00001', 'meal_type': 'lunch'}, format='json')
+
+    def test_second_scan_in_one_service_is_refused(self):
+        first = self.scan()
+        self.assertEqual(first.status_code, 201)
+        self.assertTrue(first.data['allowed'])
+
+        second = self.scan()
+        self.assertEqual(second.status_code, 409)
+        self.assertEqual(second.data['reason'], 'already_served')
+        self.assertEqual(MealLog.objects.count(), 1)
+        # A different meal the same day is still served
+        response = self.client.post('/api/meals/scan/', {'code': 'STU00001', 'meal_type': 'dinner'}, format='json')
+        self.assertEqual(response.status_code, 201)
+
+    def test_concurrent_insert_loses_on_the_constraint(self):
+        resolve_scan = StudentQuerySet.resolve_scan
+
+        def other_terminal_first(queryset, code):
+            # Another gate commits the same serving between our lookup and our insert
+            student = resolve_scan(queryset, code)
+            MealLog.objects.create(student=student, meal_type='lunch')
+            return student
+
+        with mock.patch.object(StudentQuerySet, 'resolve_scan', autospec=True, side_effect=other_terminal_first):
+            response = self.scan()
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.data['reason'], 'already_served')
+        self.assertEqual(MealLog.objects.count(), 1)
+
+    def test_direct_create_reports_duplicates(self):
+        payload = {'student': self.student.pk, 'meal_type': 'lunch'}
+        self.assertEqual(self.client.post('/api/meals/', payload, format='json').status_code, 201)
+        response = self.client.post('/api/meals/', payload, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(MealLog.objects.count(), 1)
+
+
+@override_settings(ROSTER_SYNC_SETTLE=0, ROSTER_SYNC_PAGE_SIZE=2)
+class RosterSyncTests(APITestCase):
+    def setUp(self):
+        self.students = [
+            Student.objects.create(student_id=f'STU{i:05d}', name=f'Student {i}', department='CS', year=1)
+            for i in range(3)
+        ]
+
+    def sync(self, version=None, **headers):
+        response = self.client.get('/api/students/roster/', {'version': version} if version else {}, **headers)
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_full_sync_pages_then_only_changes(self):
+        first = self.sync().json()
+        self.assertTrue(first['reset'])
+        self.assertFalse(first['complete'])
+        self.assertEqual(first['students']['student_id'], ['STU00000', 'STU00001'])
+        second = self.sync(first['version']).json()
+        self.assertTrue(second['complete'])
+        self.assertEqual(second['students']['student_id'], ['STU00002'])
+
+        idle = self.sync(second['version']).json()
+        self.assertEqual(idle['count'], 0)
+
+        self.students[0].name = 'Renamed'
+        self.students[0].save()
+        self.students[1].delete()
+        delta = self.sync(idle['version']).json()
+        self.assertFalse(delta['reset'])
+        self.assertEqual(delta['students']['name'], ['Renamed'])
+        self.assertEqual(delta['removed'], ['STU00001'])
+
+    def test_response_is_gzipped_when_accepted(self):
+        response = self.sync(HTTP_ACCEPT_ENCODING='gzip, deflate')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(json.loads(gzip.decompress(response.content))['count'], 2)
+
+    def test_invalid_version_is_rejected(self):
+        response = self.client.get('/api/students/roster/', {'version': 'not-a-cursor'})
+        self.assertEqual(response.status_code, 400)
+
+
+class MealBatchTests(APITestCase):
+    def setUp(self):
+        self.student = Student.objects.create(student_id='STU00001', name='Student', department='CS', year=1)
+        self.lunch = timezone.make_aware(datetime(2025, 3, 4, 12, 15))
+
+    def scan(self, **fields):
+        return {'key': str(uuid.uuid4()), 'student': self.student.pk, 'timestamp': self.lunch.isoformat(), **fields}
+
+    def upload(self, scans):
+        response = self.client.post('/api/meals/batch/', {'scans': scans}, format='json')
+        self.assertEqual(response.status_code, 200, response.data)
+        return [result['status'] for result in response.data['results']]
+
+    def test_batch_dedupes_in_one_insert_and_retries_are_no_ops(self):
+        scans = [
+            self.scan(),
+            self.scan(),  # second lunch the same day
+            self.scan(timestamp=self.lunch.replace(hour=3).isoformat()),  # cafe closed
+            self.scan(student=self.student.pk + 100),
+        ]
+        with CaptureQueriesContext(connection) as queries:
+            statuses = self.upload(scans)
+        self.assertEqual(statuses, ['accepted', 'already_served', 'closed', 'not_found'])
+        inserts = [query for query in queries.captured_queries if query['sql'].startswith('INSERT')]
+        self.assertEqual(len(inserts), 1)
+
+        log = MealLog.objects.get()
+        self.assertEqual(log.timestamp, self.lunch)
+        self.assertEqual(log.service_date, self.lunch.date())
+        # The terminal re-sends the same batch after a dropped response
+        self.assertEqual(self.upload(scans[:2]), ['accepted', 'already_served'])
+        self.assertEqual(MealLog.objects.count(), 1)
+
+
+class MealLogExportTests(APITestCase):
+    def test_meal_logs_export_in_scan_order(self):
+        staff = User.objects.create_user('dining', password='password123')
+        staff.profile.role = 'staff'
+        staff.profile.save()
+        student = Student.objects.create(student_id='STU00001', name='Student', department='CS', year=1)
+        for day in (5, 4, 6):
+            MealLog.objects.create(
+                student=student, meal_type='lunch', timestamp=timezone.make_aware(datetime(2025, 3, day, 12))
+            )
+
+        self.assertEqual(self.client.get('/api/meals/export/').status_code, 401)
+        self.client.force_authenticate(staff)
+        response = self.client.get('/api/meals/export/', {'output': 'jsonl', 'start': '2025-03-05'})
+        self.assertEqual(response.status_code, 200)
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).splitlines()]
+        self.assertEqual([row['service_date'] for row in rows], ['2025-03-05', '2025-03-06'])
+        self.assertEqual(rows[0]['student_id'], 'STU00001')
+        self.assertEqual(rows[0]['department'], 'CS')
@@ -1,7 +1,28 @@
+import codecs
+
+from django.db import IntegrityError, transaction
+from django.http import HttpResponse
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.utils.text import compress_string
 from rest_framework import viewsets, status
+from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.parsers import MultiPartParser
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
+from backend.exports import export_response
+from backend.pagination import KeysetPagination
+from cafe.permissions import IsStaff
+from .exports import MEAL_LOG_EXPORT
+from .importers import format_for, import_students
 from .models import Student, MealLog
-from .serializers import StudentSerializer, MealLogSerializer
+from .qr import enqueue_pending_qr
+from .roster import record_batch_scans, roster_delta
+from .serializers import (
+    StudentSerializer, StudentLookupSerializer, MealLogSerializer, MealScanSerializer, MealStatsQuerySerializer,
+    MealBatchSerializer
+)
+from .stats import meal_stats
 from rest_framework.permissions import AllowAny
 from django.views.decorators.csrf import csrf_exempt
 from django.utils.decorators import method_decorator
@@ -15,11 +36,130 @@ class StudentViewSet(viewsets.ModelViewSet):
     def create(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
-        student = serializer.save()  # save triggers QR code generation
+        student = serializer.save()  # save queues QR code rendering
         return Response(StudentSerializer(student).data, status=status.HTTP_201_CREATED)
 
+    @action(detail=False, methods=['get'])
+    def lookup(self, request):
+        """Resolve a scanned QR payload, NFC/BIO id or partial id to one student"""
+        code = request.query_params.get('code', '')
+        if not code.strip():
+            return Response({'error': 'code is required'}, status=status.HTTP_400_BAD_REQUEST)
+
+        student = Student.objects.only(*StudentLookupSerializer.load_fields).resolve_scan(code)
+        if student is None:
+            return Response({'error': 'Student not found'}, status=status.HTTP_404_NOT_FOUND)
+        return Response(StudentLookupSerializer(student).data)
+
+    @action(detail=False, methods=['get'])
+    def roster(self, request):
+        """Students changed since ``?version=`` (all students without it), for offline gate terminals.
+
+        Columns rather than objects, gzip-compressed when the client accepts it.
+        Repeat with the returned ``version`` until ``complete`` is true.
+        """
+        try:
+            delta = roster_delta(request.query_params.get('version'))
+        except ValueError:
+            return Response({'error': 'Invalid version'}, status=status.HTTP_400_BAD_REQUEST)
+
+        body = JSONRenderer().render(delta)
+        response = HttpResponse(content_type='application/json')
+        if 'gzip' in request.headers.get('Accept-Encoding', ''):
+            body = compress_string(body)
+            response['Content-Encoding'] = 'gzip'
+        response.content = body
+        patch_vary_headers(response, ['Accept-Encoding'])
+        patch_cache_control(response, no_cache=True)
+        return response
+
+    @action(detail=False, methods=['post'], url_path='import',
+            parser_classes=[MultiPartParser], permission_classes=[IsStaff])
+    def bulk_import(self, request):
+        """Stream a CSV or JSON Lines upload (``file``) and upsert students on student_id"""
+        upload = request.FILES.get('file')
+        if upload is None:
+            return Response({'error': 'file is required'}, status=status.HTTP_400_BAD_REQUEST)
+
+        # Iterating the upload yields lines without reading the whole file
+        summary = import_students(codecs.iterdecode(upload, 'utf-8-sig'), format_for(upload.name))
+        if summary['imported']:
+            transaction.on_commit(enqueue_pending_qr)
+        return Response(summary, status=status.HTTP_200_OK)
+
 
 class MealLogViewSet(viewsets.ModelViewSet):
-    queryset = MealLog.objects.all()
+    queryset = MealLog.objects.select_related('student')
     serializer_class = MealLogSerializer
     permission_classes = [AllowAny]
+    filterset_fields = ['student', 'meal_type', 'service_date']
+    ordering = ['-timestamp']
+    pagination_class = KeysetPagination
+    cursor_ordering = ('-timestamp', '-log_id')
+
+    def perform_create(self, serializer):
+        try:
+            with transaction.atomic():
+                serializer.save()
+        except IntegrityError:
+            raise ValidationError({'detail': 'Student has already been served this meal today'})
+
+    @action(detail=False, methods=['post'])
+    def scan(self, request):
+        """Resolve a gate scan and log the meal in one round trip.
+
+        The insert relies on the ``unique_meal_per_service`` constraint, so two
+        terminals scanning the same student at once cannot both be allowed.
+        """
+        serializer = MealScanSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        meal_type = serializer.validated_data.get('meal_type') or MealLog.current_meal_type()
+
+        student = Student.objects.only(*StudentLookupSerializer.load_fields).resolve_scan(
+            serializer.validated_data['code']
+        )
+        if student is None:
+            return Response(
+                {'allowed': False, 'reason': 'not_found', 'message': 'Student not found'},
+                status=status.HTTP_404_NOT_FOUND,
+            )
+
+        result = {'student': StudentLookupSerializer(student).data, 'meal_type': meal_type}
+        if meal_type is None:
+            result.update(allowed=False, reason='closed', message='Cafe is closed now')
+            return Response(result, status=status.HTTP_409_CONFLICT)
+
+        try:
+            with transaction.atomic():
+                log = MealLog.objects.create(student=student, meal_type=meal_type)
+        except IntegrityError:
+            result.update(allowed=False, reason='already_served', message=f'Already served {meal_type} today')
+            return Response(result, status=status.HTTP_409_CONFLICT)
+
+        result.update(allowed=True, log_id=log.log_id, timestamp=log.timestamp)
+        return Response(result, status=status.HTTP_201_CREATED)
+
+    @action(detail=False, methods=['post'])
+    def batch(self, request):
+        """Upload scans queued offline (``scans``: key, student, timestamp, meal_type).
+
+        All scans are inserted in one statement; the result for each key says
+        whether it was accepted or why not. Re-sending a batch is safe.
+        """
+        serializer = MealBatchSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        results = record_batch_scans(serializer.validated_data['scans'])
+        accepted = sum(result['status'] == 'accepted' for result in results)
+        return Response({'accepted': accepted, 'rejected': len(results) - accepted, 'results': results})
+
+    @action(detail=False, methods=['get'], permission_classes=[IsStaff])
+    def export(self, request):
+        """Stream matching meal logs as CSV or JSON Lines (``?output=``, ``start``/``end`` dates)"""
+        return export_response(request, MEAL_LOG_EXPORT, self.filter_queryset(self.get_queryset()))
+
+    @action(detail=False, methods=['get'])
+    def stats(self, request):
+        """Meal counts by day, meal type, hour and department for a date window"""
+        query = MealStatsQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        return Response(meal_stats(query.validated_data['start'], query.validated_data['end']))
@@ -71,25 +71,24 @@ export default function AnalyticsDashboard() {
             ]
           });
         } else {
-          // Fallback: original behaviour
-          const [studentsRes, mealsRes] = await Promise.all([
-            axios.get(`${API_URL}/api/students/`),
-            axios.get(`${API_URL}/api/meals/`)
+          // Fallback: today's meal counts, aggregated on the server
+          const [statsRes, mealsRes] = await Promise.all([
+            axios.get(`${API_URL}/api/meals/stats/`),
+            axios.get(`${API_URL}/api/meals/?ordering=-timestamp`)
           ]);
 
-          const students = studentsRes.data;
-          const meals = mealsRes.data;
-          const today = new Date().toDateString();
-          const todayMeals = meals.filter(meal => new Date(meal.timestamp).toDateString() === today);
+          const mealStats = statsRes.data;
+          const countFor = (type) => mealStats.by_meal_type.find(m => m.meal_type === type)?.count || 0;
 
           setStats({
-            totalStudents: students.length,
-            todayMeals: todayMeals.length,
-            breakfastCount: todayMeals.filter(m => m.meal_type === 'breakfast').length,
-            lunchCount: todayMeals.filter(m => m.meal_type === 'lunch').length,
-            dinnerCount: todayMeals.filter(m => m.meal_type === 'dinner').length
+            totalStudents: mealStats.total_students,
+            todayMeals: mealStats.total_meals,
+            breakfastCount: countFor('breakfast'),
+            lunchCount: countFor('lunch'),
+            dinnerCount: countFor('dinner')
           });
 
+          const meals = mealsRes.data.results || mealsRes.data;
           setRecentActivity(meals.slice(0, 10));
         }
       } catch (error) {
@@ -285,62 +285,39 @@ export default function CafeAccessSystem() {
       // not JSON
     }
 
-    // Final cleaning: remove whitespace and common separators
-    let cleanId = raw.replace(/\s+/g, '').replace(/[\-\._]/g, '');
-
-    // Try all format variations
-    let student = null;
-    for (const format of idFormats) {
-      student = students.find(s => s.student_id === format || (s.student_id || '').toUpperCase() === (format || '').toUpperCase());
-      if (student) break;
-
-      // Try with STU prefix and uppercase variants
-      const pref = format.startsWith('STU') ? format : `STU${format}`;
-      student = students.find(s => (s.student_id || '').toUpperCase() === pref.toUpperCase());
-      if (student) break;
-    }
-
-    // Final fallback: partial match
-    if (!student) {
-      student = students.find(s => s.student_id.includes(cleanId));
-    }
-
-    if (!student) {
-      setMessage("❌ Student not found");
-      setStudentInfo(null);
-      setIsAllowed(false);
-      setIsLoading(false);
-      return;
-    }
-
     const mealType = getMealType();
 
     if (mealType === "closed") {
       setMessage("❌ Café is closed now");
-      setStudentInfo(student);
+      setStudentInfo(null);
       setIsAllowed(false);
       setIsLoading(false);
       return;
     }
 
+    // The server resolves QR payloads, NFC/BIO ids and partial ids, and logs
+    // the meal atomically so two gates cannot serve the same student twice.
     try {
-      const resp = await axios.post(`${API_URL}/api/meals/`, {
-        student: student.id,
+      const resp = await axios.post(`${API_URL}/api/meals/scan/`, {
+        code: raw,
         meal_type: mealType,
       });
-      setMessage(`✅ ${student.name} - ${mealType}`);
+      const student = resp.data.student;
+      setMessage(`✅ ${student.name} - ${resp.data.meal_type}`);
       setStudentInfo(student);
       setIsAllowed(true);
       fetchRecentMeals();
     } catch (err) {
       // show meaningful server error if available
-      const serverMsg = err.response?.data?.detail || err.response?.data || err.message;
-      if (err.response?.status === 400) {
-        setMessage(serverMsg || "❌ Already used meal for this period");
+      const data = err.response?.data;
+      if (err.response?.status === 404) {
+        setMessage("❌ Student not found");
+      } else if (err.response?.status === 409) {
+        setMessage(`❌ ${data?.message || "Already used meal for this period"}`);
       } else {
-        setMessage(serverMsg || "❌ Error processing meal");
+        setMessage(data?.message || data?.detail || err.message || "❌ Error processing meal");
       }
-      setStudentInfo(student);
+      setStudentInfo(data?.student || null);
       setIsAllowed(false);
     } finally {
       setIsLoading(false);